@@ -1,5 +1,8 @@
 import os, sys
+import pandas as pd
 from probe_design_adapted import designHCR3Probes
+from probe_tiling import tile_fasta
+from panel_screen import screen_panel
 from utils import select_output_directory, get_six_digit_date_today
 
 
@@ -21,6 +24,12 @@ PRB_LENGTH = 20
 GC_RANGE = [40, 60]
 PRB_SPACING = 2
 DG_THRESHOLD = -9
+FASTA_FILE = ''
+WINDOW = 5000
+OUTPUT_FORMAT = 'parquet'
+SCREEN_PANEL = False
+DROP_CONFLICTS = False
+MIN_CONFLICT_LENGTH = 14
 ############################################################################################
 
 
@@ -32,29 +41,51 @@ except:
     print(f"There is already a directory at {result_path}. Please ensure your selected directory is unique before proceeding.")
     sys.exit(0)
 
-if GENE_SEQS:
+if FASTA_FILE:
+    count = tile_fasta(FASTA_FILE,
+                       os.path.join(result_path, f"HCR3_probes_{date}.{OUTPUT_FORMAT}"),
+                       design='hcr3',
+                       window=WINDOW,
+                       prb_length=PRB_LENGTH,
+                       prb_space=PRB_SPACING,
+                       hairpin_id=HAIRPIN_IDS[0],
+                       email='czhangyx@berkeley.edu',
+                       db=os.path.join(os.getcwd(), "data/mouse/mouse_refseq_rna"),
+                       gc_range=GC_RANGE,
+                       dg_thresh=DG_THRESHOLD)
+    print(f'Designed {count} probes')
+elif GENE_SEQS:
+    results = []
     for i in range(len(GENE_NAMES)):
-        resultdf = designHCR3Probes(gene_name=GENE_NAMES[i], 
-                                    email='czhangyx@berkeley.edu',
-                                    sequence=GENE_SEQS[i],
-                                    hairpin_id=HAIRPIN_IDS[i], 
-                                    db=os.path.join(os.getcwd(), "data/mouse/mouse_refseq_rna"),
-                                    result_path=result_path,
-                                    prb_length=PRB_LENGTH,
-                                    gc_range=GC_RANGE,
-                                    prb_space=PRB_SPACING,
-                                    dg_thresh=DG_THRESHOLD,
-                                    to_excel=True)
+        results.append(designHCR3Probes(gene_name=GENE_NAMES[i], 
+                                        email='czhangyx@berkeley.edu',
+                                        sequence=GENE_SEQS[i],
+                                        hairpin_id=HAIRPIN_IDS[i], 
+                                        db=os.path.join(os.getcwd(), "data/mouse/mouse_refseq_rna"),
+                                        result_path=result_path,
+                                        prb_length=PRB_LENGTH,
+                                        gc_range=GC_RANGE,
+                                        prb_space=PRB_SPACING,
+                                        dg_thresh=DG_THRESHOLD,
+                                        to_excel=True))
 else:
+    results = []
     for i in range(len(GENE_NAMES)):
-        resultdf = designHCR3Probes(gene_id=GENE_IDS[i], 
-                                    gene_name=GENE_NAMES[i], 
-                                    email='czhangyx@berkeley.edu',
-                                    hairpin_id=HAIRPIN_IDS[i], 
-                                    db=os.path.join(os.getcwd(), "data/mouse/mouse_refseq_rna"),
-                                    result_path=result_path,
-                                    prb_length=PRB_LENGTH,
-                                    gc_range=GC_RANGE,
-                                    prb_space=PRB_SPACING,
-                                    dg_thresh=DG_THRESHOLD,
-                                    to_excel=True)
\ No newline at end of file
+        results.append(designHCR3Probes(gene_id=GENE_IDS[i], 
+                                        gene_name=GENE_NAMES[i], 
+                                        email='czhangyx@berkeley.edu',
+                                        hairpin_id=HAIRPIN_IDS[i], 
+                                        db=os.path.join(os.getcwd(), "data/mouse/mouse_refseq_rna"),
+                                        result_path=result_path,
+                                        prb_length=PRB_LENGTH,
+                                        gc_range=GC_RANGE,
+                                        prb_space=PRB_SPACING,
+                                        dg_thresh=DG_THRESHOLD,
+                                        to_excel=True))
+
+if SCREEN_PANEL and not FASTA_FILE:
+    # Check probes of all genes against each other and against the initiators
+    conflicts, results = screen_panel(results, HAIRPIN_IDS, drop=DROP_CONFLICTS, min_length=MIN_CONFLICT_LENGTH)
+    conflicts.to_excel(os.path.join(result_path, f"panel_conflicts_{date}.xlsx"), index=False)
+    if DROP_CONFLICTS:
+        pd.concat(results).to_excel(os.path.join(result_path, f"panel_probes_{date}.xlsx"), index=False)
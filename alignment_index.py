@@ -0,0 +1,150 @@
+import os
+import glob
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from telemetry import TELEMETRY
+
+
+"""
+Sharing one bowtie2 index between concurrent alignment jobs. With memory mapping
+enabled, every bowtie2 call gets --mm and maps the index files instead of reading
+private copies, so all jobs on the machine share a single image of the index in
+the page cache and memory use stays flat as more workers are added. The setting
+is kept in an environment variable so worker processes and their bowtie2
+subprocesses inherit it.
+
+Usage:
+    results = run_designs(designHCR3Probes, jobs, db, workers=4)
+"""
+
+
+MM_ENV_VAR = 'COMPBIO_BOWTIE2_MM'
+
+
+"""
+Returns the bowtie2 index files of an index prefix.
+
+Input:
+    db: bowtie2 index prefix.
+"""
+def index_files(db: str) -> list[str]:
+    return sorted(glob.glob(glob.escape(db) + '.*.bt2') + glob.glob(glob.escape(db) + '.*.bt2l'))
+
+
+"""
+Turn memory-mapped index loading on or off for this process and the processes it starts.
+
+Input:
+    enabled: if bowtie2 should be called with --mm.
+"""
+def enable_memory_mapping(enabled: bool = True):
+    if enabled:
+        os.environ[MM_ENV_VAR] = '1'
+    else:
+        os.environ.pop(MM_ENV_VAR, None)
+
+
+"""
+Returns the extra bowtie2 arguments for the current index loading mode.
+"""
+def bowtie2_index_args() -> list[str]:
+    return ['--mm'] if os.environ.get(MM_ENV_VAR) == '1' else []
+
+
+"""
+Read the index files once so their pages are in the page cache before the
+first alignment, instead of every concurrent job faulting them in at once.
+
+Input:
+    db: bowtie2 index prefix.
+Returns: number of bytes loaded.
+"""
+def warm_index(db: str) -> int:
+    files = index_files(db)
+    assert files, f"No bowtie2 index found at {db}"
+
+    total = 0
+    for path in files:
+        with open(path, 'rb') as f:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            while True:
+                block = f.read(64 * 2**20)
+                if not block:
+                    break
+                total += len(block)
+    return total
+
+
+"""
+Context manager enabling memory-mapped index loading and warming the index, for
+running several design jobs at once.
+
+Inputs:
+    db: bowtie2 index prefix.
+    warm: read the index into the page cache on entry.
+"""
+class SharedIndex:
+    def __init__(self, db: str, warm: bool = True):
+        self.db = db
+        self.warm = warm
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = os.environ.get(MM_ENV_VAR)
+        enable_memory_mapping(True)
+        if self.warm:
+            size = warm_index(self.db)
+            print(f'Loaded {size/2**30:.2f} GB bowtie2 index into the shared page cache')
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._previous is None:
+            enable_memory_mapping(False)
+        else:
+            os.environ[MM_ENV_VAR] = self._previous
+
+
+"""
+Run probe design jobs in worker processes sharing one memory-mapped index.
+
+Inputs:
+    design: design function, e.g. designHCR3Probes.
+    jobs: keyword arguments of each call of design.
+    db: bowtie2 index prefix used by the jobs.
+    workers: number of worker processes; jobs run in this process if 1.
+    shared_index: map the index with --mm and warm it before the jobs start.
+Returns: the results of the jobs, in the order of jobs.
+"""
+def run_designs(design, jobs: list[dict], db: str, workers: int = 1, shared_index: bool = True) -> list:
+    workers = max(1, min(workers, len(jobs)))
+    shared = SharedIndex(db) if shared_index and workers > 1 and index_files(db) else contextlib.nullcontext()
+    with shared:
+        if workers == 1:
+            return [design(**job) for job in jobs]
+        # Workers split NCBI's request limit so together they stay within it
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(1/workers,)) as executor:
+            futures = [executor.submit(_run_job, design, job) for job in jobs]
+            results = []
+            for future in futures:
+                # Network calls recorded by the worker are added to this process's telemetry
+                result, calls = future.result()
+                TELEMETRY.merge(calls)
+                results.append(result)
+            return results
+
+
+
+
+
+# Helper functions
+def _init_worker(rate_share: float):
+    import entrez_lookup
+    entrez_lookup.RATE_SHARE = rate_share
+
+
+def _run_job(design, job: dict) -> tuple:
+    # Workers run several jobs and may inherit the parent's records, so each job starts empty
+    TELEMETRY.reset()
+    result = design(**job)
+    return result, TELEMETRY.snapshot()
@@ -0,0 +1,473 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+
+"""
+Non-interactive command line interface for primer design, HCR3/USeqFISH probe
+design, and reverse translation. Every setting of the interactive scripts can be
+given as an argument or as a key of a JSON config file passed with --config,
+with command line arguments taking priority. Heavy dependencies are only
+imported by the subcommand that needs them.
+
+Example:
+    python batch_cli.py primers --input peaks.parquet --output-dir results --from-coordinates --format parquet
+    python batch_cli.py hcr3 --config hcr3_settings.json --output-dir results
+"""
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(REPO_DIR, 'data', 'mouse', 'mouse_refseq_rna')
+DEFAULT_UGI_PATH = os.path.join(REPO_DIR, 'data', 'ugi.xlsx')
+
+
+"""
+Design primer pairs for every row of the input table.
+"""
+def run_primers(args):
+    import pandas as pd
+    from utils import get_sequence_from_coordinate, design_primer_pair, primer_redesigner, primer_table
+    from utils import report_progress
+    from table_io import read_table_chunks, TableWriter
+    from primer_qc import check_primer_dimers, QC_COLUMNS
+    _require(args, 'input', 'output_dir')
+
+    len_range = range(args.min_length, args.max_length+1)
+    # This script is guarded by __main__, so QC may use a process pool
+    processes = args.processes or os.cpu_count() or 1
+    output = _output_file(args, 'with_primers')
+    with TableWriter(output) as writer:
+        for df in read_table_chunks(args.input, args.chunksize):
+            if args.from_coordinates:
+                seqs = []
+                start_time = time.monotonic()
+                for i, coordinate in enumerate(df.iloc[:, args.coordinate_column]):
+                    seqs.append(get_sequence_from_coordinate(coordinate, args.flank_included, args.flank_size, args.genome))
+                    if args.verbose:
+                        report_progress(i, len(df), start_time=start_time)
+            else:
+                seqs = df.iloc[:, args.sequence_column].tolist()
+
+            primers = []
+            for i, seq in enumerate(seqs):
+                primer = design_primer_pair(seq, args.flank_size, args.target_length, len_range, args.tight_flank,
+                                            args.forbidden, args.low_gc, args.high_gc, args.low_tm, args.high_tm)
+                if args.verbose:
+                    primer.message(writer.rows+i+1)
+                primers.append(primer)
+
+            tables = [df]
+            redesign = primer_redesigner(seqs, args.flank_size, args.target_length, len_range, args.tight_flank,
+                                         args.forbidden, args.low_gc, args.high_gc, args.low_tm, args.high_tm)
+            if args.dimer_check:
+                primers, qc = check_primer_dimers(primers, redesign if args.replace_failed_qc else None,
+                                                  args.hairpin_dg, args.dimer_dg, args.replace_rounds, processes)
+            if args.genome_index:
+                from primer_specificity import check_primer_specificity, SPECIFICITY_COLUMNS
+                primers, specificity = check_primer_specificity(primers, args.genome_index,
+                                                                redesign if args.replace_nonspecific else None,
+                                                                args.max_hits, args.replace_rounds, threads=args.threads)
+                tables.append(pd.DataFrame(specificity, columns=SPECIFICITY_COLUMNS, index=df.index))
+                if args.dimer_check:
+                    primers, qc = check_primer_dimers(primers, None, args.hairpin_dg, args.dimer_dg,
+                                                      processes=processes)
+            if args.dimer_check:
+                tables.insert(1, pd.DataFrame(qc, columns=QC_COLUMNS, index=df.index))
+            tables.insert(1, primer_table(primers, args.left_arm, args.right_arm, df.index))
+            writer.write(pd.concat(tables, axis=1))
+    return _finish_table(args, output)
+
+
+"""
+Design HCR3 probes for every gene in the settings.
+"""
+def run_hcr3(args):
+    from probe_design_adapted import designHCR3Probes
+    if args.fasta:
+        _require(args, 'hairpin_ids', 'output_dir')
+        return _tile_fasta(args, 'hcr3', hairpin_id=args.hairpin_ids[0])
+    _require(args, 'gene_names', 'hairpin_ids', 'output_dir')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    design = designHCR3Probes
+    jobs = []
+    for i, gene_name in enumerate(args.gene_names):
+        jobs.append(dict(gene_id=_nth(args.gene_ids, i),
+                         gene_name=gene_name,
+                         email=args.email,
+                         sequence=_nth(args.gene_seqs, i),
+                         hairpin_id=args.hairpin_ids[i],
+                         db=args.db,
+                         result_path=args.output_dir,
+                         prb_length=args.prb_length,
+                         gc_range=args.gc_range,
+                         prb_space=args.prb_spacing,
+                         dg_thresh=args.dg_threshold,
+                         to_excel=True))
+    if args.state_dir:
+        # Reuse candidate features saved by the last run for each gene
+        from probe_incremental import designHCR3ProbesIncremental
+        os.makedirs(args.state_dir, exist_ok=True)
+        design = designHCR3ProbesIncremental
+        for job in jobs:
+            job['state_path'] = os.path.join(args.state_dir, f"{job['gene_name']}_hcr3_state.json")
+    _run_designs(args, design, jobs)
+    return args.output_dir
+
+
+"""
+Design USeqFISH probes for every gene in the settings.
+"""
+def run_useqfish(args):
+    from probe_design_adapted import designUSeqFISHProbes
+    if args.fasta:
+        _require(args, 'output_dir')
+        return _tile_fasta(args, 'useqfish', ugi_path=args.ugi_path, ugi_num=_nth(args.ugi_nums, 0, 1))
+    _require(args, 'gene_names', 'output_dir')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = []
+    for i, gene_name in enumerate(args.gene_names):
+        jobs.append(dict(gene_id=_nth(args.gene_ids, i),
+                         gene_name=gene_name,
+                         email=args.email,
+                         sequence=_nth(args.gene_seqs, i),
+                         db=args.db,
+                         ugi_path=args.ugi_path,
+                         ugi_num=_nth(args.ugi_nums, i, i+1),
+                         result_path=args.output_dir,
+                         prb_length=args.prb_length,
+                         gc_range=args.gc_range,
+                         prb_space=args.prb_spacing,
+                         dg_thresh=args.dg_threshold,
+                         to_excel=True,
+                         processes=args.processes or max((os.cpu_count() or 1) // args.workers, 1)))
+    _run_designs(args, designUSeqFISHProbes, jobs)
+    return args.output_dir
+
+
+"""
+Count the HCR3 probes every combination of settings would produce, computing
+candidate features once per gene and probe length.
+"""
+def run_hcr3_sweep(args):
+    import pandas as pd
+    from probe_sweep import sweep_hcr3
+    from table_io import write_table
+    from utils import get_six_digit_date_today
+    _require(args, 'gene_names', 'hairpin_ids', 'output_dir')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = [dict(gene_name=gene_name, gene_id=_nth(args.gene_ids, i), sequence=_nth(args.gene_seqs, i),
+                 hairpin_id=args.hairpin_ids[i], email=args.email, db=args.db, result_path=args.output_dir,
+                 prb_lengths=args.prb_lengths, gc_ranges=args.gc_ranges, dg_thresholds=args.dg_thresholds,
+                 prb_spacings=args.prb_spacings) for i, gene_name in enumerate(args.gene_names)]
+    summaries = []
+    for gene_name, (settings, features) in zip(args.gene_names, _run_designs(args, sweep_hcr3, jobs)):
+        write_table(features, os.path.join(args.output_dir, f'{gene_name}_features.{args.format}'))
+        summaries.append(settings)
+    output = os.path.join(args.output_dir, f'HCR3_sweep_{get_six_digit_date_today()}.{args.format}')
+    write_table(pd.concat(summaries, ignore_index=True), output)
+    return output
+
+
+"""
+Screen probe tables of a panel for cross-hybridizing oligos.
+"""
+def run_panel_screen(args):
+    import pandas as pd
+    from panel_screen import screen_panel
+    from table_io import read_table, write_table
+    from utils import get_six_digit_date_today
+    _require(args, 'inputs', 'output_dir')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    results = [read_table(path) for path in args.inputs]
+    conflicts, results = screen_panel(results, args.hairpin_ids or [], drop=args.drop_conflicts, k=args.k,
+                                      min_length=args.min_length, max_occurrences=args.max_occurrences)
+    date = get_six_digit_date_today()
+    output = write_table(conflicts, os.path.join(args.output_dir, f'panel_conflicts_{date}.{args.format}'))
+    if args.drop_conflicts:
+        output = write_table(pd.concat(results, ignore_index=True),
+                             os.path.join(args.output_dir, f'panel_probes_{date}.{args.format}'))
+    return output
+
+
+"""
+Reverse translate every peptide of the input table with IDT codon optimization.
+"""
+def run_reverse_translate(args):
+    from utils import import_IDT_information, reverse_translate, reverse_translate_cached, build_peptide_items
+    from table_io import read_table_chunks, TableWriter
+    _require(args, 'input', 'output_dir')
+    if args.backend == 'idt':
+        _require(args, 'idt_file')
+        idt_info = import_IDT_information(args.idt_file)
+    else:
+        # Fail before the first chunk if the organism has no codon usage table
+        from codon_optimizer import check_codon_usage
+        check_codon_usage(args.organism)
+
+    output = _output_file(args, 'reverse_translated')
+    with TableWriter(output) as writer:
+        for df in read_table_chunks(args.input, args.chunksize):
+            data = build_peptide_items(df.iloc[:, args.name_column].tolist(), df.iloc[:, args.sequence_column].tolist())
+            if args.backend == 'local':
+                dnas = reverse_translate(data, args.organism, args.product_type, backend='local',
+                                         method=args.codon_method, gc_range=args.codon_gc_range,
+                                         gc_window=args.gc_window, forbidden=args.forbidden_motifs, seed=args.seed)
+            elif args.use_cache:
+                dnas = reverse_translate_cached(data, args.organism, args.product_type, *idt_info,
+                                                cache_file=args.cache_file)
+            else:
+                dnas = reverse_translate(data, args.organism, args.product_type, *idt_info)
+            df[f'{df.columns[args.sequence_column]} Reverse Translated'] = dnas
+            writer.write(df)
+    return _finish_table(args, output)
+
+
+"""
+Build the argument parser for all subcommands.
+
+Input:
+    config: settings loaded from a config file, used as defaults of every subcommand.
+"""
+def build_parser(config: dict = None) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Headless batch runner for compbio_utils.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    primers = subparsers.add_parser('primers', help='design PCR primers')
+    _add_common_arguments(primers)
+    primers.add_argument('--input', help='input table with coordinates or sequences')
+    primers.add_argument('--from-coordinates', dest='from_coordinates', action=argparse.BooleanOptionalAction,
+                         default=False,
+                         help='retrieve sequences from chromosome coordinates through UCSC')
+    primers.add_argument('--coordinate-column', dest='coordinate_column', type=int, default=1)
+    primers.add_argument('--sequence-column', dest='sequence_column', type=int, default=2)
+    primers.add_argument('--genome', default='mm10')
+    primers.add_argument('--flank-included', dest='flank_included', action=argparse.BooleanOptionalAction,
+                         default=False)
+    primers.add_argument('--flank-size', dest='flank_size', type=int, default=100)
+    primers.add_argument('--target-length', dest='target_length', type=int, default=500)
+    primers.add_argument('--tight-flank', dest='tight_flank', action=argparse.BooleanOptionalAction, default=True)
+    primers.add_argument('--left-arm', dest='left_arm', default='')
+    primers.add_argument('--right-arm', dest='right_arm', default='')
+    primers.add_argument('--forbidden', nargs='*', default=['GGAGG', 'TAAGGAG', 'TTTTT', 'AAAAA'])
+    primers.add_argument('--low-gc', dest='low_gc', type=float, default=40)
+    primers.add_argument('--high-gc', dest='high_gc', type=float, default=60)
+    primers.add_argument('--low-tm', dest='low_tm', type=float, default=50)
+    primers.add_argument('--high-tm', dest='high_tm', type=float, default=60)
+    primers.add_argument('--min-length', dest='min_length', type=int, default=22)
+    primers.add_argument('--max-length', dest='max_length', type=int, default=25)
+    primers.add_argument('--dimer-check', dest='dimer_check', action=argparse.BooleanOptionalAction, default=True,
+                         help='check hairpin, homodimer, and heterodimer ΔG of every primer pair')
+    primers.add_argument('--hairpin-dg', dest='hairpin_dg', type=float, default=-3,
+                         help='hairpins at or below this ΔG (kcal/mol) fail QC')
+    primers.add_argument('--dimer-dg', dest='dimer_dg', type=float, default=-6,
+                         help='dimers at or below this ΔG (kcal/mol) fail QC')
+    primers.add_argument('--replace-failed-qc', dest='replace_failed_qc', action=argparse.BooleanOptionalAction,
+                         default=True, help='replace primers failing QC with the next valid candidates')
+    primers.add_argument('--processes', type=int, help='number of processes for QC, defaulted to the number of CPUs')
+    primers.add_argument('--genome-index', dest='genome_index',
+                         help='bowtie2 genome index prefix; checks primer specificity when given')
+    primers.add_argument('--max-hits', dest='max_hits', type=int, default=1,
+                         help='number of genome alignments a specific primer may have')
+    primers.add_argument('--replace-nonspecific', dest='replace_nonspecific', action=argparse.BooleanOptionalAction,
+                         default=True, help='replace non-specific primers with the next valid candidates')
+    primers.add_argument('--replace-rounds', dest='replace_rounds', type=int, default=3)
+    primers.add_argument('--threads', type=int, default=1, help='number of bowtie2 threads')
+    primers.set_defaults(**(config or {}))
+    primers.set_defaults(func=run_primers)
+
+    hcr3 = subparsers.add_parser('hcr3', help='design HCR3 probes')
+    _add_common_arguments(hcr3)
+    _add_probe_arguments(hcr3)
+    _add_tiling_arguments(hcr3)
+    hcr3.add_argument('--hairpin-ids', dest='hairpin_ids', nargs='*', type=int)
+    hcr3.add_argument('--state-dir', dest='state_dir',
+                      help='directory of saved candidate features; only candidates touching edits of a target are '
+                           'analyzed again')
+    hcr3.set_defaults(**(config or {}))
+    hcr3.set_defaults(func=run_hcr3)
+
+    useqfish = subparsers.add_parser('useqfish', help='design USeqFISH probes')
+    _add_common_arguments(useqfish)
+    _add_probe_arguments(useqfish)
+    _add_tiling_arguments(useqfish)
+    useqfish.add_argument('--ugi-path', dest='ugi_path', default=DEFAULT_UGI_PATH)
+    useqfish.add_argument('--ugi-nums', dest='ugi_nums', nargs='*', type=int)
+    useqfish.add_argument('--processes', type=int,
+                          help='number of processes for NUPACK per gene, defaulted to the CPUs divided by --workers')
+    useqfish.set_defaults(**(config or {}))
+    useqfish.set_defaults(func=run_useqfish)
+
+    sweep = subparsers.add_parser('hcr3-sweep', help='count HCR3 probes for a grid of settings')
+    _add_common_arguments(sweep)
+    _add_probe_arguments(sweep)
+    sweep.add_argument('--hairpin-ids', dest='hairpin_ids', nargs='*', type=int)
+    sweep.add_argument('--prb-lengths', dest='prb_lengths', nargs='*', type=int, default=[20])
+    sweep.add_argument('--gc-ranges', dest='gc_ranges', nargs='*', type=_number_range, default=[[40, 60]],
+                       help='GC%% ranges written as low-high, e.g. 40-60 35-65')
+    sweep.add_argument('--dg-thresholds', dest='dg_thresholds', nargs='*', type=float, default=[-9])
+    sweep.add_argument('--prb-spacings', dest='prb_spacings', nargs='*', type=int, default=[2])
+    sweep.set_defaults(**(config or {}))
+    sweep.set_defaults(func=run_hcr3_sweep)
+
+    screen = subparsers.add_parser('panel-screen', help='find cross-hybridizing probes in a panel')
+    _add_common_arguments(screen)
+    screen.add_argument('--inputs', nargs='*', help='probe tables of all genes in the panel')
+    screen.add_argument('--hairpin-ids', dest='hairpin_ids', nargs='*', type=int,
+                        help='HCR3 initiators used by the panel')
+    screen.add_argument('--k', type=int, default=10, help='seed length')
+    screen.add_argument('--min-length', dest='min_length', type=int, default=14,
+                        help='shortest complementary stretch reported')
+    screen.add_argument('--max-occurrences', dest='max_occurrences', type=int, default=100,
+                        help='seeds in more oligos than this are treated as shared sequences')
+    screen.add_argument('--drop-conflicts', dest='drop_conflicts', action=argparse.BooleanOptionalAction, default=False,
+                        help='also write the panel without conflicting probes')
+    screen.set_defaults(**(config or {}))
+    screen.set_defaults(func=run_panel_screen)
+
+    translate = subparsers.add_parser('reverse-translate', help='reverse translate peptides with IDT')
+    _add_common_arguments(translate)
+    translate.add_argument('--input', help='input table with peptide names and sequences')
+    translate.add_argument('--idt-file', dest='idt_file', help='tab-separated IDT account information')
+    translate.add_argument('--name-column', dest='name_column', type=int, default=0)
+    translate.add_argument('--sequence-column', dest='sequence_column', type=int, default=5)
+    translate.add_argument('--organism', default='Mus musculus (mouse)')
+    translate.add_argument('--product-type', dest='product_type', default='gene',
+                           choices=['gblock', 'gene', 'megamer'])
+    translate.add_argument('--cache', dest='use_cache', action=argparse.BooleanOptionalAction, default=True,
+                           help='reuse results of previous runs from the reverse translation cache')
+    translate.add_argument('--cache-file', dest='cache_file', help='reverse translation cache file')
+    translate.add_argument('--backend', default='idt', choices=['idt', 'local'],
+                           help='IDT API or offline codon usage tables')
+    translate.add_argument('--codon-method', dest='codon_method', default='highest', choices=['highest', 'weighted'])
+    translate.add_argument('--codon-gc-range', dest='codon_gc_range', nargs=2, type=float, default=[30, 70])
+    translate.add_argument('--gc-window', dest='gc_window', type=int, default=50)
+    translate.add_argument('--forbidden-motifs', dest='forbidden_motifs', nargs='*', default=[])
+    translate.add_argument('--seed', type=int, default=0)
+    translate.set_defaults(**(config or {}))
+    translate.set_defaults(func=run_reverse_translate)
+
+    return parser
+
+
+"""
+Parse command line arguments, filling in values from a JSON config file when
+one is given. Config keys use the argument names with underscores, e.g. low_gc.
+
+Input:
+    argv: command line arguments, defaulted to sys.argv[1:].
+"""
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    args = build_parser().parse_args(argv)
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+        args = build_parser(config).parse_args(argv)
+    return args
+
+
+def main(argv: list[str] = None):
+    args = parse_args(argv)
+    try:
+        output = args.func(args)
+    finally:
+        if args.telemetry:
+            from telemetry import TELEMETRY
+            TELEMETRY.print_report()
+            TELEMETRY.export_json(args.telemetry)
+    print(f'Complete! Results written to {output}')
+
+
+# Helper functions
+def _add_common_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--config', help='JSON file with settings for this subcommand')
+    parser.add_argument('--output-dir', dest='output_dir', help='directory for generated files')
+    parser.add_argument('--format', default='csv', choices=['csv', 'tsv', 'parquet', 'arrow', 'xlsx'],
+                        help='output table format; xlsx builds a workbook, which is much slower for large '
+                             'tables, so prefer --excel-export for a final Excel copy')
+    parser.add_argument('--excel-export', dest='excel_export', action=argparse.BooleanOptionalAction, default=False,
+                        help='also export the streamed output table to Excel when done')
+    parser.add_argument('--chunksize', type=int, default=10000, help='number of rows processed at a time')
+    parser.add_argument('--verbose', action=argparse.BooleanOptionalAction, default=False)
+    parser.add_argument('--telemetry', help='JSON file for a summary of network latency, bytes, retries, and errors')
+
+
+def _add_probe_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--gene-names', dest='gene_names', nargs='*')
+    parser.add_argument('--gene-ids', dest='gene_ids', nargs='*')
+    parser.add_argument('--gene-seqs', dest='gene_seqs', nargs='*')
+    parser.add_argument('--email', help='email address reported to NCBI Entrez')
+    parser.add_argument('--db', default=DEFAULT_DB, help='bowtie2 index prefix')
+    parser.add_argument('--prb-length', dest='prb_length', type=int, default=20)
+    parser.add_argument('--gc-range', dest='gc_range', nargs=2, type=float, default=[40, 60])
+    parser.add_argument('--prb-spacing', dest='prb_spacing', type=int, default=2)
+    parser.add_argument('--dg-threshold', dest='dg_threshold', type=float, default=-9)
+    parser.add_argument('--workers', type=int, default=1, help='number of genes designed at the same time')
+    parser.add_argument('--shared-index', dest='shared_index', action=argparse.BooleanOptionalAction, default=True,
+                        help='let parallel workers share one memory-mapped copy of the bowtie2 index')
+
+
+def _add_tiling_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--fasta', help='multi-FASTA file (optionally gzipped) to tile instead of the gene lists; '
+                                        'probes of all records are written to one table')
+    parser.add_argument('--window', type=int, default=5000, help='length of the windows long FASTA records are split into')
+
+
+def _require(args: argparse.Namespace, *names: str):
+    missing = [name for name in names if not getattr(args, name, None)]
+    if missing:
+        sys.exit(f"Missing required setting(s): {', '.join(missing)}")
+
+
+def _number_range(text: str) -> list[float]:
+    low, high = text.split('-')
+    return [float(low), float(high)]
+
+
+def _nth(values: list, i: int, default=''):
+    if values and i < len(values):
+        return values[i]
+    return default
+
+
+def _output_file(args: argparse.Namespace, suffix: str, input_path: str = None) -> str:
+    from utils import get_six_digit_date_today
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stem = os.path.basename(input_path or args.input)
+    stem = os.path.splitext(stem[:-3] if stem.endswith('.gz') else stem)[0]
+    return os.path.join(args.output_dir, f'{stem}_{suffix}_{get_six_digit_date_today()}.{args.format}')
+
+
+def _tile_fasta(args: argparse.Namespace, design: str, **design_options) -> str:
+    from probe_tiling import tile_fasta
+
+    output = _output_file(args, f'{design}_probes', args.fasta)
+    count = tile_fasta(args.fasta, output, design, window=args.window, prb_length=args.prb_length,
+                       prb_space=args.prb_spacing, email=args.email, db=args.db, gc_range=args.gc_range,
+                       dg_thresh=args.dg_threshold, **design_options)
+    print(f'Designed {count} probes')
+    return _finish_table(args, output)
+
+
+def _run_designs(args: argparse.Namespace, design, jobs: list[dict]) -> list:
+    from alignment_index import run_designs
+
+    return run_designs(design, jobs, args.db, workers=args.workers, shared_index=args.shared_index)
+
+
+def _finish_table(args: argparse.Namespace, output: str) -> str:
+    from table_io import export_excel
+
+    if args.excel_export and args.format != 'xlsx':
+        export_excel(output)
+    return output
+
+
+if __name__ == '__main__':
+    main()
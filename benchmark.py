@@ -0,0 +1,348 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import threading
+import statistics
+import tracemalloc
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import utils
+from utils import Primer, design_primer_pair, primer_redesigner, pick_primer, primer_table
+from utils import get_sequence_from_coordinate
+from utils import _Tm, _get_complement, _is_DNA
+
+
+"""
+Performance benchmark of primer generation. Seeded synthetic flank sets of
+increasing size are run through the steps of primer_generator.py (sequence
+retrieval, primer selection, output table, and optionally dimer QC) for both
+TIGHT_FLANK modes and several LEN_RANGE settings. UCSC requests go to a local
+stub server, so results do not depend on the network. Reports rows/sec, per-call
+latency of the utils kernels, and peak memory. Given a baseline stored on the
+same machine, fails when overall throughput drops below it by more than the
+allowed fraction.
+
+Example:
+    python benchmark.py --baseline baseline.json --update-baseline   # store the results as the baseline
+    python benchmark.py --baseline baseline.json                     # compare with the stored baseline
+    python benchmark.py --sizes 100 1000 5000 --from-coordinates --output results.json
+"""
+
+
+# Settings of primer_generator.py, except the ones benchmarked over
+FLANK_SIZE = 100
+TARGET_LENGTH = 500
+FORBIDDEN = ['GGAGG', 'TAAGGAG', 'TTTTT', 'AAAAA']
+LOW_GC, HIGH_GC = 40, 60
+LOW_TM, HIGH_TM = 50, 60
+LEN_RANGES = [range(18, 22), range(22, 26), range(25, 31)]
+MEMORY_CASE = (True, range(22, 26))     # Default TIGHT_FLANK and LEN_RANGE, traced for peak memory
+
+
+"""
+Returns seeded synthetic chromosome coordinates of targets.
+
+Inputs:
+    n: number of coordinates.
+    target_length: length of every target.
+    seed: random seed.
+"""
+def synthetic_coordinates(n: int, target_length: int = TARGET_LENGTH, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    coordinates = []
+    for _ in range(n):
+        start = rng.randint(1000000, 100000000)
+        coordinates.append(f'chr{rng.randint(1, 19)}:{start}-{start+target_length-1}')
+    return coordinates
+
+
+"""
+Returns the seeded synthetic sequence the UCSC stub serves for a region. Like
+UCSC, about a third of the bases are soft-masked (lowercase) in stretches.
+
+Inputs:
+    chromosome: chromosome name.
+    start: 0-based start.
+    end: end.
+"""
+def synthetic_sequence(chromosome: str, start: int, end: int) -> str:
+    rng = random.Random(f'{chromosome}:{start}-{end}')
+    bases = rng.choices('ACGT', k=end-start)
+    for i in range(0, len(bases), 50):
+        if rng.random() < 1/3:
+            bases[i:i+50] = [base.lower() for base in bases[i:i+50]]
+    return ''.join(bases)
+
+
+"""
+Returns the sequences of synthetic coordinates with flanking arms, soft-masked
+as in a table of sequences copied from UCSC. get_sequence_from_coordinate
+retrieves the same sequences uppercased.
+
+Inputs:
+    coordinates: coordinates generated with synthetic_coordinates.
+    flank_size: the length of flanking arms on each end of the target.
+"""
+def synthetic_flanks(coordinates: list[str], flank_size: int = FLANK_SIZE) -> list[str]:
+    seqs = []
+    for coordinate in coordinates:
+        chromosome, start, end = utils._process_coordinates(coordinate)
+        seqs.append(synthetic_sequence(chromosome, start-flank_size-1, end+flank_size))
+    return seqs
+
+
+"""
+Local stand-in for the UCSC Genome Browser sequence API. While the context is
+open, get_sequence_from_coordinate requests go to the stub.
+"""
+class StubUCSC:
+    def __init__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _UCSCHandler)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._previous = None
+
+    def __enter__(self):
+        self._thread.start()
+        self._previous = utils.UCSC_BASE_URL
+        utils.UCSC_BASE_URL = f'http://127.0.0.1:{self.server.server_address[1]}'
+        return self
+
+    def __exit__(self, *exc_info):
+        utils.UCSC_BASE_URL = self._previous
+        self.server.shutdown()
+        self.server.server_close()
+
+
+"""
+Design primers for a flank set the way primer_generator.py does for one chunk.
+
+Inputs:
+    coordinates: target coordinates.
+    seqs: sequences with flanking arms, used if from_coordinates is False.
+    len_range: a range of acceptable primer length.
+    tight_flank: if primers should be picked as close to the target as possible.
+    from_coordinates: retrieve sequences from the UCSC stub.
+    dimer_check: also run hairpin and dimer QC with replacement.
+Returns: number of primer pairs found.
+"""
+def run_primer_generation(coordinates: list[str], seqs: list[str], len_range: range, tight_flank: bool,
+                          from_coordinates: bool = False, dimer_check: bool = False) -> int:
+    if from_coordinates:
+        seqs = [get_sequence_from_coordinate(coordinate, False, FLANK_SIZE) for coordinate in coordinates]
+    primers = [design_primer_pair(seq, FLANK_SIZE, TARGET_LENGTH, len_range, tight_flank, FORBIDDEN,
+                                  LOW_GC, HIGH_GC, LOW_TM, HIGH_TM) for seq in seqs]
+    if dimer_check:
+        from primer_qc import check_primer_dimers, clear_cache
+        clear_cache()
+        redesign = primer_redesigner(seqs, FLANK_SIZE, TARGET_LENGTH, len_range, tight_flank,
+                                     FORBIDDEN, LOW_GC, HIGH_GC, LOW_TM, HIGH_TM)
+        primers, _ = check_primer_dimers(primers, redesign, processes=1)
+    primer_table(primers, '', '')
+    return sum(bool(primer.fwd and primer.rev) for primer in primers)
+
+
+"""
+Measure rows/sec of primer generation for every flank set size, TIGHT_FLANK
+mode, and LEN_RANGE setting. Peak memory is measured for the default settings
+(MEMORY_CASE) of every size, as tracing allocations slows the run several times.
+
+Inputs:
+    sizes: numbers of rows of the flank sets.
+    repeats: number of timed runs per case; the fastest is reported.
+    seed: random seed of the flank sets.
+    from_coordinates: include sequence retrieval from the UCSC stub.
+    dimer_check: include hairpin and dimer QC.
+Returns: a dictionary of case names and their results.
+"""
+def benchmark_primer_generation(sizes: list[int], repeats: int = 2, seed: int = 0,
+                                from_coordinates: bool = False, dimer_check: bool = False) -> dict:
+    results = {}
+    for size in sizes:
+        coordinates = synthetic_coordinates(size, seed=seed)
+        seqs = synthetic_flanks(coordinates)
+        for tight_flank in [True, False]:
+            for len_range in LEN_RANGES:
+                case = f"{size}_{'tight' if tight_flank else 'loose'}_{len_range[0]}-{len_range[-1]}"
+                args = (coordinates, seqs, len_range, tight_flank, from_coordinates, dimer_check)
+                seconds = []
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    found = run_primer_generation(*args)
+                    seconds.append(time.perf_counter() - start)
+                results[case] = {'rows': size, 'rows_per_sec': round(size / min(seconds), 1), 'pairs_found': found}
+                memory = ''
+                if (tight_flank, len_range) == MEMORY_CASE:
+                    # Memory is measured in a separate run so tracing does not slow the timed runs
+                    tracemalloc.start()
+                    run_primer_generation(*args)
+                    results[case]['peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+                    tracemalloc.stop()
+                    memory = f", peak {results[case]['peak_memory_mb']:.2f} MB"
+                print(f"{case:>22}: {results[case]['rows_per_sec']:>10.1f} rows/s, {found}/{size} pairs{memory}")
+    return results
+
+
+"""
+Measure per-call latency of the utils kernels used by primer generation.
+
+Inputs:
+    calls: number of calls per kernel; sequence retrieval uses a tenth as many.
+    seed: random seed of the inputs.
+Returns: a dictionary of kernel names and their median and 95th percentile latency in microseconds.
+"""
+def benchmark_kernels(calls: int = 2000, seed: int = 0) -> dict:
+    coordinates = synthetic_coordinates(calls, seed=seed)
+    seqs = synthetic_flanks(coordinates)
+    selections = [seq[FLANK_SIZE-22:FLANK_SIZE] for seq in seqs]
+    kernels = {'pick_primer': lambda i: pick_primer(Primer(), 'fwd', selections[i], FORBIDDEN,
+                                                    LOW_GC, HIGH_GC, LOW_TM, HIGH_TM),
+               '_Tm': lambda i: _Tm(selections[i]),
+               '_get_complement': lambda i: _get_complement(seqs[i][:FLANK_SIZE]),
+               '_is_DNA': lambda i: _is_DNA(seqs[i]),
+               'get_sequence_from_coordinate': lambda i: get_sequence_from_coordinate(coordinates[i], False,
+                                                                                      FLANK_SIZE)}
+    results = {}
+    for name, kernel in kernels.items():
+        count = calls // 10 if name == 'get_sequence_from_coordinate' else calls
+        latencies = []
+        for i in range(count):
+            start = time.perf_counter()
+            kernel(i)
+            latencies.append((time.perf_counter() - start) * 1e6)
+        latencies.sort()
+        results[name] = {'median_us': round(statistics.median(latencies), 2),
+                         'p95_us': round(latencies[int(len(latencies)*0.95)], 2)}
+        print(f"{name:>28}: median {results[name]['median_us']:>9.2f} us, p95 {results[name]['p95_us']:>9.2f} us")
+    return results
+
+
+"""
+Compare throughput with a stored baseline. Single cases vary from run to run,
+so the check uses the geometric mean of the rows/sec ratios of all cases found
+in both.
+
+Inputs:
+    results: results generated with run_benchmarks.
+    baseline: stored results of an earlier run.
+    max_slowdown: largest accepted drop in overall rows/sec as a fraction of the baseline.
+Returns: a list of messages describing the drop, the slowest cases first; empty if within the limit.
+"""
+def find_regressions(results: dict, baseline: dict, max_slowdown: float = 0.3) -> list[str]:
+    ratios = {}
+    for case, result in results['primer_generation'].items():
+        expected = baseline.get('primer_generation', {}).get(case)
+        if expected:
+            ratios[case] = result['rows_per_sec'] / expected['rows_per_sec']
+    if not ratios:
+        return []
+    overall = statistics.geometric_mean(ratios.values())
+    if overall >= 1 - max_slowdown:
+        return []
+    messages = [f'overall: {overall:.0%} of the baseline (limit {1-max_slowdown:.0%})']
+    for case in sorted(ratios, key=ratios.get)[:5]:
+        messages.append(f"{case}: {results['primer_generation'][case]['rows_per_sec']:.1f} rows/s, baseline "
+                        f"{baseline['primer_generation'][case]['rows_per_sec']:.1f} rows/s")
+    return messages
+
+
+"""
+Run all benchmarks against the UCSC stub.
+
+Input:
+    args: parsed command line arguments.
+Returns: a dictionary of settings and results.
+"""
+def run_benchmarks(args: argparse.Namespace) -> dict:
+    with StubUCSC():
+        print('------------ Kernel latency ------------')
+        kernels = benchmark_kernels(args.calls, args.seed)
+        print('\n------------ Primer generation ------------')
+        generation = benchmark_primer_generation(args.sizes, args.repeats, args.seed,
+                                                 args.from_coordinates, args.dimer_check)
+    return {'settings': {'sizes': args.sizes, 'repeats': args.repeats, 'seed': args.seed,
+                         'from_coordinates': args.from_coordinates, 'dimer_check': args.dimer_check,
+                         'python': platform.python_version(), 'machine': platform.machine()},
+            'kernels': kernels,
+            'primer_generation': generation}
+
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark primer generation and the utils kernels.')
+    parser.add_argument('--sizes', nargs='*', type=int, default=[100, 300, 1000], help='rows of each flank set')
+    parser.add_argument('--repeats', type=int, default=2, help='timed runs per case')
+    parser.add_argument('--calls', type=int, default=2000, help='calls per kernel')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--from-coordinates', dest='from_coordinates', action='store_true',
+                        help='include sequence retrieval from the UCSC stub')
+    parser.add_argument('--dimer-check', dest='dimer_check', action='store_true',
+                        help='include hairpin and dimer QC')
+    parser.add_argument('--baseline', help='baseline JSON file stored on this machine; compared with if given')
+    parser.add_argument('--update-baseline', dest='update_baseline', action='store_true',
+                        help='store the results as the new baseline instead of comparing')
+    parser.add_argument('--max-slowdown', dest='max_slowdown', type=float, default=0.3,
+                        help='largest accepted drop in overall rows/sec as a fraction of the baseline')
+    parser.add_argument('--output', help='JSON file for the results')
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None):
+    args = parse_args(argv)
+    if args.update_baseline and not args.baseline:
+        sys.exit('--update-baseline needs a --baseline file to write')
+    results = run_benchmarks(args)
+    if args.output:
+        _write_json(args.output, results)
+    if args.update_baseline:
+        _write_json(args.baseline, results)
+        print(f'\nBaseline written to {args.baseline}')
+        return
+    if not args.baseline:
+        print('\nNo baseline given; pass --baseline to compare with results stored on this machine')
+        return
+    if not os.path.exists(args.baseline):
+        print(f'\nNo baseline at {args.baseline}; run with --update-baseline to store one')
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['settings'].get('from_coordinates') != args.from_coordinates or \
+            baseline['settings'].get('dimer_check') != args.dimer_check:
+        sys.exit('The baseline was measured with different --from-coordinates/--dimer-check settings')
+    regressions = find_regressions(results, baseline, args.max_slowdown)
+    if regressions:
+        sys.exit('\nThroughput dropped below the baseline:\n' + '\n'.join(regressions))
+    print(f'\nOverall throughput is within {args.max_slowdown:.0%} of the baseline')
+
+
+
+
+
+# Helper functions
+class _UCSCHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # UCSC separates query parameters with semicolons
+        query = dict(item.split('=', 1) for item in self.path.split('?', 1)[-1].split(';'))
+        dna = synthetic_sequence(query['chrom'], int(query['start']), int(query['end']))
+        body = json.dumps({'genome': query['genome'], 'chrom': query['chrom'], 'start': int(query['start']),
+                           'end': int(query['end']), 'dna': dna}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _write_json(path: str, data: dict):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
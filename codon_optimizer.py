@@ -0,0 +1,286 @@
+import os
+import re
+import numpy as np
+
+
+"""
+Offline codon optimization. Peptides are reverse translated with per-organism
+codon usage tables, choosing codons for a whole library at once with NumPy and
+then repairing sequences that break GC-window or forbidden-motif constraints.
+
+Codon usage tables are TSV files with a header row and the columns codon and
+per_thousand (codon frequency per thousand codons, as listed by the Kazusa codon
+usage database) or relative_frequency (fraction of the amino acid's codons).
+They are looked up by organism name in CODON_TABLE_DIR, with every run of
+characters other than letters and digits replaced by an underscore, e.g.
+"Mus musculus (mouse)" -> Mus_musculus_mouse.tsv. Tables for the commonly used
+organisms are included; fetch_codon_usage downloads others from Kazusa.
+"""
+
+
+CODON_TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'codon_usage')
+KAZUSA_URL = 'https://www.kazusa.or.jp/codon/cgi-bin/showcodon.cgi'
+
+_BASES = 'TCAG'
+_CODONS = [a+b+c for a in _BASES for b in _BASES for c in _BASES]
+_AMINO_ACIDS = 'FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG'
+_SYMBOLS = sorted(set(_AMINO_ACIDS))
+_CODON_BYTES = np.frombuffer(''.join(_CODONS).encode('ascii'), dtype=np.uint8).reshape(64, 3)
+_CODON_GC = np.array([codon.count('G') + codon.count('C') for codon in _CODONS])
+
+
+"""
+A codon usage table compiled into lookup arrays for vectorized codon choice.
+Synonymous codons of each amino acid are sorted from most to least frequent.
+
+Inputs:
+    usage: a dictionary of codons (DNA alphabet) and their usage frequency.
+    min_frequency: codons used less than this fraction of the time for their
+                   amino acid are never chosen.
+"""
+class CodonTable:
+    def __init__(self, usage: dict, min_frequency: float = 0.1):
+        self.symbol_index = np.full(256, -1, dtype=np.int64)    # amino acid byte -> row
+        for row, symbol in enumerate(_SYMBOLS):
+            self.symbol_index[ord(symbol)] = row
+
+        self.choices = np.zeros((len(_SYMBOLS), 6), dtype=np.int64)    # codon indices by rank
+        self.cumulative = np.ones((len(_SYMBOLS), 6))                   # cumulative probabilities
+        self.lowest_gc = np.zeros(len(_SYMBOLS), dtype=np.int64)        # slot of the AT-richest codon
+        self.highest_gc = np.zeros(len(_SYMBOLS), dtype=np.int64)       # slot of the GC-richest codon
+        for row, symbol in enumerate(_SYMBOLS):
+            codons = [i for i, aa in enumerate(_AMINO_ACIDS) if aa == symbol]
+            freqs = np.array([float(usage.get(_CODONS[i], 0)) for i in codons])
+            if freqs.sum() <= 0:
+                freqs = np.ones(len(codons))
+            freqs = freqs / freqs.sum()
+            keep = freqs >= min(min_frequency, freqs.max())
+            order = [codons[i] for i in np.argsort(-freqs) if keep[i]]
+            probs = np.sort(freqs[keep])[::-1]
+            probs = probs / probs.sum()
+
+            self.choices[row, :len(order)] = order
+            self.choices[row, len(order):] = order[-1]
+            self.cumulative[row, :len(order)] = np.cumsum(probs)
+            self.cumulative[row, len(order)-1:] = 1.0
+            gc = _CODON_GC[order]
+            self.lowest_gc[row] = int(np.argmin(gc))
+            self.highest_gc[row] = int(np.argmax(gc))
+
+    """
+    Convert amino acid sequences into rows of the table.
+
+    Input:
+        peptides: amino acid sequences, '*' for stop codons.
+    Returns: a flat array of rows for all peptides and the length of each peptide.
+    """
+    def encode(self, peptides: list[str]) -> tuple:
+        lengths = np.array([len(peptide) for peptide in peptides], dtype=np.int64)
+        buffer = np.frombuffer(''.join(peptides).upper().encode('ascii'), dtype=np.uint8)
+        rows = self.symbol_index[buffer]
+        assert (rows >= 0).all(), "Peptides contain invalid amino acids"
+        return rows, lengths
+
+    """
+    Pick a codon for every amino acid.
+
+    Inputs:
+        rows: amino acid rows generated with encode.
+        method: "highest" for the most frequent codon, "weighted" for sampling by frequency.
+        rng: NumPy random generator used by the weighted method.
+    Returns: codon indices.
+    """
+    def choose(self, rows: np.ndarray, method: str, rng: np.random.Generator) -> np.ndarray:
+        if method == 'highest':
+            slots = np.zeros(len(rows), dtype=np.int64)
+        else:
+            draws = rng.random(len(rows))
+            slots = (draws[:, None] > self.cumulative[rows]).sum(axis=1)
+        return self.choices[rows, np.minimum(slots, 5)]
+
+
+"""
+Returns the organisms with a codon usage table, named after their table files
+with underscores shown as spaces.
+
+Input:
+    table_dir: directory with codon usage tables.
+"""
+def available_codon_tables(table_dir: str = CODON_TABLE_DIR) -> list[str]:
+    return sorted(name[:-4].replace('_', ' ') for name in os.listdir(table_dir) if name.endswith('.tsv'))
+
+
+"""
+Check that an organism has a codon usage table, so a run fails before any
+sequence is reverse translated. Throws error listing the available tables otherwise.
+
+Inputs:
+    organism: organism name as listed for IDT codon optimization.
+    table_dir: directory with codon usage tables.
+Returns: path of the organism's table.
+"""
+def check_codon_usage(organism: str, table_dir: str = CODON_TABLE_DIR) -> str:
+    path = os.path.join(table_dir, _table_name(organism) + '.tsv')
+    assert os.path.exists(path), (f"No codon usage table for {organism} (expected {path}). "
+                                  f"Available: {', '.join(available_codon_tables(table_dir))}. "
+                                  "Add one with fetch_codon_usage(organism, taxid).")
+    return path
+
+
+"""
+Download the codon usage table of an organism from the Kazusa codon usage
+database and save it in the table directory.
+
+Inputs:
+    organism: organism name as listed for IDT codon optimization.
+    taxid: NCBI taxonomy ID of the organism, e.g. 4922 for Pichia pastoris.
+    table_dir: directory with codon usage tables.
+    timeout: seconds to wait for Kazusa.
+Returns: path of the saved table.
+"""
+def fetch_codon_usage(organism: str, taxid: int, table_dir: str = CODON_TABLE_DIR, timeout: float = 60) -> str:
+    import requests
+
+    response = requests.get(KAZUSA_URL, params={'species': taxid, 'aa': 1, 'style': 'N'}, timeout=timeout)
+    response.raise_for_status()
+    usage = _parse_kazusa(response.text)
+    assert len(usage) == 64, f"Kazusa returned no codon usage table for taxonomy ID {taxid}"
+
+    path = os.path.join(table_dir, _table_name(organism) + '.tsv')
+    with open(path, 'w') as f:
+        f.write('codon\tper_thousand\n')
+        for codon in sorted(usage):
+            f.write(f'{codon}\t{usage[codon]}\n')
+    return path
+
+
+"""
+Load the codon usage table of an organism.
+
+Inputs:
+    organism: organism name as listed for IDT codon optimization.
+    table_dir: directory with codon usage tables.
+Returns: a dictionary of codons and their frequency, per thousand or relative
+         depending on the table; only ratios between synonymous codons are used.
+"""
+def load_codon_usage(organism: str, table_dir: str = CODON_TABLE_DIR) -> dict:
+    path = check_codon_usage(organism, table_dir)
+
+    usage = {}
+    with open(path) as f:
+        next(f)
+        for line in f:
+            if line.strip():
+                codon, frequency = line.split('\t')[:2]
+                usage[codon.strip().upper().replace('U', 'T')] = float(frequency)
+    return usage
+
+
+"""
+Reverse translate peptides locally with codon optimization.
+
+Inputs:
+    peptides: amino acid sequences.
+    organism: the target organism for codon optimization.
+    method: "highest" to always use the most frequent codon, "weighted" to
+            sample codons by their usage frequency.
+    gc_range: lowest and highest acceptable GC% in every window, None to skip.
+    gc_window: window length in nucleotides for the GC check.
+    forbidden: motifs that should not exist in the DNA sequences.
+    min_frequency: rare codon cutoff as a fraction of the amino acid's usage.
+    max_iterations: number of repair rounds for sequences breaking constraints.
+    seed: random seed for weighted choice and repairs.
+    table_dir: directory with codon usage tables.
+Returns: reverse translated DNA sequences. Sequences that still break the
+         constraints after all repair rounds are returned with the fewest
+         violations found.
+"""
+def optimize_codons(peptides: list[str], organism: str, method: str = 'highest',
+                    gc_range: tuple = (30, 70), gc_window: int = 50, forbidden: list[str] = (),
+                    min_frequency: float = 0.1, max_iterations: int = 20, seed: int = 0,
+                    table_dir: str = CODON_TABLE_DIR) -> list[str]:
+    assert method in ['highest', 'weighted'], "method should be highest or weighted"
+
+    table = CodonTable(load_codon_usage(organism, table_dir), min_frequency)
+    rng = np.random.default_rng(seed)
+    rows, lengths = table.encode(peptides)
+    codons = table.choose(rows, method, rng)
+
+    dnas = []
+    forbidden = [motif.upper().encode('ascii') for motif in forbidden]
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        seq_rows = rows[start:end]
+        seq_codons = codons[start:end]
+        bad = _violations(seq_codons, gc_range, gc_window, forbidden)
+        best, best_count = seq_codons, sum(mask.sum() for mask in bad)
+        for _ in range(max_iterations):
+            if not best_count:
+                break
+            seq_codons = _repair(table, seq_rows, seq_codons, bad, rng)
+            bad = _violations(seq_codons, gc_range, gc_window, forbidden)
+            count = sum(mask.sum() for mask in bad)
+            if count < best_count:
+                best, best_count = seq_codons, count
+        dnas.append(_CODON_BYTES[best].tobytes().decode('ascii'))
+    return dnas
+
+
+
+
+
+# Helper functions
+def _table_name(organism: str) -> str:
+    return re.sub(r'[^A-Za-z0-9]+', '_', organism).strip('_')
+
+
+def _parse_kazusa(text: str) -> dict:
+    # Kazusa lists codons as "UUU 17.6(   714298)", four per line
+    return {codon.replace('U', 'T'): float(frequency)
+            for codon, frequency in re.findall(r'([ACGU]{3})\s+([\d.]+)\(', text)}
+
+
+def _violations(codons: np.ndarray, gc_range: tuple, gc_window: int, forbidden: list[bytes]) -> tuple:
+    # Return per-codon masks of (GC too high, GC too low, forbidden motif)
+    dna = _CODON_BYTES[codons].reshape(-1)
+    num_codons = len(codons)
+    high = np.zeros(num_codons, dtype=bool)
+    low = np.zeros(num_codons, dtype=bool)
+    motif_hits = np.zeros(num_codons, dtype=bool)
+
+    if gc_range is not None and len(dna):
+        window = min(gc_window, len(dna))
+        gc = np.concatenate([[0], np.cumsum((dna == ord('G')) | (dna == ord('C')))])
+        percent = (gc[window:] - gc[:-window]) / window * 100
+        for mask, windows in ((high, percent > gc_range[1]), (low, percent < gc_range[0])):
+            # Mark every codon overlapping an out-of-range window
+            starts = np.flatnonzero(windows)
+            if len(starts):
+                covered = np.zeros(len(dna)+1, dtype=np.int64)
+                np.add.at(covered, starts, 1)
+                np.add.at(covered, starts+window, -1)
+                covered = np.cumsum(covered[:-1]) > 0
+                mask |= covered.reshape(num_codons, 3).any(axis=1)
+
+    if forbidden:
+        raw = dna.tobytes()
+        for motif in forbidden:
+            position = raw.find(motif)
+            while position != -1:
+                motif_hits[position//3:(position+len(motif)-1)//3+1] = True
+                position = raw.find(motif, position+1)
+    return high, low, motif_hits
+
+
+def _repair(table: CodonTable, rows: np.ndarray, codons: np.ndarray, bad: tuple,
+            rng: np.random.Generator) -> np.ndarray:
+    # Resample flagged codons; half of the GC-window fixes jump straight to the
+    # synonymous codon that moves GC% in the right direction
+    high, low, motif_hits = bad
+    codons = codons.copy()
+    flagged = np.flatnonzero(high | low | motif_hits)
+    codons[flagged] = table.choose(rows[flagged], 'weighted', rng)
+    for mask, slots in ((high, table.lowest_gc), (low, table.highest_gc)):
+        biased = np.flatnonzero(mask & (rng.random(len(codons)) < 0.5))
+        codons[biased] = table.choices[rows[biased], slots[rows[biased]]]
+    return codons
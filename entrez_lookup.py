@@ -0,0 +1,176 @@
+import os
+import time
+import threading
+import xml.etree.ElementTree as ET
+from telemetry import TELEMETRY
+
+
+# Set the ENTREZ_BASE_URL environment variable to use a local stand-in server
+EUTILS_BASE_URL = os.environ.get('ENTREZ_BASE_URL', 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils')
+# Fraction of NCBI's request limit this process may use, lowered when several processes share it
+RATE_SHARE = 1.0
+
+
+"""
+Batched lookup of NCBI nucleotide record descriptions (GenBank DEFINITION
+lines). Unknown IDs are uploaded once with EPost and resolved in pages of
+ESummary requests, so thousands of accessions take a few round trips instead of
+one EFetch each. Requests are spaced to NCBI's limits (3 per second, or 10 with
+an API key) and descriptions are memoized for the lifetime of the object, e.g.
+across all genes of a panel. Connection errors, timeouts, rate limits (429), and
+server errors (5xx) are retried; other errors raise RuntimeError.
+
+Inputs:
+    email: email address reported to NCBI.
+    api_key: NCBI API key, raising the request limit.
+    base_url: E-utilities address. Can point to a local stand-in server for testing.
+    batch_size: maximum number of records per ESummary request.
+    retries: number of extra attempts for a failed request.
+    timeout: seconds to wait for each request.
+    backoff: seconds to wait before the first retry, doubled for every further retry.
+"""
+class EntrezLookup:
+    def __init__(self, email: str = None, api_key: str = None, base_url: str = EUTILS_BASE_URL,
+                 batch_size: int = 500, retries: int = 3, timeout: float = 60, backoff: float = 1.0):
+        import requests
+
+        self.email = email
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.batch_size = batch_size
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.descriptions = {}      # Memoized descriptions by requested ID, '' if not found
+
+        self.session = requests.Session()
+        self._interval = 1 / ((10 if api_key else 3) * RATE_SHARE)
+        self._last_request = 0.0
+        self._lock = threading.Lock()
+
+    """
+    Returns the descriptions of nucleotide records.
+
+    Input:
+        ids: accessions (with or without version) or GI numbers, may contain duplicates.
+    Returns: a dictionary of IDs and descriptions. IDs NCBI does not know map to ''.
+    """
+    def describe(self, ids: list[str]) -> dict:
+        self.prefetch(ids)
+        return {id_: self.descriptions[id_] for id_ in ids}
+
+    """
+    Resolve the descriptions of IDs that are not memoized yet.
+
+    Input:
+        ids: accessions or GI numbers.
+    """
+    def prefetch(self, ids: list[str]):
+        missing = [id_ for id_ in dict.fromkeys(ids) if id_ and id_ not in self.descriptions]
+        if not missing:
+            return
+        found = {}
+        webenv, query_key, count = self._post(missing)
+        for start in range(0, count, self.batch_size):
+            summaries, records = self._summaries(webenv, query_key, start)
+            found.update(summaries)
+            if records < self.batch_size:
+                # NCBI had fewer records than estimated, e.g. for IDs of removed records
+                break
+        for id_ in missing:
+            self.descriptions[id_] = found.get(id_, found.get(id_.split('.')[0], ''))
+
+    def close(self):
+        self.session.close()
+
+    def _post(self, ids: list[str]) -> tuple:
+        text = self._request('epost', {'db': 'nucleotide', 'id': ','.join(ids)}).text
+        try:
+            root = ET.fromstring(text)
+        except ET.ParseError as e:
+            raise RuntimeError(f"Entrez epost response could not be read: {e}\nBody:\n{text[:500]}")
+        webenv = root.findtext('WebEnv')
+        if not webenv:
+            # None of the IDs are valid
+            return None, None, 0
+        # EPost lists the IDs it could not find; only the others are stored on the history server
+        invalid = {element.text for element in root.iter('Id')} if root.find('InvalidIdList') is not None else set()
+        return webenv, root.findtext('QueryKey'), len(set(ids) - invalid)
+
+    def _summaries(self, webenv: str, query_key: str, start: int) -> tuple:
+        response = self._request('esummary', {'db': 'nucleotide', 'WebEnv': webenv, 'query_key': query_key,
+                                              'retstart': start, 'retmax': self.batch_size, 'retmode': 'json'})
+        try:
+            body = response.json()
+        except ValueError as e:
+            raise RuntimeError(f"Entrez esummary response could not be read: {e}\nBody:\n{response.text[:500]}")
+        if 'error' in body or 'esummaryresult' in body:
+            raise RuntimeError(f"Entrez esummary failed: {body.get('error') or body.get('esummaryresult')}")
+        result = body.get('result', {})
+        found = {}
+        for uid in result.get('uids', []):
+            record = result.get(uid, {})
+            if 'error' in record:
+                continue
+            # Index the description by every name a hit could carry
+            for key in [uid, record.get('accessionversion'), record.get('caption')]:
+                if key:
+                    found[str(key)] = record.get('title', '')
+        return found, len(result.get('uids', []))
+
+    def _request(self, utility: str, params: dict):
+        import requests
+
+        params = dict(params, tool='compbio_utils')
+        if self.email:
+            params['email'] = self.email
+        if self.api_key:
+            params['api_key'] = self.api_key
+
+        for attempt in range(self.retries+1):
+            if attempt:
+                time.sleep(self.backoff * 2**(attempt-1))
+            self._wait()
+            try:
+                with TELEMETRY.track(f'entrez.{utility}', retry=attempt > 0) as call:
+                    response = self.session.post(f'{self.base_url}/{utility}.fcgi', data=params, timeout=self.timeout)
+                    call.bytes_sent = len(response.request.body or '')
+                    call.bytes_received = len(response.content)
+                    call.failed = response.status_code != 200
+            except requests.exceptions.RequestException as e:
+                # Connection errors and timeouts are retried
+                problem = repr(e)
+                continue
+            if response.status_code == 200:
+                return response
+            problem = f'error code {response.status_code}'
+            if response.status_code not in [429, 500, 502, 503, 504]:
+                raise RuntimeError(f"Entrez {utility} request failed with error code: {response.status_code}\n"
+                                   f"Body:\n{response.text[:500]}")
+        raise RuntimeError(f"Entrez {utility} request failed after {self.retries+1} tries ({problem})")
+
+    def _wait(self):
+        # Space requests from all threads evenly to stay within NCBI's rate limit
+        with self._lock:
+            delay = self._last_request + self._interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._last_request = time.monotonic()
+
+
+_LOOKUPS = {}
+
+
+"""
+Returns a shared EntrezLookup, so descriptions are memoized across genes.
+
+Inputs:
+    email: email address reported to NCBI.
+    api_key: NCBI API key.
+    base_url: E-utilities address.
+"""
+def get_lookup(email: str = None, api_key: str = None, base_url: str = EUTILS_BASE_URL) -> EntrezLookup:
+    key = (email, api_key, base_url)
+    if key not in _LOOKUPS:
+        _LOOKUPS[key] = EntrezLookup(email, api_key, base_url)
+    return _LOOKUPS[key]
@@ -0,0 +1,211 @@
+import time
+import threading
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from telemetry import TELEMETRY
+
+
+IDT_BASE_URL = 'https://www.idtdna.com'
+TOKEN_PATH = '/Identityserver/connect/token'
+OPTIMIZE_PATH = '/restapi/v1/CodonOpt/Optimize'
+
+
+"""
+A client for IDT codon optimization that reuses one access token until it
+expires and one pooled HTTP session for every request. Large peptide lists are
+split into size-limited chunks that are submitted concurrently; each chunk is
+retried on its own and results are returned in the original order. Only
+connection errors, timeouts, rate limits (429), and server errors (5xx) are
+retried; rejected credentials and other client errors stop the run.
+
+Inputs:
+    IDT_username: IDT username.
+    IDT_password: IDT password.
+    client_ID: IDT client ID.
+    client_secret: IDT client secret.
+    base_url: IDT server address. Can point to a local stand-in server for testing.
+    chunk_size: maximum number of peptides per request.
+    max_chunk_residues: maximum total peptide length per request.
+    max_workers: maximum number of requests in flight.
+    retries: number of extra attempts for a failed chunk.
+    timeout: seconds to wait for each request.
+    backoff: seconds to wait before the first retry, doubled for every further retry.
+"""
+class IDTClient:
+    def __init__(self, IDT_username: str, IDT_password: str, client_ID: str, client_secret: str,
+                 base_url: str = IDT_BASE_URL, chunk_size: int = 50, max_chunk_residues: int = 50000,
+                 max_workers: int = 4, retries: int = 3, timeout: float = 60, backoff: float = 1.0):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.IDT_username = IDT_username
+        self.IDT_password = IDT_password
+        self.client_ID = client_ID
+        self.client_secret = client_secret
+        self.base_url = base_url.rstrip('/')
+        self.chunk_size = chunk_size
+        self.max_chunk_residues = max_chunk_residues
+        self.max_workers = max_workers
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(max_workers, 1))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._token = None
+        self._token_expiry = 0.0
+        self._token_lock = threading.Lock()
+
+    """
+    Returns a valid access token, requesting a new one only when the cached
+    token is missing or about to expire.
+
+    Input:
+        refresh: force requesting a new token.
+    """
+    def get_access_token(self, refresh: bool = False) -> str:
+        with self._token_lock:
+            if refresh or self._token is None or time.monotonic() >= self._token_expiry:
+                self._request_token()
+            return self._token
+
+    """
+    Reverse translate peptides with codon optimization.
+
+    Inputs:
+        data: a list of items generated with utils.build_peptide_items.
+        organism: the target organism for codon optimization.
+        product_type: the target type of DNA for codon optimization.
+    Returns: reverse translated DNA sequences, ordered the same as data. Items
+             of chunks that failed every try are None and are reported.
+    Throws RuntimeError if IDT rejects the credentials or the request.
+    """
+    def optimize(self, data: list[dict], organism: str, product_type: str) -> list[str]:
+        chunks = self._split(data)
+        if len(chunks) <= 1 or self.max_workers <= 1:
+            results = [self._submit_chunk(chunk, organism, product_type) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(executor.map(lambda chunk: self._submit_chunk(chunk, organism, product_type), chunks))
+        return [dna for result in results for dna in result]
+
+    def close(self):
+        self.session.close()
+
+    def _request_token(self):
+        authorization_string = b64encode(bytes(self.client_ID + ":" + self.client_secret, "utf-8")).decode()
+        with TELEMETRY.track('idt.token') as call:
+            response = self.session.post(self.base_url + TOKEN_PATH,
+                                         data={"grant_type": "password",
+                                               "scope": "test",
+                                               "username": self.IDT_username,
+                                               "password": self.IDT_password},
+                                         headers={"Authorization": "Basic " + authorization_string},
+                                         timeout=self.timeout)
+            call.bytes_sent = len(response.request.body or '')
+            call.bytes_received = len(response.content)
+            call.failed = response.status_code != 200
+        if _is_transient(response.status_code):
+            response.raise_for_status()
+        if response.status_code != 200:
+            raise RuntimeError(f"Request failed with error code: {response.status_code}\nBody:\n{response.text}")
+        body = response.json()
+        # Refresh a minute early so tokens do not expire mid-request
+        self._token = body["access_token"]
+        self._token_expiry = time.monotonic() + max(float(body.get("expires_in", 3600)) - 60, 0)
+
+    def _split(self, data: list[dict]) -> list[list[dict]]:
+        chunks = []
+        chunk = []
+        residues = 0
+        for item in data:
+            length = len(item['Sequence'])
+            if chunk and (len(chunk) >= self.chunk_size or residues + length > self.max_chunk_residues):
+                chunks.append(chunk)
+                chunk = []
+                residues = 0
+            chunk.append(item)
+            residues += length
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def _submit_chunk(self, chunk: list[dict], organism: str, product_type: str) -> list[str]:
+        import requests
+
+        refresh = False
+        problem = None
+        for attempt in range(self.retries+1):
+            if attempt:
+                time.sleep(self.backoff * 2**(attempt-1))
+            refreshed = refresh
+            try:
+                access_token = self.get_access_token(refresh=refresh)
+                with TELEMETRY.track('idt.optimize', retry=attempt > 0) as call:
+                    response = self.session.post(self.base_url + OPTIMIZE_PATH,
+                                                 json={
+                                                     'organism': organism,
+                                                     'optimizationItems': chunk,
+                                                     'sequenceType': 'aminoAcid',
+                                                     'productType': product_type
+                                                 },
+                                                 headers={
+                                                     'Authorization': f'Bearer {access_token}',
+                                                     'Content-Type': 'application/json'
+                                                 },
+                                                 timeout=self.timeout)
+                    call.bytes_sent = len(response.request.body or b'')
+                    call.bytes_received = len(response.content)
+                    call.failed = response.status_code != 200
+            except requests.exceptions.RequestException as e:
+                # Connection errors, timeouts, and busy servers are retried; other errors are raised
+                refresh = False
+                problem = repr(e)
+                continue
+            # An expired or revoked token is replaced once before the next attempt
+            refresh = response.status_code == 401
+            if response.status_code == 200:
+                try:
+                    results = parse_optimization_results(response.json())
+                except (ValueError, KeyError, TypeError) as e:
+                    problem = f'unreadable response {e!r}'
+                    continue
+                if len(results) == len(chunk):
+                    return results
+                problem = f'{len(results)} results for {len(chunk)} peptides'
+            elif _is_transient(response.status_code) or (refresh and not refreshed):
+                problem = f'error code {response.status_code}'
+            else:
+                raise RuntimeError(f"Request failed with error code: {response.status_code}\nBody:\n{response.text}")
+        print(f'IDT codon optimization of {len(chunk)} peptides failed after {self.retries+1} tries ({problem}); '
+              f'they are marked as failed')
+        return [None] * len(chunk)
+
+
+"""
+Clean up an IDT codon optimization response into a list of DNA sequences.
+
+Input:
+    results: decoded JSON response of the codon optimization endpoint.
+Returns: DNA sequences, with None for items IDT could not optimize.
+"""
+def parse_optimization_results(results: list[dict]) -> list[str]:
+    dnas = []
+    for result in results:
+        if 'Message' in result:
+            dnas.append(None)
+        else:
+            dnas.append(result['OptResult']['FullSequence'])
+    return dnas
+
+
+
+
+
+# Helper functions
+def _is_transient(status_code: int) -> bool:
+    # Rate limits and server errors may pass on their own and are worth retrying
+    return status_code == 429 or status_code >= 500
@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+from sequence_kernels import reverse_complement
+
+
+"""
+Cross-hybridization screen of a multiplexed probe panel. Every oligo of the panel
+(HCR3 probe A/B, USeqFISH primer/padlock, and the HCR3 initiators) is cut into
+k-mer seeds kept in a hash index. Looking up the reverse complement of each seed
+finds complementary pairs without comparing every oligo with every other one, so
+the screen grows about linearly with the panel size. Seed hits on the same
+alignment diagonal are chained into complementary stretches, and pairs with a
+long enough stretch are reported as conflicts.
+"""
+
+
+OLIGO_PARTS = ['probe A', 'probe B', 'primer', 'padlock']
+CONFLICT_COLUMNS = ['name 1', 'probe 1', 'part 1', 'name 2', 'probe 2', 'part 2', 'complementary length']
+
+
+"""
+Collect the oligos of designed probe tables into one panel table.
+
+Inputs:
+    results: probe tables generated with designHCR3Probes or designUSeqFISHProbes.
+    hairpin_ids: HCR3 initiator IDs used by the panel; their initiators are added
+                 so probes complementary to another gene's initiator are found.
+Returns: a table with the columns name, probe (row of the probe in its gene's
+         table, -1 for initiators), part, and sequence.
+"""
+def panel_oligos(results: list, hairpin_ids: list[int] = ()):
+    from probe_design_adapted import GetInitiatorSeq
+
+    rows = []
+    for resultdf in results:
+        parts = [part for part in OLIGO_PARTS if part in resultdf.columns]
+        names = resultdf['name'] if 'name' in resultdf.columns else [''] * len(resultdf)
+        for probe, (name, *seqs) in enumerate(zip(names, *[resultdf[part] for part in parts])):
+            for part, seq in zip(parts, seqs):
+                rows.append([str(name), probe, part, str(seq).replace('/5Phos/', '').upper()])
+    for hairpin_id in sorted(set(hairpin_ids)):
+        rows.append([f'initiator B{hairpin_id}', -1, 'initiator', GetInitiatorSeq(hairpin_id).upper()])
+    return pd.DataFrame(rows, columns=['name', 'probe', 'part', 'sequence'])
+
+
+"""
+Find pairs of panel oligos that are complementary over a stretch of at least
+min_length nucleotides.
+
+Inputs:
+    oligos: panel table generated with panel_oligos.
+    k: seed length; should not exceed min_length.
+    min_length: shortest complementary stretch reported.
+    max_occurrences: seeds already found more often than this in earlier oligos
+                     (e.g. shared backbone sequences) are checked once against
+                     the shared sequence instead of against every oligo carrying it.
+Returns: a table with CONFLICT_COLUMNS, one row per conflicting pair. Pairs with
+         a shared sequence have "shared" as part 2 and, as probe 2, the number of
+         other oligos of the panel carrying the most common seed complementary
+         to the stretch.
+"""
+def find_cross_hybridization(oligos, k: int = 10, min_length: int = 14, max_occurrences: int = 100):
+    assert k <= min_length, "k should not be longer than min_length"
+    sequences = oligos['sequence'].tolist()
+    index = defaultdict(list)       # seed -> (oligo, position) of earlier oligos
+    hits = defaultdict(list)        # (oligo 1, oligo 2) -> diagonals and positions of seed hits
+    shared = defaultdict(list)      # oligo -> positions and complements of seeds complementary to frequent seeds
+
+    for j, seq in enumerate(sequences):
+        seeds = [seq[p:p+k] for p in range(len(seq)-k+1)]
+        for p, seed in enumerate(seeds):
+            partners = index.get(reverse_complement(seed), ())
+            if len(partners) > max_occurrences:
+                shared[j].append((p, reverse_complement(seed)))
+                continue
+            for i, q in partners:
+                # seq_i[q:q+k] pairs with seq_j[p:p+k]; q+p is constant along one duplex
+                hits[(i, j)].append((q+p, q))
+        for p, seed in enumerate(seeds):
+            index[seed].append((j, p))
+
+    rows = []
+    for (i, j), pair_hits in hits.items():
+        if len(pair_hits) < min_length - k + 1:
+            continue
+        length = _longest_chain(pair_hits, k)
+        if length >= min_length:
+            rows.append(_conflict_row(oligos, i, j, length))
+    # Chain frequent seeds of each oligo by position to measure the shared stretch
+    for j, seeds in shared.items():
+        if len(seeds) < min_length - k + 1:
+            continue
+        length = _longest_chain([(0, p) for p, _ in seeds], k)
+        if length >= min_length:
+            # Count carriers in the finished index, so oligos after this one are included too
+            carriers = max(len({i for i, _ in index[seed]} - {j}) for _, seed in seeds)
+            row = oligos.iloc[j]
+            rows.append([row['name'], row['probe'], row['part'], '', carriers, 'shared', length])
+    return pd.DataFrame(rows, columns=CONFLICT_COLUMNS)
+
+
+"""
+Choose probes to drop so no conflicts remain, greedily dropping the probe with
+the most conflicts first. Initiators are never dropped.
+
+Inputs:
+    conflicts: conflict table generated with find_cross_hybridization.
+Returns: a set of (name, probe) of probes to drop. Both parts of a probe are dropped together.
+"""
+def choose_probes_to_drop(conflicts) -> set:
+    edges = []
+    for row in conflicts.itertuples(index=False):
+        first = (row[0], row[1]) if row[1] >= 0 else None
+        second = (row[3], row[4]) if row[4] >= 0 and row[5] != 'shared' else None
+        if first is None and second is None:
+            continue
+        # A conflict with an initiator or shared sequence can only be solved on the probe's side
+        edges.append((first or second, second or first))
+
+    dropped = set()
+    while edges:
+        counts = defaultdict(int)
+        for a, b in edges:
+            counts[a] += 1
+            if b != a:
+                counts[b] += 1
+        worst = max(counts, key=counts.get)
+        dropped.add(worst)
+        edges = [(a, b) for a, b in edges if worst not in (a, b)]
+    return dropped
+
+
+"""
+Screen a panel and optionally remove conflicting probes.
+
+Inputs:
+    results: probe tables generated with designHCR3Probes or designUSeqFISHProbes.
+    hairpin_ids: HCR3 initiator IDs used by the panel.
+    drop: remove conflicting probes from the returned tables.
+    screen_options: settings passed to find_cross_hybridization.
+Returns: the conflict table and the probe tables (filtered if drop is set).
+"""
+def screen_panel(results: list, hairpin_ids: list[int] = (), drop: bool = False, **screen_options) -> tuple:
+    oligos = panel_oligos(results, hairpin_ids)
+    conflicts = find_cross_hybridization(oligos, **screen_options)
+    print(f'Found {len(conflicts)} cross-hybridizing pairs among {len(oligos)} oligos')
+    if not drop or conflicts.empty:
+        return conflicts, results
+
+    dropped = choose_probes_to_drop(conflicts)
+    filtered = []
+    for resultdf in results:
+        names = resultdf['name'].astype(str) if 'name' in resultdf.columns else pd.Series('', index=resultdf.index)
+        keep = [(name, probe) not in dropped for probe, name in enumerate(names)]
+        filtered.append(resultdf[np.array(keep, dtype=bool)])
+    print(f'Dropped {len(dropped)} probes to resolve all conflicts')
+    return conflicts, filtered
+
+
+
+
+
+# Helper functions
+def _longest_chain(hits: list[tuple], k: int) -> int:
+    # Seeds on the same diagonal at consecutive positions form one stretch of k+n-1 nucleotides
+    longest = 0
+    for diagonal, positions in _group(hits).items():
+        positions = np.unique(positions)
+        breaks = np.flatnonzero(np.diff(positions) != 1)
+        starts = np.concatenate([[0], breaks+1])
+        ends = np.concatenate([breaks, [len(positions)-1]])
+        longest = max(longest, int((ends - starts).max()) + k)
+    return longest
+
+
+def _group(hits: list[tuple]) -> dict:
+    groups = defaultdict(list)
+    for diagonal, position in hits:
+        groups[diagonal].append(position)
+    return groups
+
+
+def _conflict_row(oligos, i: int, j: int, length: int) -> list:
+    first, second = oligos.iloc[i], oligos.iloc[j]
+    return [first['name'], first['probe'], first['part'], second['name'], second['probe'], second['part'], length]
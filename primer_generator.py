@@ -1,8 +1,12 @@
 import os
+import time
 import pandas as pd
-import numpy as np
 from utils import get_six_digit_date_today, select_input_file, select_output_directory, report_progress
-from utils import get_sequence_from_coordinate, pick_primer, Primer
+from telemetry import TELEMETRY
+from utils import get_sequence_from_coordinate, design_primer_pair, primer_redesigner, primer_table
+from table_io import read_table_chunks, TableWriter, export_excel, INPUT_FILETYPES
+from primer_specificity import check_primer_specificity, SPECIFICITY_COLUMNS
+from primer_qc import check_primer_dimers, QC_COLUMNS
 
 
 ################################# CHANGE SETTINGS BEFORE EACH RUN ################################
@@ -22,77 +26,82 @@ HIGH_GC = 60
 LOW_TM = 50
 HIGH_TM = 60
 LEN_RANGE = range(22, 26)
+OUTPUT_FORMAT = 'csv'
+EXCEL_EXPORT = False
+CHUNK_SIZE = 10000
+CHECK_DIMERS = True
+HAIRPIN_DG = -3
+DIMER_DG = -6
+REPLACE_FAILED_QC = True
+CHECK_SPECIFICITY = False
+GENOME_INDEX = ''
+MAX_HITS = 1
+REPLACE_NONSPECIFIC = True
 ##################################################################################################
 
 
-# Import file
-import_file_name = select_input_file([("Excel-1", ".xlsx"), ("Excel-2", ".xls"),
-                                      ("Excel-3", ".xlsm"), ("Excel-4", ".xlsb"),
-                                      ("Excel-5", ".odf"), ("Excel-6", ".ods"),
-                                      ("Excel-7", ".odt"), ("CSV", ".csv"), ("TXT", ".txt")])
-df = pd.read_excel(import_file_name)
-array = df.values
-titles = df.columns.to_list()
-
-# Retrieve sequences for genome if necessary
-if CONVERT_FROM_COORDINATES:
-    print('\n------------ Retrieving sequences from chromosome coordinates ------------')
-    coordinates = [peak[COORDINATE_COLUMN_NUMBER] for peak in array]
-    total_seqs = []
-    for i in range(len(array)):
-        total_seqs.append(get_sequence_from_coordinate(coordinates[i], FLANK_INCLUDED, FLANK_SIZE))
-        report_progress(i+1, len(array))
-else:
-    total_seqs = [peak[SEQUENCE_COLUMN_NUMBER] for peak in array]
-
+# Import file and select output location
+import_file_name = select_input_file(INPUT_FILETYPES)
+date = get_six_digit_date_today()
+filename = os.path.splitext(os.path.basename(import_file_name))[0] + f'_with_primers_{date}.{OUTPUT_FORMAT}'
+export_file_name = os.path.join(select_output_directory(), filename)
 
-# Select forward and reverse primers
-print('\n------------ Selecting primers ------------')
 print(f'\nSelection criteria:\n{LEN_RANGE[0]} ≤ length ≤ {LEN_RANGE[-1]};\n{LOW_GC}% ≤ GC% ≤ {HIGH_GC}%;\n{LOW_TM}°C ≤ Tm ≤ {HIGH_TM}°C\n')
-primers = []
 i = 1
-for seq in total_seqs:
-    primer = Primer()
+with TableWriter(export_file_name) as writer:
+    for df in read_table_chunks(import_file_name, CHUNK_SIZE):
+        # Retrieve sequences for genome if necessary
+        if CONVERT_FROM_COORDINATES:
+            print(f'\n------------ Retrieving sequences for rows {i}-{i+len(df)-1} from chromosome coordinates ------------')
+            seqs = []
+            start_time = time.monotonic()
+            for j, coordinate in enumerate(df.iloc[:, COORDINATE_COLUMN_NUMBER]):
+                seqs.append(get_sequence_from_coordinate(coordinate, FLANK_INCLUDED, FLANK_SIZE))
+                report_progress(j, len(df), start_time=start_time)
+        else:
+            seqs = df.iloc[:, SEQUENCE_COLUMN_NUMBER].tolist()
 
-    for length in LEN_RANGE:
-        if primer.fwd and primer.rev:
-            break
-        fwd_flank = seq[:FLANK_SIZE]
-        rev_flank = seq[TARGET_LENGTH+FLANK_SIZE:]
-        while len(fwd_flank) >= length and len(rev_flank) >= length:
-            if primer.fwd and primer.rev:
-                break
-            if TIGHT_FLANK:
-                pick_primer(primer, 'fwd', fwd_flank[-length:],
-                            FORBIDDEN, LOW_GC, HIGH_GC, LOW_TM, HIGH_TM)
-                pick_primer(primer, 'rev', rev_flank[:length],
-                            FORBIDDEN, LOW_GC, HIGH_GC, LOW_TM, HIGH_TM)
-                fwd_flank = fwd_flank[:-1]
-                rev_flank = rev_flank[1:]
-            else:
-                pick_primer(primer, 'fwd', fwd_flank[:length],
-                            FORBIDDEN, LOW_GC, HIGH_GC, LOW_TM, HIGH_TM)
-                pick_primer(primer, 'rev', rev_flank[-length:],
-                            FORBIDDEN, LOW_GC, HIGH_GC, LOW_TM, HIGH_TM)
-                fwd_flank = fwd_flank[1:]
-                rev_flank = rev_flank[:-1]
+        # Select forward and reverse primers
+        print('\n------------ Selecting primers ------------')
+        primers = []
+        for seq in seqs:
+            primer = design_primer_pair(seq, FLANK_SIZE, TARGET_LENGTH, LEN_RANGE, TIGHT_FLANK,
+                                        FORBIDDEN, LOW_GC, HIGH_GC, LOW_TM, HIGH_TM)
+            primers.append(primer)
+            primer.message(i)
+            i += 1
 
-    primers.append(primer)
-    primer.message(i)
-    i += 1
+        tables = [df]
+        # Rejections of QC and the specificity check are shared so neither brings back the other's rejects
+        redesign = primer_redesigner(seqs, FLANK_SIZE, TARGET_LENGTH, LEN_RANGE, TIGHT_FLANK,
+                                     FORBIDDEN, LOW_GC, HIGH_GC, LOW_TM, HIGH_TM)
 
-# Generate excel file with primers and their information
-print('\nGenerating excel file...')
-new_array = [primer.fwd_info() + primer.rev_info() for primer in primers]
-for enhancer in new_array:
-    enhancer.append(LEFT_HOMOLOGY_ARM + enhancer[0])
-    enhancer.append(RIGHT_HOMOLOGY_ARM + enhancer[4])
-new_df = pd.DataFrame(np.hstack((array, np.array(new_array))))
-new_df.columns = titles + ['fwd primer', 'fwd length', 'fwd GC%', 'fwd Tm',
-                           'rev primer', 'rev length', 'rev GC%', 'rev Tm',
-                           'full fwd', 'full rev']
-date = get_six_digit_date_today()
-filename = os.path.splitext(os.path.basename(import_file_name))[0] + f'_with_primers_{date}.xlsx'
-export_file_name = os.path.join(select_output_directory(), filename)
-new_df.to_excel(export_file_name, index=False)
+        # Check hairpins and dimers of all primers in the chunk at once
+        if CHECK_DIMERS:
+            print('\n------------ Checking hairpins and dimers ------------')
+            primers, qc = check_primer_dimers(primers, redesign if REPLACE_FAILED_QC else None, HAIRPIN_DG, DIMER_DG)
+
+        # Check all primers of the chunk against the genome in one bowtie2 run
+        if CHECK_SPECIFICITY:
+            print('\n------------ Checking primer specificity ------------')
+            primers, specificity = check_primer_specificity(primers, GENOME_INDEX, redesign if REPLACE_NONSPECIFIC else None,
+                                                            MAX_HITS)
+            print(f'{sum(result[2] for result in specificity)}/{len(primers)} primer pairs are specific')
+            tables.append(pd.DataFrame(specificity, columns=SPECIFICITY_COLUMNS, index=df.index))
+            if CHECK_DIMERS:
+                # Replacement primers are analyzed too; unchanged pairs come from the cache
+                primers, qc = check_primer_dimers(primers, None, HAIRPIN_DG, DIMER_DG)
+        if CHECK_DIMERS:
+            print(f'{sum(result[-1] for result in qc)}/{len(primers)} primer pairs passed hairpin and dimer QC')
+            tables.insert(1, pd.DataFrame(qc, columns=QC_COLUMNS, index=df.index))
+
+        # Append primers and their information to the output file
+        tables.insert(1, primer_table(primers, LEFT_HOMOLOGY_ARM, RIGHT_HOMOLOGY_ARM, df.index))
+        writer.write(pd.concat(tables, axis=1))
+
+if CONVERT_FROM_COORDINATES:
+    TELEMETRY.print_report()
+if EXCEL_EXPORT and OUTPUT_FORMAT != 'xlsx':
+    print('\nGenerating excel file...')
+    export_excel(export_file_name)
 print('Complete!\n')
@@ -0,0 +1,135 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+"""
+Secondary structure QC of designed PCR primers with primer3: hairpin and
+homodimer ΔG of every primer and heterodimer ΔG of every forward/reverse pair.
+All calculations of a batch are collected first, duplicates and previously
+computed sequences are skipped, and large batches can be spread over a process
+pool. ΔG values are in kcal/mol at primer3's default reaction conditions.
+
+The pool is off by default: where processes start by spawning (macOS, Windows),
+every worker imports the main script again, so only ask for more than one
+process from a script guarded with if __name__ == '__main__', e.g. batch_cli.py.
+"""
+
+
+DEFAULT_HAIRPIN_DG = -3     # Hairpins at or below this ΔG fail QC
+DEFAULT_DIMER_DG = -6       # Homo- and heterodimers at or below this ΔG fail QC
+QC_COLUMNS = ['fwd hairpin dG', 'fwd homodimer dG', 'rev hairpin dG', 'rev homodimer dG',
+              'heterodimer dG', 'QC pass']
+
+_DG_CACHE = {}              # Calculated ΔG by (kind, sequence(s))
+_MAX_CACHE_SIZE = 1000000
+
+
+"""
+Calculate ΔG of primer3 thermodynamic analyses, reusing earlier results.
+
+Inputs:
+    tasks: tuples of ('hairpin', seq), ('homodimer', seq), or ('heterodimer', seq1, seq2).
+    processes: number of worker processes; None for the number of CPUs. See the
+               module description before using more than 1.
+    min_parallel: smallest number of new calculations worth starting a process pool for.
+Returns: ΔG of every task in kcal/mol, ordered the same as tasks.
+"""
+def calc_dg(tasks: list[tuple], processes: int = 1, min_parallel: int = 2000) -> list[float]:
+    processes = processes or os.cpu_count() or 1
+    known = {task: _DG_CACHE[task] for task in set(tasks) if task in _DG_CACHE}
+    missing = [task for task in dict.fromkeys(tasks) if task not in known]
+    if missing:
+        if processes > 1 and len(missing) >= min_parallel:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                values = list(executor.map(_thermo_dg, missing, chunksize=max(len(missing) // (processes*4), 1)))
+        else:
+            values = [_thermo_dg(task) for task in missing]
+        known.update(zip(missing, values))
+        if len(_DG_CACHE) + len(missing) > _MAX_CACHE_SIZE:
+            _DG_CACHE.clear()
+        _DG_CACHE.update(zip(missing, values))
+    return [known[task] for task in tasks]
+
+
+"""
+Check primer pairs for hairpins, homodimers, and heterodimers and optionally
+replace failing primers with the next valid candidates. Every round analyzes all
+pairs that still need checking as one batch.
+
+Inputs:
+    primers: primer pairs generated with utils.design_primer_pair.
+    redesign: function taking the row number and a set of rejected primer
+              sequences and returning a new primer pair, e.g. design_primer_pair
+              with exclude set; None to only flag primers.
+    hairpin_dg: hairpin ΔG threshold in kcal/mol.
+    dimer_dg: homodimer and heterodimer ΔG threshold in kcal/mol.
+    rounds: maximum number of replacement rounds.
+    processes: number of worker processes, see calc_dg.
+Returns: the checked primer pairs and, for each pair, a list of ΔG values and
+         if the pair passed QC (QC_COLUMNS). Missing primers have no ΔG and fail.
+"""
+def check_primer_dimers(primers: list, redesign=None, hairpin_dg: float = DEFAULT_HAIRPIN_DG,
+                        dimer_dg: float = DEFAULT_DIMER_DG, rounds: int = 3, processes: int = 1) -> tuple:
+    primers = list(primers)
+    results = [None] * len(primers)
+    rejected = [set() for _ in primers]
+    pending = list(range(len(primers)))
+
+    for round_number in range(rounds+1):
+        tasks = []
+        for i in pending:
+            fwd, rev = primers[i].fwd, primers[i].rev_oligo()
+            tasks += [('hairpin', fwd), ('homodimer', fwd), ('hairpin', rev), ('homodimer', rev),
+                      ('heterodimer', fwd, rev)]
+        dgs = iter(calc_dg([task for task in tasks if all(task[1:])], processes))
+        values = [next(dgs) if all(task[1:]) else None for task in tasks]
+
+        retry = []
+        for j, i in enumerate(pending):
+            fwd_hairpin, fwd_homodimer, rev_hairpin, rev_homodimer, heterodimer = values[5*j:5*j+5]
+            fwd_ok = fwd_hairpin is not None and fwd_hairpin > hairpin_dg and fwd_homodimer > dimer_dg
+            rev_ok = rev_hairpin is not None and rev_hairpin > hairpin_dg and rev_homodimer > dimer_dg
+            passed = fwd_ok and rev_ok and heterodimer > dimer_dg
+            results[i] = [fwd_hairpin, fwd_homodimer, rev_hairpin, rev_homodimer, heterodimer, passed]
+            if passed or redesign is None or round_number == rounds:
+                continue
+            new_rejects = set()
+            if primers[i].fwd and not fwd_ok:
+                new_rejects.add(primers[i].fwd)
+            if primers[i].rev and not rev_ok:
+                new_rejects.add(primers[i].rev)
+            if not new_rejects and fwd_ok and rev_ok:
+                # Only the pair dimerizes; look for another reverse primer
+                new_rejects.add(primers[i].rev)
+            if new_rejects:
+                rejected[i] |= new_rejects
+                primers[i] = redesign(i, rejected[i])
+                retry.append(i)
+        if not retry:
+            break
+        pending = retry
+    return primers, results
+
+
+"""
+Forget all memoized ΔG values.
+"""
+def clear_cache():
+    _DG_CACHE.clear()
+
+
+
+
+
+# Helper functions
+def _thermo_dg(task: tuple) -> float:
+    import primer3
+
+    kind, *seqs = task
+    if kind == 'hairpin':
+        result = primer3.calc_hairpin(*seqs)
+    elif kind == 'homodimer':
+        result = primer3.calc_homodimer(*seqs)
+    else:
+        result = primer3.calc_heterodimer(*seqs)
+    return round(result.dg / 1000, 2)
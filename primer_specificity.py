@@ -0,0 +1,110 @@
+import os
+import subprocess
+import tempfile
+from alignment_index import bowtie2_index_args
+
+
+"""
+Genome specificity screening of designed PCR primers. All forward and reverse
+primers of a batch are written to one FASTA file and aligned with a single
+bowtie2 call, so the genome index is loaded once per batch. The SAM output is
+parsed while bowtie2 is still running instead of being written to disk.
+"""
+
+
+SPECIFICITY_COLUMNS = ['fwd hits', 'rev hits', 'specific']
+
+
+"""
+Count genome alignments of primer sequences with one bowtie2 run.
+
+Inputs:
+    seqs: primer sequences, 5' to 3'.
+    db: bowtie2 index prefix of the genome.
+    max_hits: number of alignments a specific primer may have. bowtie2 stops
+              searching a primer after max_hits+1 alignments.
+    score_min: bowtie2 --score-min for end-to-end alignment.
+    threads: number of bowtie2 threads.
+    extra_args: additional bowtie2 arguments.
+Returns: number of alignments found for each sequence, capped at max_hits+1.
+"""
+def count_alignments(seqs: list[str], db: str, max_hits: int = 1, score_min: str = 'L,-0.6,-0.6',
+                     threads: int = 1, extra_args: list[str] = ()) -> list[int]:
+    counts = [0] * len(seqs)
+    queries = [(i, seq) for i, seq in enumerate(seqs) if seq]
+    if not queries:
+        return counts
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fastafile = os.path.join(tmpdir, 'primers.fasta')
+        with open(fastafile, 'w') as f:
+            for i, seq in queries:
+                f.write(f'>{i}\n{seq}\n')
+
+        call = ['bowtie2', '--end-to-end', '-f', '--no-hd', '--no-sq', '--no-unal',
+                '-k', str(max_hits+1), '--score-min', score_min, '-p', str(threads),
+                '-x', db, '-U', fastafile] + bowtie2_index_args() + list(extra_args)
+        with subprocess.Popen(call, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) as process:
+            for line in process.stdout:
+                if line.startswith('@'):
+                    continue
+                name, flag = line.split('\t', 2)[:2]
+                if not int(flag) & 4:
+                    counts[int(name)] += 1
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, call)
+    return counts
+
+
+"""
+Check primer pairs for off-target genome alignments and optionally replace
+non-specific primers with the next valid candidates. Every round aligns all
+primers that still need checking in one bowtie2 call.
+
+Inputs:
+    primers: primer pairs generated with utils.design_primer_pair.
+    redesign: function taking the row number and a set of rejected primer
+              sequences and returning a new primer pair, e.g. design_primer_pair
+              with exclude set; None to only flag primers.
+    db: bowtie2 index prefix of the genome.
+    max_hits: number of alignments a specific primer may have (its own site).
+    rounds: maximum number of replacement rounds.
+    bowtie2_options: extra settings passed to count_alignments.
+Returns: the checked primer pairs and, for each pair, a list of forward hits,
+         reverse hits, and if both primers are specific (SPECIFICITY_COLUMNS).
+"""
+def check_primer_specificity(primers: list, db: str, redesign=None, max_hits: int = 1,
+                             rounds: int = 3, **bowtie2_options) -> tuple:
+    primers = list(primers)
+    results = [None] * len(primers)
+    rejected = [set() for _ in primers]
+    pending = list(range(len(primers)))
+
+    for round_number in range(rounds+1):
+        seqs = []
+        for i in pending:
+            seqs += [primers[i].fwd, primers[i].rev_oligo()]
+        counts = count_alignments(seqs, db, max_hits=max_hits, **bowtie2_options)
+
+        retry = []
+        for j, i in enumerate(pending):
+            fwd_hits, rev_hits = counts[2*j], counts[2*j+1]
+            specific = bool(primers[i].fwd and primers[i].rev) and fwd_hits <= max_hits and rev_hits <= max_hits
+            results[i] = [fwd_hits, rev_hits, specific]
+            if specific or redesign is None or round_number == rounds:
+                continue
+            # Reject the offending primers and search the flanks again
+            new_rejects = set()
+            if primers[i].fwd and fwd_hits > max_hits:
+                new_rejects.add(primers[i].fwd)
+            if primers[i].rev and rev_hits > max_hits:
+                new_rejects.add(primers[i].rev)
+            if new_rejects:
+                rejected[i] |= new_rejects
+                primers[i] = redesign(i, rejected[i])
+                retry.append(i)
+        if not retry:
+            break
+        pending = retry
+    return primers, results
+
@@ -2,47 +2,30 @@
 
 import subprocess
 import os
+import io
 import numpy as np
 import pandas as pd
-import nupack
 from Bio import SeqIO, Entrez
 from Bio.SeqRecord import SeqRecord
 from Bio.Seq import Seq
 from primer3 import calc_hairpin
+from sequence_kernels import reverse_complement, encode_batch, gc_content_batch, has_homopolymer_batch
+from telemetry import TELEMETRY
+from entrez_lookup import get_lookup
+from alignment_index import bowtie2_index_args
+from secondary_structure import mfe_structures
 
 
 def designHCR3Probes(gene_id="", gene_name="", hairpin_id=None, email=None, 
                 sequence="", db=os.getcwd(), result_path=os.getcwd(), 
                 prb_length=20, gc_range=[40, 60], prb_space=1, dg_thresh=-9, 
-                spacer = ['ta','at'], to_excel=False):
+                spacer = ['ta','at'], to_excel=False, last_pos=None):
+    # last_pos: position of the last probe accepted before this sequence (e.g. in the previous
+    # window of a tiled record), so spacing continues from it
     if email:
         Entrez.email=email
 
-    if not sequence:
-        # retrieve target sequence from genbank by using accession id
-        handle = Entrez.efetch(db="nucleotide", id=gene_id, rettype="gb", retmode="text")
-        target = SeqIO.read(handle, "genbank")
-        if gene_name.lower() not in target.description.lower():
-            print('Target name and accession number are not matched!')
-            handle.close()
-            exit()
-        handle.close()
-
-        # find the coding region of the target
-        cds_start = 0
-        cds_end = 0
-        for feature in target.features:
-            if feature.type == 'CDS':
-                cds_start = feature.location._start.position
-                cds_end = feature.location._end.position
-    else:
-        target = SeqRecord(
-            Seq(sequence.upper()),
-            name=gene_name,
-        )
-
-        cds_start = 0
-        cds_end = len(sequence)
+    target, cds_start, cds_end = LoadTarget(gene_id, gene_name, sequence)
 
     print(f'---------------- {gene_name} started ----------------')
 
@@ -62,12 +45,7 @@ def designHCR3Probes(gene_id="", gene_name="", hairpin_id=None, email=None,
 
     # Get full probe sequences and align
     init_seq = GetInitiatorSeq(hairpin_id)
-    prbs_full = []
-    for i in range(num_prbs):
-        full_rec = SeqRecord(init_seq[0:int(len(init_seq)/2)]+spacer[0]+prbs[i].seq[prb_length:prb_length*2], f'{i+1}-1', '', '')
-        prbs_full.append(full_rec)
-        full_rec = SeqRecord(prbs[i].seq[0:prb_length]+spacer[1]+init_seq[int(len(init_seq)/2):len(init_seq)], f'{i+1}-2', '', '')
-        prbs_full.append(full_rec) 
+    prbs_full = FullProbeRecords(prbs, init_seq, prb_length=prb_length, spacer=spacer)
     count = SeqIO.write(prbs_full, os.path.join(result_path, f"{gene_name}_prbs_candidates_full.fasta"), "fasta")
     print("Converted %i records" % count)
     ProbeBowtie2(os.path.join(result_path, f"{gene_name}_prbs_candidates_full.fasta"), db=db,
@@ -92,29 +70,16 @@ def designHCR3Probes(gene_id="", gene_name="", hairpin_id=None, email=None,
     prb_final_pos = []
     for pos in prb_pos:
         if (pos > cds_start) & (pos+prb_length*2 < cds_end):
-            if len(prb_final_pos) == 0:
+            previous = prb_final_pos[-1] if prb_final_pos else last_pos
+            if previous is None:
                 prb_final_pos.append(pos)
-            elif pos > prb_final_pos[-1] + prb_length*2 + prb_space:
+            elif pos > previous + prb_length*2 + prb_space:
                 prb_final_pos.append(pos)
     print(f'- {gene_name} done! Generated %i' % len(prb_final_pos), 'pairs of probes\n')
 
     # recall probe pairs
-    prb_final_A = []
-    prb_final_B = []
-    for pos in prb_final_pos:
-        prb_final_A.append(str(init_seq[0:int(len(init_seq)/2)]+spacer[0]+prbs[pos].seq[prb_length:prb_length*2]))
-        prb_final_B.append(str(prbs[pos].seq[0:prb_length]+spacer[1]+init_seq[int(len(init_seq)/2):len(init_seq)]))
-
-    result = {'name': gene_name, 
-              'accession': gene_id, 
-              'position':prb_final_pos, 
-              'probe A':prb_final_A, 
-              'probe B':prb_final_B}
-    resultdf = pd.DataFrame(result)
-    if to_excel:
-        resultdf.to_excel(excel_writer = os.path.join(result_path, f"{gene_name}_probes.xlsx"))
-
-    return resultdf
+    return HCR3ProbeTable(gene_name, gene_id, prb_final_pos, [prbs[pos].seq for pos in prb_final_pos], init_seq,
+                          prb_length=prb_length, spacer=spacer, to_excel=to_excel, result_path=result_path)
 
 def designUSeqFISHProbes(gene_id="", gene_name="", email=None,
                 sequence="", db=os.getcwd(), ugi_path=os.getcwd(), 
@@ -122,7 +87,7 @@ def designUSeqFISHProbes(gene_id="", gene_name="", email=None,
                 prb_length=20, gc_range=[40, 60], primer_end="TAATGTTATCTT",
                 padlock_start="ACATTA", padlock_end="AAGATA", spacer1="attta",
                 spacer2 = "atta", prb_space=1, dg_thresh=-9, 
-                to_excel=False):
+                to_excel=False, processes=None):
     if email:
         Entrez.email = email
 
@@ -133,30 +98,8 @@ def designUSeqFISHProbes(gene_id="", gene_name="", email=None,
 
     # Get Sequence
     if not sequence:
-        # retrieve target sequence from genbank by using accession id
         print("Looking up gene with accession id")
-        handle = Entrez.efetch(db="nucleotide", id=gene_id, rettype = "gb", retmode = "text")
-        target = SeqIO.read(handle, "genbank")
-        if gene_name.lower() not in target.description.lower():
-            print('Target name and accession number are not matched!')
-            handle.close()
-            exit()
-        handle.close()
-        # find the coding region of the target
-        cds_start = 0
-        cds_end = 0
-        for feature in target.features:
-            if feature.type == 'CDS':
-                cds_start = feature.location._start.position
-                cds_end = feature.location._end.position
-    else:
-        target = SeqRecord(
-            Seq(sequence.upper()),
-            name=gene_name,
-        )
-
-        cds_start = 0
-        cds_end = len(sequence)
+    target, cds_start, cds_end = LoadTarget(gene_id, gene_name, sequence)
 
     # Find all probe candidates, create a fasta file
     print("- finding all potential probes ...")
@@ -191,13 +134,17 @@ def designUSeqFISHProbes(gene_id="", gene_name="", email=None,
     
     ## nupack secondary structure analysis
     print(" 2. secondary structure modeling ...")
+    structures = mfe_structures([str(rec.seq) for rec in primers + padlocks], processes=processes)
     bad_secondary = []
     bond_count = []
-    for primer, padlock in zip(primers, padlocks):
-        bad_primer, bond_count_primer = secondaryFilter(str(primer.seq), part='primer', linker_length=len(primer_end))
-        bad_padlock, bond_count_padlock = secondaryFilter(str(padlock.seq), part='padlock', linker_length=len(padlock_start))
+    for primer_struct, padlock_struct in zip(structures[:num_prbs], structures[num_prbs:]):
+        bad_primer, bond_count_primer = structureFilter(primer_struct, part='primer', linker_length=len(primer_end))
+        bad_padlock, bond_count_padlock = structureFilter(padlock_struct, part='padlock', linker_length=len(padlock_start))
         bad_secondary.append(bad_primer | bad_padlock)
         bond_count.append((bond_count_primer, bond_count_padlock))
+    num_failed = sum(structure is None for structure in structures)
+    if num_failed:
+        print(f'   {num_failed} primer and padlock structure predictions failed; their candidates are rejected')
 
     # Find bad probes
     bad_inds = bad_gc + bad_repeats + bad_dg + bad_secondary
@@ -256,10 +203,50 @@ def ProbeBowtie2(fastafile, db=os.path.join(os.getcwd(), 'mouse_refseq_rna'),
     runs bowtie2 to create alignment results from a fasta file
     """
     call = ['bowtie2', '--very-sensitive-local', '-f', '--no-sq', '--no-hd', '--reorder', '--score-min', score_min, \
-        '-x', db, '-U', fastafile, '-S', result_path]
+        '-x', db, '-U', fastafile, '-S', result_path] + bowtie2_index_args()
     subprocess.check_call(call)
     return
 
+def LoadTarget(gene_id="", gene_name="", sequence=""):
+    """
+    returns the target record and its coding region, retrieved from genbank by
+    accession id unless a sequence is given
+    """
+    if not sequence:
+        # retrieve target sequence from genbank by using accession id
+        target = FetchGenbank(gene_id)
+        if gene_name.lower() not in target.description.lower():
+            print('Target name and accession number are not matched!')
+            exit()
+
+        # find the coding region of the target
+        cds_start = 0
+        cds_end = 0
+        for feature in target.features:
+            if feature.type == 'CDS':
+                cds_start = feature.location._start.position
+                cds_end = feature.location._end.position
+    else:
+        target = SeqRecord(
+            Seq(sequence.upper()),
+            name=gene_name,
+        )
+
+        cds_start = 0
+        cds_end = len(sequence)
+    return target, cds_start, cds_end
+
+def FetchGenbank(accession):
+    """
+    retrieves a genbank record from NCBI, recording latency and size in telemetry
+    """
+    with TELEMETRY.track('entrez.efetch') as call:
+        handle = Entrez.efetch(db="nucleotide", id=accession, rettype="gb", retmode="text")
+        text = handle.read()
+        handle.close()
+        call.bytes_received = len(text)
+    return SeqIO.read(io.StringIO(text), "genbank")
+
 def GetInitiatorSeq(hairpin_id=2, I_id=1):
     init_seqs = [['gAggAgggCAgCAAACgggAAgAgTCTTCCTTTACg', 'gCATTCTTTCTTgAggAgggCAgCAAACgggAAgAg'], \
         ['CCTCgTAAATCCTCATCAATCATCCAgTAAACCgCC', 'AgCTCAgTCCATCCTCgTAAATCCTCATCAATCATC'], \
@@ -268,7 +255,7 @@ def GetInitiatorSeq(hairpin_id=2, I_id=1):
                     ['CTCACTCCCAATCTCTATCTACCCTACAAATCCAAT', 'CACTTCATATCACTCACTCCCAATCTCTATCTACCC']]
     return init_seqs[hairpin_id-1][I_id-1]
 
-def IsUnique(samfile_path, gene_name, prb_pos, full=False):
+def IsUnique(samfile_path, gene_name, prb_pos, full=False, lookup=None):
     # find hits (ids) from alignment 
     num_prbs = len(prb_pos)
     hits = [[] for _ in range(num_prbs)]
@@ -279,7 +266,8 @@ def IsUnique(samfile_path, gene_name, prb_pos, full=False):
         for line in samfile:
             info = line.decode().split('\t')
             if '-' in info[0]:
-                index = int(info[0][:-2])
+                # Full probe halves are named after their candidate, e.g. '12-1' for candidate 12
+                index = int(info[0][:-2])-1
             else:
                 index = int(info[0])-1
             if index not in prb_pos:
@@ -287,20 +275,16 @@ def IsUnique(samfile_path, gene_name, prb_pos, full=False):
             hits[i].append(info[2])
             i += 1
     
-    # search hitted ids if it is variants of the same gene
-    variants = ['*']
+    # look up all hit ids at once and check if they are variants of the same gene
+    lookup = lookup or get_lookup(Entrez.email, Entrez.api_key)
+    descriptions = lookup.describe([hit_id for hits_for_oneprb in hits for hit_id in hits_for_oneprb if hit_id != '*'])
     bad_unique = np.zeros((num_prbs,), dtype=bool)
     if full:
         bad_unique = np.zeros((num_prbs*2,), dtype=bool)
     for i, hits_for_oneprb in enumerate(hits):
         for hit_id in hits_for_oneprb:
-            if hit_id not in variants:
-                handle = Entrez.efetch(db="nucleotide", id=hit_id, rettype="gb", retmode="text")
-                search_result = SeqIO.read(handle, "genbank")
-                if gene_name.lower() in search_result.description.lower():
-                    variants.append(hit_id)
-                else:
-                    bad_unique[i] = 1
+            if hit_id != '*' and gene_name.lower() not in descriptions[hit_id].lower():
+                bad_unique[i] = 1
     if full:
         bad_unique = bad_unique.reshape(num_prbs, 2)
         bad_unique = np.any(bad_unique, axis=1)
@@ -310,41 +294,70 @@ def IsUnique(samfile_path, gene_name, prb_pos, full=False):
 def findAllCandidates(target, prb_length, result_path, gene_name):
     """ finds all candidate probes
     """
-    prbs = []
-    limit = len(target.seq)
-    for i in range(0, limit-prb_length*2+1):
-        start = i
-        end = start + prb_length*2
-        temp = target.seq[start:end].reverse_complement()
-        temp_rec = SeqRecord(temp, '%i' % (i+1), '', '')
-        prbs.append(temp_rec)
+    # reverse complement the target once and slice windows out of it
+    target_rc = reverse_complement(str(target.seq))
+    prbs = CandidateRecords(target_rc, prb_length, range(0, len(target_rc)-prb_length*2+1))
     count = SeqIO.write(prbs, os.path.join(result_path, f"{gene_name}_prbs_candidates.fasta"), "fasta")
     print("Converted %i records" % count)
 
     return prbs
 
-def basicFilter(prbs, num_prbs, prb_length=20, gc_range=[40,60], dg_thresh=-9):
-    GC = np.zeros((2, num_prbs))
-    repeats = np.zeros((2, num_prbs))
-    dg = np.zeros((2, num_prbs))
+def CandidateRecords(target_rc, prb_length, positions):
+    """
+    returns the candidates starting at the given positions of the target, sliced out of the
+    reverse complemented target and named by their order (1, 2, ...) so IsUnique can map
+    alignment hits back to them
+    """
+    limit = len(target_rc)
+    return [SeqRecord(Seq(target_rc[limit-pos-prb_length*2:limit-pos]), '%i' % (i+1), '', '')
+            for i, pos in enumerate(positions)]
 
-    for i in range(num_prbs):
-        GC[1,i] = (prbs[i].seq[0:prb_length].count("G") \
-            + prbs[i].seq[0:prb_length].count("C"))/prb_length *100
-        GC[0,i] = (prbs[i].seq[prb_length:prb_length*2].count("G") \
-            + prbs[i].seq[prb_length:prb_length*2].count("C"))/prb_length *100
-
-        repeats[1,i] = prbs[i].seq[0:prb_length].count("AAAA") \
-            + prbs[i].seq[0:prb_length].count("CCC") \
-                + prbs[i].seq[0:prb_length].count("GGG") \
-                    + prbs[i].seq[0:prb_length].count("TTTT")
-        repeats[0,i] = prbs[i].seq[prb_length:prb_length*2].count("AAAA") \
-            + prbs[i].seq[prb_length:prb_length*2].count("CCC") \
-                + prbs[i].seq[prb_length:prb_length*2].count("GGG") \
-                    + prbs[i].seq[prb_length:prb_length*2].count("TTTT")
+def HCR3ProbePair(prb_seq, init_seq, prb_length=20, spacer=['ta','at']):
+    """
+    returns probe A (first initiator half and second candidate half) and probe B (first
+    candidate half and second initiator half) of a candidate sequence
+    """
+    half = int(len(init_seq)/2)
+    return (init_seq[0:half]+spacer[0]+prb_seq[prb_length:prb_length*2],
+            prb_seq[0:prb_length]+spacer[1]+init_seq[half:len(init_seq)])
 
-        dg[1,i] = calc_hairpin(str(prbs[i].seq[0:prb_length])).dg/1000
-        dg[0,i] = calc_hairpin(str(prbs[i].seq[prb_length:prb_length*2])).dg/1000
+def FullProbeRecords(prbs, init_seq, prb_length=20, spacer=['ta','at']):
+    """
+    returns probe A and probe B of every candidate record, named '<candidate>-1' and '<candidate>-2'
+    """
+    prbs_full = []
+    for i, prb in enumerate(prbs):
+        prb_A, prb_B = HCR3ProbePair(prb.seq, init_seq, prb_length=prb_length, spacer=spacer)
+        prbs_full.append(SeqRecord(prb_A, f'{i+1}-1', '', ''))
+        prbs_full.append(SeqRecord(prb_B, f'{i+1}-2', '', ''))
+    return prbs_full
+
+def HCR3ProbeTable(gene_name, gene_id, positions, prb_seqs, init_seq, prb_length=20, spacer=['ta','at'],
+                   to_excel=False, result_path=os.getcwd()):
+    """
+    returns the probe table of the selected candidates (sequences as sliced from the reverse
+    complemented target), optionally also saved as an excel file
+    """
+    prb_final_A = []
+    prb_final_B = []
+    for prb_seq in prb_seqs:
+        prb_A, prb_B = HCR3ProbePair(prb_seq, init_seq, prb_length=prb_length, spacer=spacer)
+        prb_final_A.append(str(prb_A))
+        prb_final_B.append(str(prb_B))
+
+    result = {'name': gene_name, 
+              'accession': gene_id, 
+              'position':positions, 
+              'probe A':prb_final_A, 
+              'probe B':prb_final_B}
+    resultdf = pd.DataFrame(result)
+    if to_excel:
+        resultdf.to_excel(excel_writer = os.path.join(result_path, f"{gene_name}_probes.xlsx"))
+
+    return resultdf
+
+def basicFilter(prbs, num_prbs, prb_length=20, gc_range=[40,60], dg_thresh=-9):
+    GC, repeats, dg = candidateFeatures(prbs, num_prbs, prb_length=prb_length)
 
     bad_gc = (GC < gc_range[0]) | (GC > gc_range[1])
     bad_gc = bad_gc[0,:] | bad_gc[1,:]
@@ -355,13 +368,36 @@ def basicFilter(prbs, num_prbs, prb_length=20, gc_range=[40,60], dg_thresh=-9):
     
     return bad_gc, bad_repeats, bad_dg
 
+def candidateFeatures(prbs, num_prbs, prb_length=20):
+    """
+    computes GC%, homopolymer repeats, and hairpin dG (kcal/mol) of both halves of each candidate,
+    independent of any thresholds
+    """
+    GC = np.zeros((2, num_prbs))
+    repeats = np.zeros((2, num_prbs), dtype=bool)
+    dg = np.zeros((2, num_prbs))
+
+    batch = encode_batch([str(prb.seq) for prb in prbs[:num_prbs]])
+    if num_prbs:
+        GC[1,:] = gc_content_batch(batch[:, 0:prb_length])
+        GC[0,:] = gc_content_batch(batch[:, prb_length:prb_length*2])
+        repeats[1,:] = has_homopolymer_batch(batch[:, 0:prb_length])
+        repeats[0,:] = has_homopolymer_batch(batch[:, prb_length:prb_length*2])
+
+    for i in range(num_prbs):
+        dg[1,i] = calc_hairpin(str(prbs[i].seq[0:prb_length])).dg/1000
+        dg[0,i] = calc_hairpin(str(prbs[i].seq[prb_length:prb_length*2])).dg/1000
+
+    return GC, repeats, dg
+
 def secondaryFilter(seq, part='primer', linker_length=6):
-    prb_seq = nupack.Strand(seq, name='prb')
-    model = nupack.Model(material='dna', celsius=37, sodium=0.39, magnesium=0.0)
-    set = nupack.ComplexSet(strands=[prb_seq])
-    result = nupack.complex_analysis(complexes=set, model=model, compute=['mfe'])
-    secondstruct = str(result['(prb)'].mfe[0].structure)
+    secondstruct = mfe_structures([seq], processes=1)[0]
+    return structureFilter(secondstruct, part=part, linker_length=linker_length)
 
+def structureFilter(secondstruct, part='primer', linker_length=6):
+    # Strands whose structure prediction failed are rejected and marked as failed
+    if secondstruct is None:
+        return True, 'failed'
     bad = True
     bond_count = secondstruct.count('(')
     if bond_count == 0:
@@ -0,0 +1,153 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from Bio import Entrez
+from sequence_kernels import reverse_complement
+from probe_design_adapted import LoadTarget, GetInitiatorSeq, HCR3ProbeTable
+from probe_sweep import FEATURE_COLUMNS, hcr3_candidate_features, select_probes
+
+
+"""
+Incremental HCR3 probe design. The features of every candidate (see probe_sweep)
+are saved with the target sequence in a JSON state file. When the target is
+edited, e.g. a corrected UTR or a new transcript version, candidates outside the
+edit keep their stored features, shifted by the length change, and only
+candidates overlapping the edit are aligned and analyzed again.
+"""
+
+
+"""
+Update a feature table after a target sequence was edited.
+
+Inputs:
+    old_seq: sequence the features were computed for.
+    new_seq: edited sequence.
+    old_features: feature table of old_seq for one probe length.
+    gene_name, hairpin_id, db, result_path, prb_length, spacer: see
+        probe_sweep.hcr3_candidate_features.
+Returns: the feature table of new_seq (without in_cds) and the number of
+         candidates that were computed again.
+"""
+def update_features(old_seq: str, new_seq: str, old_features, gene_name: str, hairpin_id: int, db: str,
+                    result_path: str, prb_length: int = 20, spacer: list[str] = ['ta', 'at']) -> tuple:
+    window = prb_length*2
+    prefix, old_end, new_end = _edit_region(old_seq.upper(), new_seq.upper())
+
+    # Candidates entirely before or after the edit are unchanged
+    positions = old_features['position'].to_numpy()
+    before = positions + window <= prefix
+    after = positions >= old_end
+    kept = old_features[before | after].copy()
+    kept.loc[after[before | after], 'position'] += new_end - old_end
+
+    all_positions = np.arange(max(len(new_seq) - window + 1, 0))
+    missing = np.setdiff1d(all_positions, kept['position'].to_numpy())
+    computed = hcr3_candidate_features(new_seq, gene_name, hairpin_id, db, result_path,
+                                       prb_length=prb_length, spacer=spacer, positions=missing)
+    features = pd.concat([kept, computed], ignore_index=True) if len(computed) else kept
+    features = features[features['position'].isin(all_positions)]
+    return features.sort_values('position', ignore_index=True)[FEATURE_COLUMNS[:-1]], len(missing)
+
+
+"""
+Design HCR3 probes, reusing the candidate features saved for the previous
+version of the target. Takes the same settings as designHCR3Probes.
+
+Inputs:
+    state_path: JSON file with the saved features, created if missing and
+                replaced by the features of the current target.
+    Other inputs: see designHCR3Probes.
+Returns: the probe table of designHCR3Probes.
+"""
+def designHCR3ProbesIncremental(state_path: str, gene_id: str = '', gene_name: str = '', hairpin_id: int = 1,
+                                email: str = None, sequence: str = '', db: str = os.getcwd(),
+                                result_path: str = os.getcwd(), prb_length: int = 20, gc_range: list = [40, 60],
+                                prb_space: int = 1, dg_thresh: float = -9, spacer: list[str] = ['ta', 'at'],
+                                to_excel: bool = False):
+    if email:
+        Entrez.email = email
+    target, cds_start, cds_end = LoadTarget(gene_id, gene_name, sequence)
+    seq = str(target.seq).upper()
+    settings = {'gene_name': gene_name, 'hairpin_id': hairpin_id, 'db': db,
+                'prb_length': prb_length, 'spacer': list(spacer)}
+
+    print(f'---------------- {gene_name} started ----------------')
+    state = load_state(state_path)
+    if state is not None and state['settings'] == settings:
+        features, count = update_features(state['sequence'], seq, state['features'], gene_name, hairpin_id, db,
+                                          result_path, prb_length, spacer)
+        print(f' reused stored features, analyzed {count} edited candidates')
+    else:
+        features = hcr3_candidate_features(seq, gene_name, hairpin_id, db, result_path, prb_length, spacer)
+        print(f' analyzed all {len(features)} candidates')
+    save_state(state_path, seq, settings, features)
+
+    features = features.assign(in_cds=(features['position'] > cds_start)
+                                      & (features['position'] + prb_length*2 < cds_end))
+    positions = select_probes(features, prb_length, gc_range, dg_thresh, prb_space)
+    print(f'- {gene_name} done! Generated %i' % len(positions), 'pairs of probes\n')
+
+    # recall probe pairs
+    prb_seqs = [reverse_complement(seq[pos:pos+prb_length*2]) for pos in positions]
+    return HCR3ProbeTable(gene_name, gene_id, positions, prb_seqs, GetInitiatorSeq(hairpin_id),
+                          prb_length=prb_length, spacer=spacer, to_excel=to_excel, result_path=result_path)
+
+
+"""
+Returns the saved state of an incremental design, or None if there is none.
+
+Input:
+    state_path: JSON state file.
+"""
+def load_state(state_path: str) -> dict:
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path) as f:
+        state = json.load(f)
+    state['features'] = pd.DataFrame(state['features']['data'], columns=state['features']['columns'])
+    return state
+
+
+"""
+Save the state of an incremental design.
+
+Inputs:
+    state_path: JSON state file.
+    seq: target sequence.
+    settings: settings the features depend on.
+    features: feature table of seq.
+"""
+def save_state(state_path: str, seq: str, settings: dict, features):
+    table = features[FEATURE_COLUMNS[:-1]].to_json(orient='split', index=False)
+    with open(state_path, 'w') as f:
+        json.dump({'settings': settings,
+                   'sequence': seq,
+                   'features': json.loads(table)}, f)
+
+
+
+
+
+# Helper functions
+def _edit_region(old: str, new: str) -> tuple:
+    # Returns the common prefix length and where the common suffix starts in old
+    # and new; several edits are treated as one region spanning all of them
+    prefix = _common_prefix(old, new)
+    limit = min(len(old), len(new)) - prefix
+    suffix = _common_prefix(old[::-1][:limit], new[::-1][:limit])
+    return prefix, len(old)-suffix, len(new)-suffix
+
+
+def _common_prefix(a: str, b: str) -> int:
+    # Compare in blocks so long identical stretches are checked at C speed
+    limit = min(len(a), len(b))
+    prefix = 0
+    while prefix < limit:
+        end = min(prefix+1024, limit)
+        if a[prefix:end] != b[prefix:end]:
+            while a[prefix] == b[prefix]:
+                prefix += 1
+            return prefix
+        prefix = end
+    return prefix
@@ -0,0 +1,185 @@
+import os
+import itertools
+import numpy as np
+import pandas as pd
+from Bio import SeqIO, Entrez
+from sequence_kernels import reverse_complement
+from probe_design_adapted import (LoadTarget, ProbeBowtie2, GetInitiatorSeq, IsUnique, candidateFeatures,
+                                  CandidateRecords, FullProbeRecords)
+
+
+"""
+Parameter sweeps for HCR3 probe design. Every threshold-independent property of
+the candidates (GC%, repeats, hairpin ΔG, alignment uniqueness, and coding region)
+is computed once per probe length and stored in a feature table. Settings of
+GC_RANGE, DG_THRESHOLD, and PRB_SPACING are then evaluated by filtering the table,
+so trying many settings costs about as much as one design run.
+"""
+
+
+FEATURE_COLUMNS = ['prb_length', 'position', 'gc_1', 'gc_2', 'repeats', 'dg_1', 'dg_2',
+                   'unique', 'unique_full', 'in_cds']
+
+
+"""
+Compute the features of HCR3 probe candidates of a sequence.
+
+Inputs:
+    seq: target sequence.
+    gene_name: gene name, used to check alignment hits and to name intermediate files.
+    hairpin_id: HCR3 initiator ID.
+    db: bowtie2 index prefix.
+    result_path: directory for intermediate FASTA and SAM files.
+    prb_length: length of each probe half.
+    spacer: spacers between the initiator halves and the probe halves.
+    positions: candidate positions to compute, defaulted to every position.
+Returns: a table with FEATURE_COLUMNS except in_cds. gc_1/dg_1 belong to the
+         first probe half, gc_2/dg_2 to the second.
+"""
+def hcr3_candidate_features(seq: str, gene_name: str, hairpin_id: int, db: str, result_path: str,
+                            prb_length: int = 20, spacer: list[str] = ['ta', 'at'], positions=None):
+    target_rc = reverse_complement(seq.upper())
+    if positions is None:
+        positions = np.arange(max(len(target_rc) - prb_length*2 + 1, 0))
+    positions = np.asarray(positions, dtype=np.int64)
+    num_prbs = len(positions)
+    if not num_prbs:
+        return pd.DataFrame(columns=FEATURE_COLUMNS[:-1])
+
+    # Candidates are named by their row so IsUnique can map hits back
+    prbs = CandidateRecords(target_rc, prb_length, positions)
+    prbs_full = FullProbeRecords(prbs, GetInitiatorSeq(hairpin_id), prb_length=prb_length, spacer=spacer)
+
+    stem = os.path.join(result_path, f'{gene_name}_{prb_length}nt_features')
+    SeqIO.write(prbs, stem + '_candidates.fasta', 'fasta')
+    SeqIO.write(prbs_full, stem + '_candidates_full.fasta', 'fasta')
+    ProbeBowtie2(stem + '_candidates.fasta', db=db, result_path=stem + '_candidates.sam')
+    ProbeBowtie2(stem + '_candidates_full.fasta', db=db, result_path=stem + '_candidates_full.sam')
+
+    GC, repeats, dg = candidateFeatures(prbs, num_prbs, prb_length=prb_length)
+    rows = np.arange(num_prbs)
+    bad_unique = IsUnique(stem + '_candidates.sam', gene_name, rows)
+    bad_unique_full = IsUnique(stem + '_candidates_full.sam', gene_name, rows, full=True)
+    return pd.DataFrame({'prb_length': prb_length,
+                         'position': positions,
+                         'gc_1': GC[1], 'gc_2': GC[0],
+                         'repeats': repeats[0] | repeats[1],
+                         'dg_1': dg[1], 'dg_2': dg[0],
+                         'unique': ~bad_unique,
+                         'unique_full': ~bad_unique_full})
+
+
+"""
+Compute the feature table of a gene for every probe length of a sweep.
+
+Inputs:
+    gene_name: gene name.
+    gene_id: accession number, used if sequence is empty.
+    sequence: target sequence.
+    hairpin_id: HCR3 initiator ID.
+    email: email address reported to NCBI Entrez.
+    db: bowtie2 index prefix.
+    result_path: directory for intermediate files.
+    prb_lengths: probe lengths to compute.
+    spacer: spacers between the initiator halves and the probe halves.
+Returns: a table with FEATURE_COLUMNS.
+"""
+def hcr3_feature_table(gene_name: str, gene_id: str = '', sequence: str = '', hairpin_id: int = 1,
+                       email: str = None, db: str = os.getcwd(), result_path: str = os.getcwd(),
+                       prb_lengths: list[int] = [20], spacer: list[str] = ['ta', 'at']):
+    if email:
+        Entrez.email = email
+    target, cds_start, cds_end = LoadTarget(gene_id, gene_name, sequence)
+
+    tables = []
+    for prb_length in prb_lengths:
+        print(f'- computing features of {prb_length} nt candidates for {gene_name} ...')
+        features = hcr3_candidate_features(str(target.seq), gene_name, hairpin_id, db, result_path,
+                                           prb_length=prb_length, spacer=spacer)
+        features['in_cds'] = (features['position'] > cds_start) & (features['position'] + prb_length*2 < cds_end)
+        tables.append(features)
+    return pd.concat(tables, ignore_index=True)
+
+
+"""
+Select probe positions the way designHCR3Probes does for one setting.
+
+Inputs:
+    features: feature table generated with hcr3_feature_table.
+    prb_length: length of each probe half.
+    gc_range: lowest and highest acceptable GC%.
+    dg_thresh: lowest acceptable hairpin ΔG.
+    prb_space: minimum gap between probe pairs.
+Returns: selected probe positions.
+"""
+def select_probes(features, prb_length: int, gc_range: list[float], dg_thresh: float, prb_space: int) -> np.ndarray:
+    features = features[features['prb_length'] == prb_length]
+    passed = _passes(features, gc_range, dg_thresh)
+    return _space_positions(features['position'].to_numpy()[passed], prb_length*2 + prb_space)
+
+
+"""
+Count the probes every combination of settings would produce.
+
+Inputs:
+    features: feature table generated with hcr3_feature_table.
+    gc_ranges: GC% ranges to try.
+    dg_thresholds: hairpin ΔG thresholds to try.
+    prb_spacings: probe spacings to try.
+Returns: a table with one row per setting and its number of probes.
+"""
+def evaluate_settings(features, gc_ranges: list[list[float]], dg_thresholds: list[float], prb_spacings: list[int]):
+    rows = []
+    for prb_length, group in features.groupby('prb_length', sort=True):
+        positions = group['position'].to_numpy()
+        for gc_range, dg_thresh in itertools.product(gc_ranges, dg_thresholds):
+            passed = positions[_passes(group, gc_range, dg_thresh)]
+            for prb_space in prb_spacings:
+                rows.append([prb_length, gc_range[0], gc_range[1], dg_thresh, prb_space, len(passed),
+                             len(_space_positions(passed, prb_length*2 + prb_space))])
+    return pd.DataFrame(rows, columns=['prb_length', 'gc_low', 'gc_high', 'dg_thresh', 'prb_spacing',
+                                       'candidates', 'probes'])
+
+
+"""
+Compute features once per probe length and evaluate every combination of settings.
+
+Inputs:
+    gene_name, gene_id, sequence, hairpin_id, email, db, result_path, spacer: see hcr3_feature_table.
+    prb_lengths: probe lengths to try.
+    gc_ranges: GC% ranges to try.
+    dg_thresholds: hairpin ΔG thresholds to try.
+    prb_spacings: probe spacings to try.
+Returns: the settings table generated with evaluate_settings and the feature table.
+"""
+def sweep_hcr3(gene_name: str, gene_id: str = '', sequence: str = '', hairpin_id: int = 1, email: str = None,
+               db: str = os.getcwd(), result_path: str = os.getcwd(), prb_lengths: list[int] = [20],
+               gc_ranges: list[list[float]] = [[40, 60]], dg_thresholds: list[float] = [-9],
+               prb_spacings: list[int] = [2], spacer: list[str] = ['ta', 'at']) -> tuple:
+    features = hcr3_feature_table(gene_name, gene_id, sequence, hairpin_id, email, db, result_path,
+                                  prb_lengths, spacer)
+    settings = evaluate_settings(features, gc_ranges, dg_thresholds, prb_spacings)
+    settings.insert(0, 'name', gene_name)
+    return settings, features
+
+
+
+
+
+# Helper functions
+def _passes(features, gc_range: list[float], dg_thresh: float) -> np.ndarray:
+    gc = features[['gc_1', 'gc_2']].to_numpy()
+    dg = features[['dg_1', 'dg_2']].to_numpy()
+    return (((gc >= gc_range[0]) & (gc <= gc_range[1])).all(axis=1) & (dg > dg_thresh).all(axis=1)
+            & ~features['repeats'].to_numpy(dtype=bool) & features['unique'].to_numpy(dtype=bool)
+            & features['unique_full'].to_numpy(dtype=bool) & features['in_cds'].to_numpy(dtype=bool))
+
+
+def _space_positions(positions: np.ndarray, min_gap: int) -> np.ndarray:
+    # Greedy left-to-right pick; each step jumps to the first position beyond the gap
+    selected = []
+    i = 0
+    while i < len(positions):
+        selected.append(positions[i])
+        i = int(np.searchsorted(positions, positions[i] + min_gap, side='right'))
+    return np.array(selected, dtype=np.int64)
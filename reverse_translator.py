@@ -1,45 +1,54 @@
 import os
-import numpy as np
-import pandas as pd
+from telemetry import TELEMETRY
 from utils import select_input_file, select_output_directory, get_six_digit_date_today
-from utils import import_IDT_information, reverse_translate
+from utils import import_IDT_information, reverse_translate, reverse_translate_cached, build_peptide_items
+from table_io import read_table_chunks, TableWriter, export_excel, INPUT_FILETYPES
 
 ################################ CHANGE SETTINGS BEFORE EACH RUN #################################
 # Please refer to README.md for detailed explanations
 NAME_COLUMN_NUMBER = 0
 SEQUENCE_COLUMN_NUMBER = 5
 ORGANISM = 'Mus musculus (mouse)'
+PRODUCT_TYPE = 'gene'
+BACKEND = 'idt'
+CODON_METHOD = 'highest'
+USE_CACHE = True
+CACHE_FILE = ''
+OUTPUT_FORMAT = 'csv'
+EXCEL_EXPORT = False
+CHUNK_SIZE = 10000
 ##################################################################################################
 
 
-# Import IDT information and data
-IDT_file = select_input_file({("text", ".txt"), ("csv", ".csv")})
-IDT_info = import_IDT_information(IDT_file)
-import_file_name = select_input_file([("Excel-1", ".xlsx"), ("Excel-2", ".xls"),
-                                      ("Excel-3", ".xlsm"), ("Excel-4", ".xlsb"),
-                                      ("Excel-5", ".odf"), ("Excel-6", ".ods"),
-                                      ("Excel-7", ".odt"), ("CSV", ".csv"), ("TXT", ".txt")])
-df = pd.read_excel(import_file_name)
-array = df.values
-titles = df.columns.to_list()
+# Import IDT information and select input and output locations
+if BACKEND == 'idt':
+    IDT_file = select_input_file({("text", ".txt"), ("csv", ".csv")})
+    IDT_info = import_IDT_information(IDT_file)
+else:
+    from codon_optimizer import check_codon_usage
+    check_codon_usage(ORGANISM)
+import_file_name = select_input_file(INPUT_FILETYPES)
+date = get_six_digit_date_today()
+filename = os.path.splitext(os.path.basename(import_file_name))[0] + f'_reverse_translated_{date}.{OUTPUT_FORMAT}'
+export_file_name = os.path.join(select_output_directory(), filename)
 
-print('\nProcessing imported file...')
-data = []
-for row in array:
-    name = row[NAME_COLUMN_NUMBER]
-    seq = row[SEQUENCE_COLUMN_NUMBER].upper()
-    assert all([aa in 'QWERTYIPASDFGHKLCVNM' for aa in seq]), \
-        f'Sequence for {name} has invalid amino acid'
-    data.append({'Name': {name},
-                 'Sequence': seq})
 print('\nReverse translation started, please wait patiently...\n')
-dnas = np.array(reverse_translate(data, ORGANISM, *IDT_info))
+with TableWriter(export_file_name) as writer:
+    for df in read_table_chunks(import_file_name, CHUNK_SIZE):
+        data = build_peptide_items(df.iloc[:, NAME_COLUMN_NUMBER].tolist(), df.iloc[:, SEQUENCE_COLUMN_NUMBER].tolist())
+        if BACKEND == 'local':
+            dnas = reverse_translate(data, ORGANISM, PRODUCT_TYPE, backend='local', method=CODON_METHOD)
+        elif USE_CACHE:
+            dnas = reverse_translate_cached(data, ORGANISM, PRODUCT_TYPE, *IDT_info, cache_file=CACHE_FILE)
+        else:
+            dnas = reverse_translate(data, ORGANISM, PRODUCT_TYPE, *IDT_info)
+        df[f'{df.columns[SEQUENCE_COLUMN_NUMBER]} Reverse Translated'] = dnas
+        writer.write(df)
+        print(f'finished {writer.rows} sequences')
 
-print('\nGenerating excel file...')
-new_df = pd.DataFrame(np.hstack((array, dnas.reshape(-1, 1))))
-new_df.columns = titles + [f'{titles[SEQUENCE_COLUMN_NUMBER]} Reverse Translated']
-date = get_six_digit_date_today()
-filename = os.path.splitext(os.path.basename(import_file_name))[0] + f'_reverse_translated_{date}.xlsx'
-export_file_name = select_output_directory(filename)
-new_df.to_excel(export_file_name, index=False)
+if BACKEND == 'idt':
+    TELEMETRY.print_report()
+if EXCEL_EXPORT and OUTPUT_FORMAT != 'xlsx':
+    print('\nGenerating excel file...')
+    export_excel(export_file_name)
 print('Complete!\n')
@@ -0,0 +1,102 @@
+import os
+import multiprocessing
+
+
+"""
+Parallel NUPACK secondary structure prediction. Strands are deduplicated, split
+into chunks, and spread over a process pool whose workers build the NUPACK model
+once, for their first chunk. Structures are returned in the order of the input
+strands. A chunk that fails or times out is sent to the pool again with the same time
+limit; if it still fails, its strands are marked as failed, so one bad chunk
+can neither stop nor stall the whole design.
+"""
+
+
+NUPACK_CONDITIONS = dict(material='dna', celsius=37, sodium=0.39, magnesium=0.0)
+
+_MODEL = None               # NUPACK model of this process, built on first use
+
+
+"""
+Predict the MFE secondary structure of every strand.
+
+Inputs:
+    seqs: strand sequences.
+    processes: number of worker processes, defaulted to the number of CPUs.
+    chunk_size: strands per chunk, defaulted to spread about four chunks per process.
+    timeout: seconds to wait for each chunk, which also recovers chunks lost with a
+             crashed worker; None to wait indefinitely.
+    retries: number of times a failed or timed out chunk is sent to the pool again.
+    min_parallel: smallest number of strands worth starting a process pool for.
+    worker: function predicting the structures of a list of strands. Workers
+            receive it by name, so it should be defined at module level.
+Returns: dot-parens-plus structures, ordered the same as seqs. Strands of chunks
+         that failed every try get None.
+"""
+def mfe_structures(seqs: list[str], processes: int = None, chunk_size: int = None, timeout: float = 600,
+                   retries: int = 1, min_parallel: int = 50, worker=None) -> list[str]:
+    worker = worker or _mfe_chunk
+    processes = processes or os.cpu_count() or 1
+    unique = list(dict.fromkeys(seqs))
+    if processes <= 1 or len(unique) < min_parallel:
+        structures = worker(unique)
+    else:
+        chunk_size = chunk_size or max(len(unique) // (processes*4), 1)
+        chunks = [unique[i:i+chunk_size] for i in range(0, len(unique), chunk_size)]
+        results = [None] * len(chunks)
+        pool = multiprocessing.Pool(processes)
+        timed_out = False
+        try:
+            pending = list(range(len(chunks)))
+            for attempt in range(retries+1):
+                submitted = [(i, pool.apply_async(worker, (chunks[i],))) for i in pending]
+                pending = []
+                for i, result in submitted:
+                    try:
+                        results[i] = result.get(timeout=timeout)
+                    except multiprocessing.TimeoutError:
+                        timed_out = True
+                        pending.append(i)
+                        print(f'NUPACK chunk {i+1}/{len(chunks)} timed out after {timeout} s (try {attempt+1})')
+                    except Exception as e:
+                        pending.append(i)
+                        print(f'NUPACK chunk {i+1}/{len(chunks)} failed with {e!r} (try {attempt+1})')
+                if not pending:
+                    break
+        finally:
+            # Workers still stuck on timed out chunks are stopped instead of waited for
+            if timed_out:
+                pool.terminate()
+            else:
+                pool.close()
+            pool.join()
+        for i in pending:
+            print(f'NUPACK chunk {i+1}/{len(chunks)} gave up; its {len(chunks[i])} strands are marked as failed')
+        structures = [structure for chunk, result in zip(chunks, results)
+                      for structure in (result if result is not None else [None] * len(chunk))]
+    known = dict(zip(unique, structures))
+    return [known[seq] for seq in seqs]
+
+
+
+
+
+# Helper functions
+def _model():
+    global _MODEL
+    if _MODEL is None:
+        import nupack
+        _MODEL = nupack.Model(**NUPACK_CONDITIONS)
+    return _MODEL
+
+
+def _mfe_chunk(seqs: list[str]) -> list[str]:
+    import nupack
+
+    model = _model()
+    structures = []
+    for seq in seqs:
+        strand = nupack.Strand(seq, name='prb')
+        result = nupack.complex_analysis(complexes=nupack.ComplexSet(strands=[strand]), model=model, compute=['mfe'])
+        structures.append(str(result['(prb)'].mfe[0].structure))
+    return structures
@@ -0,0 +1,147 @@
+import numpy as np
+
+
+# Translation tables shared by the kernels below. Sequences are handled as ASCII
+# bytes so per-base work happens in C (bytes.translate/bytes.count) or NumPy.
+_DNA_BASES = b'ACGT'
+_COMPLEMENT_TABLE = bytes.maketrans(b'ACGTacgt', b'TGCAtgca')
+_BASE_CODES = np.frombuffer(_DNA_BASES, dtype=np.uint8)
+_DEFAULT_HOMOPOLYMERS = {'A': 4, 'C': 3, 'G': 3, 'T': 4}
+
+
+"""
+Return if the input sequence only contains uppercase A, G, C, and T.
+
+Input:
+    sequence: DNA sequence as str or bytes.
+"""
+def is_DNA(sequence) -> bool:
+    return not _to_bytes(sequence).translate(None, _DNA_BASES)
+
+
+"""
+Return the complement of a DNA sequence. Case is preserved.
+
+Input:
+    sequence: DNA sequence.
+"""
+def complement(sequence: str) -> str:
+    return _to_bytes(sequence).translate(_COMPLEMENT_TABLE).decode('ascii')
+
+
+"""
+Return the reverse complement of a DNA sequence. Case is preserved.
+
+Input:
+    sequence: DNA sequence.
+"""
+def reverse_complement(sequence: str) -> str:
+    return _to_bytes(sequence).translate(_COMPLEMENT_TABLE)[::-1].decode('ascii')
+
+
+"""
+Return the number of A, C, G, and T in a sequence, in that order. Lowercase
+(soft-masked) bases are counted too.
+
+Input:
+    sequence: DNA sequence.
+"""
+def base_counts(sequence) -> tuple:
+    seq = _to_bytes(sequence).upper()
+    return seq.count(b'A'), seq.count(b'C'), seq.count(b'G'), seq.count(b'T')
+
+
+"""
+Return GC% of a sequence, counting lowercase bases too. Returns 0 for an empty
+sequence.
+
+Input:
+    sequence: DNA sequence.
+"""
+def gc_content(sequence) -> float:
+    seq = _to_bytes(sequence).upper()
+    if not seq:
+        return 0.0
+    return (seq.count(b'G') + seq.count(b'C')) / len(seq) * 100
+
+
+"""
+Encode equal-length sequences into a 2D uint8 array with one row per sequence.
+
+Input:
+    sequences: a list of DNA sequences of the same length.
+Returns: array of shape (number of sequences, sequence length).
+"""
+def encode_batch(sequences: list) -> np.ndarray:
+    if not len(sequences):
+        return np.zeros((0, 0), dtype=np.uint8)
+    length = len(sequences[0])
+    assert all(len(seq) == length for seq in sequences), "All sequences must have the same length"
+    buffer = b''.join(_to_bytes(seq).upper() for seq in sequences)
+    return np.frombuffer(buffer, dtype=np.uint8).reshape(len(sequences), length)
+
+
+"""
+Return if each row of an encoded batch only contains A, G, C, and T.
+
+Input:
+    batch: array generated with encode_batch.
+"""
+def is_DNA_batch(batch: np.ndarray) -> np.ndarray:
+    return np.isin(batch, _BASE_CODES).all(axis=1)
+
+
+"""
+Return the number of A, C, G, and T in each row of an encoded batch.
+
+Input:
+    batch: array generated with encode_batch.
+Returns: array of shape (number of sequences, 4).
+"""
+def base_counts_batch(batch: np.ndarray) -> np.ndarray:
+    return np.stack([(batch == code).sum(axis=1) for code in _BASE_CODES], axis=1)
+
+
+"""
+Return GC% of each row of an encoded batch.
+
+Input:
+    batch: array generated with encode_batch.
+"""
+def gc_content_batch(batch: np.ndarray) -> np.ndarray:
+    if not batch.shape[1]:
+        return np.zeros(batch.shape[0])
+    gc = (batch == ord('G')).sum(axis=1) + (batch == ord('C')).sum(axis=1)
+    return gc / batch.shape[1] * 100
+
+
+"""
+Return if each row of an encoded batch contains a homopolymer run.
+
+Inputs:
+    batch: array generated with encode_batch.
+    run_lengths: a dictionary of bases and the shortest run that counts as a
+                 homopolymer for that base. Defaults to AAAA, CCC, GGG, TTTT.
+"""
+def has_homopolymer_batch(batch: np.ndarray, run_lengths: dict = None) -> np.ndarray:
+    if run_lengths is None:
+        run_lengths = _DEFAULT_HOMOPOLYMERS
+    found = np.zeros(batch.shape[0], dtype=bool)
+    for base, run in run_lengths.items():
+        if run > batch.shape[1]:
+            continue
+        # A window of `run` bases is a homopolymer when all of them match
+        hits = np.cumsum(batch == ord(base), axis=1, dtype=np.int32)
+        hits = np.pad(hits, ((0, 0), (1, 0)))
+        found |= ((hits[:, run:] - hits[:, :-run]) == run).any(axis=1)
+    return found
+
+
+
+
+
+# Helper functions
+def _to_bytes(sequence) -> bytes:
+    if isinstance(sequence, (bytes, bytearray)):
+        return bytes(sequence)
+    return str(sequence).encode('ascii')
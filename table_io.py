@@ -0,0 +1,236 @@
+import os
+
+
+"""
+Chunked table reading and writing for the entry scripts. The format is chosen
+from the file extension:
+    CSV: .csv
+    tab-separated text: .txt, .tsv
+    Parquet: .parquet, .pq (requires pyarrow)
+    Arrow IPC/Feather: .arrow, .feather, .ipc (requires pyarrow)
+    Excel: .xlsx, .xls, .xlsm, .xlsb, .odf, .ods, .odt
+CSV, text, Parquet, and Arrow files are read and written chunk by chunk so large
+tables are processed in bounded memory. Excel files are read whole; .xlsx output
+is written row by row with openpyxl's write-only mode.
+"""
+
+
+EXCEL_EXTENSIONS = ['.xlsx', '.xls', '.xlsm', '.xlsb', '.odf', '.ods', '.odt']
+INPUT_FILETYPES = [("Excel-1", ".xlsx"), ("Excel-2", ".xls"),
+                   ("Excel-3", ".xlsm"), ("Excel-4", ".xlsb"),
+                   ("Excel-5", ".odf"), ("Excel-6", ".ods"),
+                   ("Excel-7", ".odt"), ("CSV", ".csv"), ("TXT", ".txt"),
+                   ("TSV", ".tsv"), ("Parquet", ".parquet"), ("Arrow", ".arrow"),
+                   ("Feather", ".feather")]
+
+
+"""
+Returns the table format of a file path: csv, tsv, parquet, arrow, or excel.
+Throws error if the extension is not supported.
+
+Input:
+    path: table file path.
+"""
+def table_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ['.txt', '.tsv']:
+        return 'tsv'
+    if extension in ['.parquet', '.pq']:
+        return 'parquet'
+    if extension in ['.arrow', '.feather', '.ipc']:
+        return 'arrow'
+    if extension in EXCEL_EXTENSIONS:
+        return 'excel'
+    raise ValueError(f"Unsupported table file extension: {extension}")
+
+
+"""
+Read a table chunk by chunk.
+
+Inputs:
+    path: table file path.
+    chunksize: maximum number of rows per chunk.
+Returns: an iterator of pandas DataFrames. Row indices continue across chunks.
+"""
+def read_table_chunks(path: str, chunksize: int = 10000):
+    import pandas as pd
+
+    file_format = table_format(path)
+    if file_format in ['csv', 'tsv']:
+        yield from pd.read_csv(path, sep=',' if file_format == 'csv' else '\t', chunksize=chunksize)
+        return
+
+    start = 0
+    if file_format == 'parquet':
+        batches = _import_pyarrow('parquet').ParquetFile(path).iter_batches(batch_size=chunksize)
+    elif file_format == 'arrow':
+        batches = _iter_arrow_batches(path, chunksize)
+    else:
+        df = pd.read_excel(path)
+        batches = (df.iloc[i:i+chunksize] for i in range(0, len(df), chunksize))
+    for batch in batches:
+        chunk = batch if isinstance(batch, pd.DataFrame) else batch.to_pandas()
+        chunk.index = pd.RangeIndex(start, start+len(chunk))
+        start += len(chunk)
+        yield chunk
+
+
+"""
+Read a whole table into memory.
+
+Input:
+    path: table file path.
+"""
+def read_table(path: str):
+    import pandas as pd
+
+    chunks = list(read_table_chunks(path))
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks)
+
+
+"""
+A writer appending DataFrame chunks to a table file. All chunks should have the
+same columns; for Parquet and Arrow, columns that are empty in the first chunk
+are stored as strings. Use as a context manager or call close() when done.
+
+Input:
+    path: output file path. The format is chosen from the extension.
+"""
+class TableWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.format = table_format(path)
+        self.rows = 0           # Number of rows written so far
+        self._writer = None     # Format-specific writer, created with the first chunk
+        self._schema = None     # Parquet/Arrow file schema, taken from the first chunk
+        self._workbook = None
+        assert self.format != 'excel' or path.lower().endswith('.xlsx'), \
+            "Only .xlsx is supported for Excel output"
+
+    """
+    Append a chunk of rows to the output file.
+
+    Input:
+        df: pandas DataFrame to be written.
+    """
+    def write(self, df):
+        if self.format in ['csv', 'tsv']:
+            df.to_csv(self.path, sep=',' if self.format == 'csv' else '\t', index=False,
+                      mode='w' if not self.rows else 'a', header=not self.rows)
+        elif self.format == 'parquet':
+            pa = _import_pyarrow()
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._schema = _writable_schema(table.schema)
+                self._writer = _import_pyarrow('parquet').ParquetWriter(self.path, self._schema)
+            self._writer.write_table(table.cast(self._schema))
+        elif self.format == 'arrow':
+            pa = _import_pyarrow()
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._schema = _writable_schema(table.schema)
+                self._writer = pa.ipc.new_file(self.path, self._schema)
+            self._writer.write_table(table.cast(self._schema))
+        else:
+            self._write_excel(df)
+        self.rows += len(df)
+
+    def close(self):
+        if self._workbook is not None:
+            self._workbook.save(self.path)
+            self._workbook = None
+        elif self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_excel(self, df):
+        import pandas as pd
+        from openpyxl import Workbook
+
+        if self._workbook is None:
+            self._workbook = Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet()
+            self._sheet.append([str(column) for column in df.columns])
+        for row in df.itertuples(index=False):
+            self._sheet.append([None if _is_missing(value, pd) else value for value in row])
+
+
+"""
+Write a whole DataFrame to a table file.
+
+Inputs:
+    df: pandas DataFrame to be written.
+    path: output file path.
+Returns: output file path.
+"""
+def write_table(df, path: str) -> str:
+    with TableWriter(path) as writer:
+        writer.write(df)
+    return path
+
+
+"""
+Convert a table file into an Excel file, e.g. as a final export of a streamed run.
+
+Inputs:
+    path: table file path.
+    excel_path: output .xlsx path, defaulted to path with its extension replaced.
+Returns: output file path.
+"""
+def export_excel(path: str, excel_path: str = None) -> str:
+    excel_path = excel_path or os.path.splitext(path)[0] + '.xlsx'
+    with TableWriter(excel_path) as writer:
+        for chunk in read_table_chunks(path):
+            writer.write(chunk)
+    return excel_path
+
+
+
+
+
+# Helper functions
+def _import_pyarrow(module: str = ''):
+    try:
+        if module == 'parquet':
+            import pyarrow.parquet as pq
+            return pq
+        import pyarrow as pa
+        import pyarrow.ipc
+        return pa
+    except ImportError:
+        raise ImportError("Parquet and Arrow tables require pyarrow: pip install pyarrow")
+
+
+def _writable_schema(schema):
+    # Columns that are empty in the first chunk are stored as strings so later
+    # chunks with values can still be cast to the file schema
+    pa = _import_pyarrow()
+    return pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                      for field in schema], metadata=schema.metadata)
+
+
+def _iter_arrow_batches(path: str, chunksize: int):
+    pa = _import_pyarrow()
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            for start in range(0, batch.num_rows, chunksize):
+                yield batch.slice(start, chunksize)
+
+
+def _is_missing(value, pd) -> bool:
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
@@ -0,0 +1,217 @@
+import copy
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+
+"""
+Lightweight instrumentation of external network calls (UCSC, IDT, and NCBI
+Entrez). Every call records its latency, bytes transferred, and whether it was
+a retry or failed, grouped by endpoint. Latencies are kept in fixed histogram
+buckets so memory stays constant no matter how many calls are made.
+
+Usage:
+    from telemetry import TELEMETRY
+    with TELEMETRY.track('ucsc.sequence') as call:
+        response = requests.get(url)
+        call.bytes_received = len(response.content)
+    TELEMETRY.export_json('network_summary.json')
+"""
+
+
+# Upper bounds of the latency histogram buckets in seconds; the last bucket is open
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+
+
+"""
+Statistics of a single endpoint.
+"""
+class EndpointStats:
+    def __init__(self):
+        self.calls = 0              # Number of calls, including retries
+        self.errors = 0             # Number of calls that raised or were marked failed
+        self.retries = 0            # Number of calls that were retries of an earlier call
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    """
+    Returns an estimate of the latency percentile from the histogram, using the
+    upper bound of the bucket the percentile falls into (capped at the maximum).
+
+    Input:
+        percentile: percentile between 0 and 100.
+    """
+    def latency_percentile(self, percentile: float) -> float:
+        if not self.calls:
+            return 0.0
+        target = self.calls * percentile / 100
+        seen = 0
+        for i, count in enumerate(self.histogram):
+            seen += count
+            if seen >= target and count:
+                return min(LATENCY_BUCKETS[i], self.max_seconds) if i < len(LATENCY_BUCKETS) else self.max_seconds
+        return self.max_seconds
+
+    """
+    Returns the statistics as a JSON-serializable dictionary.
+
+    Input:
+        wall_seconds: seconds since telemetry started, used for throughput.
+    """
+    def to_dict(self, wall_seconds: float) -> dict:
+        buckets = [f'<={bound}s' for bound in LATENCY_BUCKETS] + [f'>{LATENCY_BUCKETS[-1]}s']
+        return {'calls': self.calls,
+                'errors': self.errors,
+                'error_rate': self.errors / self.calls if self.calls else 0.0,
+                'retries': self.retries,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'total_seconds': round(self.total_seconds, 4),
+                'mean_seconds': round(self.total_seconds / self.calls, 4) if self.calls else 0.0,
+                'p50_seconds': round(self.latency_percentile(50), 4),
+                'p95_seconds': round(self.latency_percentile(95), 4),
+                'max_seconds': round(self.max_seconds, 4),
+                'calls_per_second': round(self.calls / wall_seconds, 4) if wall_seconds else 0.0,
+                'latency_histogram': dict(zip(buckets, self.histogram))}
+
+
+"""
+Information about one call being tracked. Set the byte counts, retry, and
+failed attributes inside the track() block.
+"""
+class CallRecord:
+    def __init__(self, retry: bool = False):
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retry = retry
+        self.failed = False
+
+
+"""
+Thread-safe collection of endpoint statistics.
+"""
+class NetworkTelemetry:
+    def __init__(self):
+        self.endpoints = {}
+        self.start_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    """
+    Record a finished call.
+
+    Inputs:
+        endpoint: endpoint name, e.g. "idt.optimize".
+        seconds: call latency.
+        bytes_sent: request size.
+        bytes_received: response size.
+        error: if the call failed.
+        retry: if the call was a retry of an earlier call.
+    """
+    def record(self, endpoint: str, seconds: float, bytes_sent: int = 0, bytes_received: int = 0,
+               error: bool = False, retry: bool = False):
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, EndpointStats())
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.retries += int(retry)
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.histogram[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    """
+    Time a block of code as one call to an endpoint. Exceptions are recorded as
+    errors and re-raised.
+
+    Inputs:
+        endpoint: endpoint name.
+        retry: if the call is a retry of an earlier call.
+    """
+    @contextmanager
+    def track(self, endpoint: str, retry: bool = False):
+        call = CallRecord(retry)
+        start = time.perf_counter()
+        try:
+            yield call
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            self.record(endpoint, time.perf_counter() - start, call.bytes_sent, call.bytes_received,
+                        call.failed, call.retry)
+
+    """
+    Returns a copy of the statistics of every endpoint, e.g. to send the calls of
+    a worker process back to the parent process.
+    """
+    def snapshot(self) -> dict:
+        with self._lock:
+            return copy.deepcopy(self.endpoints)
+
+    """
+    Add the statistics of a snapshot taken in another process.
+
+    Input:
+        endpoints: snapshot generated with snapshot().
+    """
+    def merge(self, endpoints: dict):
+        with self._lock:
+            for endpoint, other in endpoints.items():
+                stats = self.endpoints.setdefault(endpoint, EndpointStats())
+                stats.calls += other.calls
+                stats.errors += other.errors
+                stats.retries += other.retries
+                stats.bytes_sent += other.bytes_sent
+                stats.bytes_received += other.bytes_received
+                stats.total_seconds += other.total_seconds
+                stats.max_seconds = max(stats.max_seconds, other.max_seconds)
+                stats.histogram = [a + b for a, b in zip(stats.histogram, other.histogram)]
+
+    """
+    Returns a JSON-serializable summary of all endpoints.
+    """
+    def summary(self) -> dict:
+        wall_seconds = time.monotonic() - self.start_time
+        with self._lock:
+            endpoints = {name: stats.to_dict(wall_seconds) for name, stats in sorted(self.endpoints.items())}
+        network_seconds = sum(stats['total_seconds'] for stats in endpoints.values())
+        return {'wall_seconds': round(wall_seconds, 4),
+                'network_seconds': round(network_seconds, 4),
+                'endpoints': endpoints}
+
+    """
+    Write the summary to a JSON file.
+
+    Input:
+        path: output file path.
+    Returns: output file path.
+    """
+    def export_json(self, path: str) -> str:
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        return path
+
+    """
+    Print a short per-endpoint report of where network time went.
+    """
+    def print_report(self):
+        summary = self.summary()
+        print(f"Network time {summary['network_seconds']:.1f}s of {summary['wall_seconds']:.1f}s wall time")
+        for name, stats in summary['endpoints'].items():
+            print(f"  {name}: {stats['calls']} calls, {stats['errors']} errors, {stats['retries']} retries, "
+                  f"mean {stats['mean_seconds']:.3f}s, p95 {stats['p95_seconds']}s, "
+                  f"{stats['bytes_received']/1e6:.2f} MB received")
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+            self.start_time = time.monotonic()
+
+
+TELEMETRY = NetworkTelemetry()
@@ -0,0 +1,23 @@
+from telemetry import TELEMETRY
+from alignment_index import run_designs, bowtie2_index_args
+
+
+def _design(i):
+    for _ in range(i+1):
+        TELEMETRY.record('entrez.esummary', 0.02, bytes_received=100)
+    return i, bowtie2_index_args()
+
+
+def test_parallel_runs_merge_worker_telemetry(tmp_path):
+    (tmp_path / 'idx.1.bt2').write_bytes(b'\0' * 1024)
+    TELEMETRY.reset()
+    TELEMETRY.record('ucsc.sequence', 0.5)
+
+    results = run_designs(_design, [dict(i=i) for i in range(4)], str(tmp_path / 'idx'), workers=2)
+
+    assert results == [(i, ['--mm']) for i in range(4)]
+    assert bowtie2_index_args() == []
+    endpoints = TELEMETRY.summary()['endpoints']
+    assert endpoints['entrez.esummary']['calls'] == 10
+    assert endpoints['entrez.esummary']['bytes_received'] == 1000
+    assert endpoints['ucsc.sequence']['calls'] == 1
@@ -0,0 +1,48 @@
+import sys
+import json
+import random
+import subprocess
+import pandas as pd
+import batch_cli
+from utils import design_primer_pair
+
+
+def test_switches_can_be_turned_off_on_the_command_line(tmp_path):
+    args = batch_cli.parse_args(['primers', '--no-dimer-check', '--no-replace-failed-qc', '--no-tight-flank'])
+    assert (args.dimer_check, args.replace_failed_qc, args.tight_flank) == (False, False, False)
+    args = batch_cli.parse_args(['primers'])
+    assert (args.dimer_check, args.replace_failed_qc, args.from_coordinates) == (True, True, False)
+
+    config = tmp_path / 'settings.json'
+    config.write_text(json.dumps({'from_coordinates': True, 'verbose': True, 'low_gc': 35}))
+    args = batch_cli.parse_args(['primers', '--config', str(config)])
+    assert (args.from_coordinates, args.verbose, args.low_gc) == (True, True, 35)
+    args = batch_cli.parse_args(['primers', '--config', str(config), '--no-from-coordinates', '--no-verbose',
+                                 '--low-gc', '42'])
+    assert (args.from_coordinates, args.verbose, args.low_gc) == (False, False, 42)
+
+
+def test_parsing_does_not_import_heavy_dependencies():
+    code = ("import sys, batch_cli; batch_cli.parse_args(['primers', '--input', 'x.csv']); "
+            "print(sorted(m for m in ['pandas', 'numpy', 'Bio', 'primer3', 'tkinter'] if m in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', code], cwd=batch_cli.REPO_DIR, capture_output=True, text=True,
+                            check=True).stdout
+    assert output.strip() == '[]'
+
+
+def test_primers_match_the_interactive_design(tmp_path):
+    rng = random.Random(0)
+    seqs = [''.join(rng.choices('ACGT', k=700)) for _ in range(25)]
+    pd.DataFrame({'name': [f'peak{i}' for i in range(25)], 'coordinate': '', 'sequence': seqs}).to_csv(
+        tmp_path / 'peaks.csv', index=False)
+
+    batch_cli.main(['primers', '--input', str(tmp_path / 'peaks.csv'), '--output-dir', str(tmp_path / 'out'),
+                    '--format', 'csv', '--chunksize', '10', '--no-dimer-check'])
+    [output] = (tmp_path / 'out').iterdir()
+    df = pd.read_csv(output, keep_default_na=False)
+    expected = [design_primer_pair(seq, 100, 500, range(22, 26), True, ['GGAGG', 'TAAGGAG', 'TTTTT', 'AAAAA'],
+                                   40, 60, 50, 60) for seq in seqs]
+    assert df['name'].tolist() == [f'peak{i}' for i in range(25)]
+    assert df['fwd primer'].tolist() == [primer.fwd for primer in expected]
+    assert df['rev primer'].tolist() == [primer.rev for primer in expected]
+    assert 'QC pass' not in df.columns
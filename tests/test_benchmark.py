@@ -0,0 +1,56 @@
+import os
+import json
+import pytest
+import benchmark
+from benchmark import StubUCSC, synthetic_coordinates, synthetic_flanks, find_regressions
+from utils import get_sequence_from_coordinate
+
+
+def _results(rates):
+    return {'primer_generation': {case: {'rows_per_sec': rate} for case, rate in rates.items()}}
+
+
+def test_flanks_are_soft_masked_and_match_retrieval():
+    coordinates = synthetic_coordinates(20, seed=1)
+    seqs = synthetic_flanks(coordinates)
+    assert all(len(seq) == benchmark.TARGET_LENGTH + 2*benchmark.FLANK_SIZE for seq in seqs)
+    joined = ''.join(seqs)
+    assert 0.2 < sum(base.islower() for base in joined) / len(joined) < 0.5
+    with StubUCSC():
+        retrieved = [get_sequence_from_coordinate(coordinate, False, benchmark.FLANK_SIZE) for coordinate in coordinates]
+    assert retrieved == [seq.upper() for seq in seqs]
+
+
+def test_regressions_use_the_overall_throughput():
+    baseline = _results({'a': 100, 'b': 100, 'c': 100})
+    # One slow case among fast ones is run-to-run noise
+    assert find_regressions(_results({'a': 50, 'b': 150, 'c': 140}), baseline, 0.3) == []
+    messages = find_regressions(_results({'a': 50, 'b': 60, 'c': 100}), baseline, 0.3)
+    assert messages[0].startswith('overall: 67%')
+    assert messages[1].startswith('a: 50.0 rows/s')
+    # Cases missing from the baseline are not compared
+    assert find_regressions(_results({'d': 1}), baseline) == []
+
+
+def test_baseline_is_opt_in(tmp_path, capsys):
+    options = ['--sizes', '20', '--repeats', '1', '--calls', '20']
+    benchmark.main(options + ['--output', str(tmp_path / 'results.json')])
+    assert 'No baseline given' in capsys.readouterr().out
+    with open(tmp_path / 'results.json') as f:
+        assert len(json.load(f)['primer_generation']) == 2 * len(benchmark.LEN_RANGES)
+
+    with pytest.raises(SystemExit):
+        benchmark.main(options + ['--update-baseline'])
+    baseline = str(tmp_path / 'baseline.json')
+    benchmark.main(options + ['--baseline', baseline, '--update-baseline'])
+    with pytest.raises(SystemExit, match='different --from-coordinates'):
+        benchmark.main(options + ['--baseline', baseline, '--from-coordinates'])
+
+
+@pytest.mark.skipif(not os.environ.get('RUN_BENCHMARKS'), reason='set RUN_BENCHMARKS=1 to run throughput checks')
+def test_primer_generation_throughput():
+    baseline = os.environ.get('BENCHMARK_BASELINE')
+    if not baseline:
+        pytest.skip('set BENCHMARK_BASELINE to a baseline stored on this machine with --update-baseline')
+    # Exits with the slowest cases if throughput dropped more than 30% below the baseline
+    benchmark.main(['--baseline', baseline])
@@ -0,0 +1,21 @@
+import pytest
+from codon_optimizer import available_codon_tables, check_codon_usage, load_codon_usage, optimize_codons, _parse_kazusa
+
+
+@pytest.mark.parametrize('organism', ['Pichia pastoris', 'Gallus gallus', 'Bacillus subtilis',
+                                      'Caenorhabditis elegans (nematode)', 'Mus musculus (mouse)'])
+def test_bundled_tables_cover_every_codon(organism):
+    usage = load_codon_usage(organism)
+    assert len(usage) == 64
+    assert optimize_codons(['MKLVW*'], organism, gc_range=None)[0].startswith('ATG')
+
+
+def test_unsupported_organism_fails_with_available_tables():
+    with pytest.raises(AssertionError, match='Pichia pastoris'):
+        check_codon_usage('Bos taurus')
+    assert 'Pichia pastoris' in available_codon_tables()
+
+
+def test_parse_kazusa():
+    text = 'UUU 24.1(  1963)  UCU 24.4(  1983)  UAU 16.0(  1300)  UGU  7.7(   626)'
+    assert _parse_kazusa(text) == {'TTT': 24.1, 'TCT': 24.4, 'TAT': 16.0, 'TGT': 7.7}
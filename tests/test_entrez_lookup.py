@@ -0,0 +1,118 @@
+import json
+import threading
+import pytest
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import entrez_lookup
+from entrez_lookup import EntrezLookup
+
+# Records of the stand-in nucleotide database by accession: (UID, title)
+RECORDS = {f'NM_{i:06d}': (str(1000+i), f'Mus musculus gene{i} (Gene{i}), mRNA') for i in range(1, 2001)}
+
+
+class StubEutils(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode()).items()}
+        utility = self.path.rsplit('/', 1)[-1].split('.')[0]
+        with server.lock:
+            server.calls.append(utility)
+            status = server.statuses.pop(0) if server.statuses else 200
+        if status != 200:
+            return self._reply(status, 'text/plain', b'Bad request')
+        if utility == 'epost':
+            # Accessions with or without version and UIDs are accepted
+            known = {uid: uid for uid, _ in RECORDS.values()}
+            known.update((accession, uid) for accession, (uid, _) in RECORDS.items())
+            ids = form['id'].split(',')
+            uids = list(dict.fromkeys(known[id_.split('.')[0]] for id_ in ids if id_.split('.')[0] in known))
+            invalid = ''.join(f'<Id>{id_}</Id>' for id_ in ids if id_.split('.')[0] not in known)
+            if not uids:
+                return self._reply(200, 'text/xml', b'<ePostResult><ERROR>Invalid uid</ERROR></ePostResult>')
+            with server.lock:
+                server.posted[str(len(server.posted))] = uids
+            xml = (f'<ePostResult>{f"<InvalidIdList>{invalid}</InvalidIdList>" if invalid else ""}'
+                   f'<QueryKey>1</QueryKey><WebEnv>{len(server.posted)-1}</WebEnv></ePostResult>')
+            return self._reply(200, 'text/xml', xml.encode())
+        start, size = int(form['retstart']), int(form['retmax'])
+        uids = server.posted[form['WebEnv']][start:start+size]
+        by_uid = {uid: (accession, title) for accession, (uid, title) in RECORDS.items()}
+        result = {'uids': uids}
+        for uid in uids:
+            accession, title = by_uid[uid]
+            result[uid] = {'uid': uid, 'caption': accession, 'accessionversion': accession + '.1', 'title': title}
+        self._reply(200, 'application/json', json.dumps({'result': result}).encode())
+
+    def _reply(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def eutils(monkeypatch):
+    # No rate limit against the local server
+    monkeypatch.setattr(entrez_lookup, 'RATE_SHARE', 1e6)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubEutils)
+    server.lock = threading.Lock()
+    server.calls, server.statuses, server.posted = [], [], {}
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _lookup(eutils, **options):
+    return EntrezLookup('you@lab.edu', base_url=eutils.url, backoff=0, **options)
+
+
+def test_ids_are_posted_once_and_summarized_in_pages(eutils):
+    lookup = _lookup(eutils, batch_size=500)
+    ids = [f'NM_{i:06d}.1' for i in range(1, 1201)] + ['NM_000001.1', '1005']
+    descriptions = lookup.describe(ids)
+    assert eutils.calls == ['epost', 'esummary', 'esummary', 'esummary']
+    assert descriptions['NM_000007.1'] == 'Mus musculus gene7 (Gene7), mRNA'
+    assert descriptions['1005'] == 'Mus musculus gene5 (Gene5), mRNA'
+    assert len(descriptions) == 1201
+
+    # Memoized descriptions need no requests
+    lookup.describe(['NM_000007.1', '1005'])
+    assert eutils.calls == ['epost', 'esummary', 'esummary', 'esummary']
+
+
+def test_invalid_ids_do_not_cause_extra_pages(eutils):
+    lookup = _lookup(eutils, batch_size=10)
+    ids = [f'NM_{i:06d}' for i in range(1, 11)] + [f'XM_{i:06d}' for i in range(25)]
+    descriptions = lookup.describe(ids)
+    assert eutils.calls == ['epost', 'esummary']
+    assert descriptions['NM_000010'] == 'Mus musculus gene10 (Gene10), mRNA'
+    assert descriptions['XM_000003'] == ''
+
+    assert lookup.describe(['XR_1', 'XR_2']) == {'XR_1': '', 'XR_2': ''}
+    assert eutils.calls == ['epost', 'esummary', 'epost']
+
+
+def test_server_errors_are_retried_and_client_errors_raised(eutils):
+    eutils.statuses = [503, 429]
+    assert _lookup(eutils).describe(['NM_000002'])['NM_000002'] == 'Mus musculus gene2 (Gene2), mRNA'
+    assert eutils.calls == ['epost', 'epost', 'epost', 'esummary']
+
+    eutils.statuses = [400]
+    with pytest.raises(RuntimeError, match='error code: 400'):
+        _lookup(eutils).describe(['NM_000003'])
+    eutils.statuses = [500] * 4
+    with pytest.raises(RuntimeError, match=r'after 4 tries \(error code 500\)'):
+        _lookup(eutils).describe(['NM_000003'])
+
+
+def test_connection_errors_are_raised_after_retries():
+    lookup = EntrezLookup(base_url='http://127.0.0.1:9', retries=1, backoff=0, timeout=1)
+    with pytest.raises(RuntimeError, match=r'after 2 tries \(ConnectionError'):
+        lookup.describe(['NM_000001'])
@@ -0,0 +1,122 @@
+import json
+import threading
+import pytest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import utils
+from idt_client import IDTClient, TOKEN_PATH, OPTIMIZE_PATH
+from utils import build_peptide_items
+
+
+class StubIDT(BaseHTTPRequestHandler):
+    # Behaviour is set on the server: token_status, and a list of statuses the optimize endpoint
+    # answers with before it succeeds
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with server.lock:
+            if self.path == TOKEN_PATH:
+                server.tokens += 1
+                status, reply = server.token_status, {'access_token': f'token{server.tokens}', 'expires_in': 3600}
+            else:
+                server.optimize_calls += 1
+                server.bearers.add(self.headers['Authorization'])
+                status = server.optimize_statuses.pop(0) if server.optimize_statuses else 200
+                items = json.loads(body)['optimizationItems']
+                reply = [{'OptResult': {'FullSequence': 'ATG' * len(item['Sequence'])}} for item in items]
+        payload = json.dumps(reply if status == 200 else {'error': status}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def idt():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubIDT)
+    server.lock = threading.Lock()
+    server.tokens = server.optimize_calls = 0
+    server.token_status = 200
+    server.optimize_statuses = []
+    server.bearers = set()
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(idt, **options):
+    return IDTClient('user', 'password', 'id', 'secret', base_url=idt.url, backoff=0, **options)
+
+
+def _peptides(n):
+    return build_peptide_items([f'p{i}' for i in range(n)], ['M' + 'K'*i for i in range(n)])
+
+
+def test_chunks_share_one_token_and_keep_order(idt):
+    results = _client(idt, chunk_size=3, max_workers=4).optimize(_peptides(20), 'Mus musculus (mouse)', 'gene')
+    assert results == ['ATG' * (i+1) for i in range(20)]
+    assert idt.optimize_calls == 7
+    assert idt.tokens == 1
+
+
+def test_rate_limits_and_server_errors_are_retried(idt):
+    idt.optimize_statuses = [429, 503, 500]
+    results = _client(idt, chunk_size=5, max_workers=1, retries=3).optimize(_peptides(5), 'Mus musculus (mouse)', 'gene')
+    assert results == ['ATG' * (i+1) for i in range(5)]
+    assert idt.optimize_calls == 4
+
+
+def test_expired_token_is_replaced(idt):
+    idt.optimize_statuses = [401]
+    assert _client(idt).optimize(_peptides(2), 'Mus musculus (mouse)', 'gene') == ['ATG', 'ATGATG']
+    assert idt.tokens == 2
+    assert idt.bearers == {'Bearer token1', 'Bearer token2'}
+
+
+def test_rejected_credentials_and_requests_are_raised(idt):
+    idt.token_status = 400
+    with pytest.raises(RuntimeError, match='400'):
+        _client(idt, retries=3).optimize(_peptides(4), 'Mus musculus (mouse)', 'gene')
+    assert idt.tokens == 1
+
+    idt.token_status = 200
+    idt.optimize_statuses = [400]
+    with pytest.raises(RuntimeError, match='400'):
+        _client(idt, retries=3).optimize(_peptides(4), 'Mus musculus (mouse)', 'gene')
+    assert idt.optimize_calls == 1
+
+    # A fresh token that is still refused is not retried again
+    idt.optimize_statuses = [401, 401, 401]
+    with pytest.raises(RuntimeError, match='401'):
+        _client(idt, retries=3).optimize(_peptides(4), 'Mus musculus (mouse)', 'gene')
+
+
+def test_chunks_failing_every_try_are_reported(idt, capsys):
+    idt.optimize_statuses = [503] * 3
+    results = _client(idt, chunk_size=2, max_workers=1, retries=2).optimize(_peptides(4), 'Mus musculus (mouse)', 'gene')
+    assert results == [None, None, 'ATG' * 3, 'ATG' * 4]
+    assert 'failed after 3 tries (error code 503)' in capsys.readouterr().out
+
+
+def test_connection_errors_are_retried_then_reported(capsys):
+    client = IDTClient('user', 'password', 'id', 'secret', base_url='http://127.0.0.1:9', retries=1, backoff=0,
+                       timeout=1)
+    assert client.optimize(_peptides(2), 'Mus musculus (mouse)', 'gene') == [None, None]
+    assert 'failed after 2 tries (ConnectionError' in capsys.readouterr().out
+
+
+def test_clients_are_cached_per_account_and_settings(idt, monkeypatch):
+    monkeypatch.setattr(utils, '_IDT_CLIENTS', {})
+    first = utils._get_idt_client('user', 'password', 'id', 'secret', base_url=idt.url, timeout=5)
+    assert utils._get_idt_client('user', 'password', 'id', 'secret', base_url=idt.url, timeout=5) is first
+    changed = utils._get_idt_client('user', 'password', 'id', 'secret', base_url=idt.url, timeout=30)
+    assert changed is not first and changed.timeout == 30
+    assert utils._get_idt_client('user', 'other', 'id', 'secret', base_url=idt.url, timeout=5) is not first
+    assert utils.reverse_translate(_peptides(3), 'Mus musculus (mouse)', 'gene', 'user', 'password', 'id', 'secret',
+                                   base_url=idt.url, max_workers=2) == ['ATG', 'ATGATG', 'ATGATGATG']
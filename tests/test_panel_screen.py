@@ -0,0 +1,68 @@
+import os
+import time
+import random
+import pandas as pd
+import pytest
+from sequence_kernels import reverse_complement
+from panel_screen import panel_oligos, find_cross_hybridization, screen_panel
+from probe_design_adapted import GetInitiatorSeq
+
+
+def _random_probes(name, n, rng):
+    return pd.DataFrame({'name': name, 'position': range(n),
+                         'probe A': [''.join(rng.choices('ACGT', k=40)) for _ in range(n)],
+                         'probe B': [''.join(rng.choices('ACGT', k=40)) for _ in range(n)]})
+
+
+def _oligo_table(seqs):
+    return pd.DataFrame([[f'g{i}', i, 'probe A', seq] for i, seq in enumerate(seqs)],
+                        columns=['name', 'probe', 'part', 'sequence'])
+
+
+def test_planted_conflicts_are_found_and_dropped():
+    rng = random.Random(1)
+    first, second = _random_probes('Gfap', 10, rng), _random_probes('Actb', 10, rng)
+    # Probe B 4 of Actb binds 16 nt of probe A 2 of Gfap; probe A 7 of Actb binds the B1 initiator
+    second.loc[4, 'probe B'] = second.loc[4, 'probe B'][:10] + reverse_complement(first.loc[2, 'probe A'][5:21]) \
+        + second.loc[4, 'probe B'][26:]
+    second.loc[7, 'probe A'] = reverse_complement(GetInitiatorSeq(1)[:18]).lower() + second.loc[7, 'probe A'][18:]
+
+    conflicts, _ = screen_panel([first, second], hairpin_ids=[1])
+    pairs = {(row[0], row[1], row[2], row[3], row[4], row[5]): row[6] for row in conflicts.itertuples(index=False)}
+    assert pairs.keys() == {('Gfap', 2, 'probe A', 'Actb', 4, 'probe B'),
+                            ('Actb', 7, 'probe A', 'initiator B1', -1, 'initiator')}
+    assert pairs[('Gfap', 2, 'probe A', 'Actb', 4, 'probe B')] >= 16
+
+    _, (kept_first, kept_second) = screen_panel([first, second], hairpin_ids=[1], drop=True)
+    assert len(kept_first) + len(kept_second) == 18
+    assert 7 not in kept_second['position'].tolist()
+
+
+def test_shared_sequence_counts_every_carrier():
+    rng = random.Random(2)
+    backbone = ''.join(rng.choices('ACGT', k=20))
+    carriers = [''.join(rng.choices('ACGT', k=10)) + backbone + ''.join(rng.choices('ACGT', k=10))
+                for _ in range(150)]
+    # The complementary oligo comes before the last carriers, which are counted too
+    seqs = carriers[:120] + [reverse_complement(backbone)] + carriers[120:]
+    conflicts = find_cross_hybridization(_oligo_table(seqs), max_occurrences=100)
+    shared = conflicts[conflicts['part 2'] == 'shared']
+    assert shared[['name 1', 'probe 2', 'complementary length']].values.tolist() == [['g120', 150, 20]]
+
+
+def test_panel_oligos_strip_phosphorylation():
+    useqfish = pd.DataFrame({'name': ['Gfap'], 'primer': ['acgtACGT'], 'padlock': ['/5Phos/ttaaGGCC']})
+    oligos = panel_oligos([useqfish])
+    assert oligos['sequence'].tolist() == ['ACGTACGT', 'TTAAGGCC']
+
+
+@pytest.mark.skipif(not os.environ.get('RUN_BENCHMARKS'), reason='set RUN_BENCHMARKS=1 to run throughput checks')
+def test_ten_thousand_oligo_panel_throughput():
+    rng = random.Random(0)
+    results = [_random_probes(f'gene{i}', 50, rng) for i in range(100)]
+    oligos = panel_oligos(results)
+    assert len(oligos) == 10000
+    start = time.perf_counter()
+    find_cross_hybridization(oligos)
+    # About a second on a single core; the limit leaves room for slower machines
+    assert time.perf_counter() - start < 5
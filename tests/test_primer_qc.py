@@ -0,0 +1,52 @@
+import sys
+import random
+import subprocess
+import primer_qc
+from primer_qc import calc_dg, clear_cache
+
+# Like primer_generator.py: a module-level script without a __main__ guard
+UNGUARDED_SCRIPT = '''
+import os, sys, random, multiprocessing
+multiprocessing.set_start_method('spawn', force=True)
+os.cpu_count = lambda: 4
+sys.path.insert(0, {repo!r})
+print('script started', flush=True)
+from primer_qc import calc_dg
+rng = random.Random(0)
+tasks = [('hairpin', ''.join(rng.choices('ACGT', k=22))) for _ in range(2500)]
+print(len(calc_dg(tasks)), 'values', flush=True)
+'''
+
+
+def _tasks(n, seed=0):
+    rng = random.Random(seed)
+    seqs = [''.join(rng.choices('ACGT', k=22)) for _ in range(n)]
+    return [('hairpin', seq) for seq in seqs] + [('heterodimer', a, b) for a, b in zip(seqs, seqs[1:])]
+
+
+def test_unguarded_scripts_do_not_start_a_pool_under_spawn(tmp_path):
+    script = tmp_path / 'design.py'
+    script.write_text(UNGUARDED_SCRIPT.format(repo=str(primer_qc.__file__).rsplit('/', 1)[0]))
+    result = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split('\n')[:2] == ['script started', '2500 values']
+
+
+def test_pool_matches_serial_calculation():
+    tasks = _tasks(60)
+    clear_cache()
+    serial = calc_dg(tasks)
+    clear_cache()
+    assert calc_dg(tasks, processes=2, min_parallel=1) == serial
+    clear_cache()
+
+
+def test_repeated_tasks_are_calculated_once(monkeypatch):
+    clear_cache()
+    calculated = []
+    monkeypatch.setattr(primer_qc, '_thermo_dg', lambda task: calculated.append(task) or -1.0)
+    tasks = _tasks(10)
+    assert calc_dg(tasks + tasks) == [-1.0] * 2 * len(tasks)
+    assert calc_dg(tasks[:5]) == [-1.0] * 5
+    assert calculated == tasks
+    clear_cache()
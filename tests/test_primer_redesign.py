@@ -0,0 +1,47 @@
+import random
+import primer_qc
+import primer_specificity
+from utils import design_primer_pair, primer_redesigner
+
+
+SETTINGS = (100, 500, range(22, 26), True, ['GGAGG', 'TAAGGAG', 'TTTTT', 'AAAAA'], 40, 60, 50, 60)
+
+
+def _flanks(n, seed=0):
+    rng = random.Random(seed)
+    return [''.join(rng.choices('ACGT', k=700)) for _ in range(n)]
+
+
+def test_qc_rejects_never_return_after_specificity_redesign(monkeypatch):
+    seqs = _flanks(20)
+    primers = [design_primer_pair(seq, *SETTINGS) for seq in seqs]
+    bad_fwd = {primer.fwd for primer in primers}
+    bad_rev = {primer.rev_oligo() for primer in primers}
+
+    # QC fails every original forward primer on its hairpin
+    monkeypatch.setattr(primer_qc, 'calc_dg', lambda tasks, processes=None: [
+        -10.0 if task[0] == 'hairpin' and task[1] in bad_fwd else 0.0 for task in tasks])
+    # The specificity check finds every original reverse primer elsewhere in the genome
+    monkeypatch.setattr(primer_specificity, 'count_alignments', lambda seqs, db, max_hits=1, **options: [
+        5 if seq in bad_rev else 1 for seq in seqs])
+
+    redesign = primer_redesigner(seqs, *SETTINGS)
+    primers, qc = primer_qc.check_primer_dimers(primers, redesign)
+    assert all(result[-1] for result in qc)
+    primers, specificity = primer_specificity.check_primer_specificity(primers, 'genome', redesign)
+    assert all(result[-1] for result in specificity)
+
+    assert not any(primer.fwd in bad_fwd for primer in primers)
+    primers, qc = primer_qc.check_primer_dimers(primers, None)
+    assert all(result[-1] for result in qc)
+
+
+def test_redesigner_keeps_rejections_per_row():
+    seqs = _flanks(2, seed=1)
+    redesign = primer_redesigner(seqs, *SETTINGS)
+    first = design_primer_pair(seqs[0], *SETTINGS)
+
+    replaced = redesign(0, {first.fwd})
+    again = redesign(0, {replaced.rev})
+    assert again.fwd not in (first.fwd, '')
+    assert redesign(1, set()).fwd == design_primer_pair(seqs[1], *SETTINGS).fwd
@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import random
+import subprocess
+import pytest
+from alignment_index import SharedIndex
+from primer_specificity import count_alignments, check_primer_specificity
+from utils import design_primer_pair, primer_redesigner
+
+
+FAKE_BOWTIE2 = '''#!{python}
+import os, sys, json
+# Stand-in for bowtie2: every query aligns as many times as listed in $FAKE_HITS (default 1)
+args = sys.argv[1:]
+lines = open(args[args.index('-U')+1]).read().split()
+with open(os.environ['FAKE_CALLS'], 'a') as f:
+    f.write(json.dumps(args + ['queries', len(lines)//2]) + '\\n')
+hits = json.load(open(os.environ['FAKE_HITS']))
+if hits.get('exit'):
+    sys.exit(hits['exit'])
+limit = int(args[args.index('-k')+1])
+for name, seq in zip(lines[::2], lines[1::2]):
+    count = min(hits.get(seq, 1), limit)
+    if not count:
+        print(name[1:], 4, '*', 0, sep='\\t')
+    for _ in range(count):
+        print(name[1:], 0, 'chr1', 100, sep='\\t')
+'''
+
+SETTINGS = (100, 500, range(22, 26), True, ['GGAGG', 'TAAGGAG', 'TTTTT', 'AAAAA'], 40, 60, 50, 60)
+
+
+@pytest.fixture
+def bowtie2(tmp_path, monkeypatch):
+    script = tmp_path / 'bin' / 'bowtie2'
+    script.parent.mkdir()
+    script.write_text(FAKE_BOWTIE2.format(python=sys.executable))
+    script.chmod(0o755)
+    monkeypatch.setenv('PATH', f'{script.parent}{os.pathsep}{os.environ["PATH"]}')
+    monkeypatch.setenv('FAKE_CALLS', str(tmp_path / 'calls.jsonl'))
+    monkeypatch.setenv('FAKE_HITS', str(tmp_path / 'hits.json'))
+
+    class Fake:
+        def set_hits(self, hits):
+            (tmp_path / 'hits.json').write_text(json.dumps(hits))
+
+        def calls(self):
+            path = tmp_path / 'calls.jsonl'
+            return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+    fake = Fake()
+    fake.set_hits({})
+    return fake
+
+
+def test_alignments_are_counted_in_one_call(bowtie2):
+    bowtie2.set_hits({'AAAC': 0, 'GGGT': 5})
+    assert count_alignments(['ACGT', 'AAAC', '', 'GGGT'], 'genome', max_hits=2) == [1, 0, 0, 3]
+    [call] = bowtie2.calls()
+    assert call[call.index('-k')+1] == '3' and call[call.index('-x')+1] == 'genome'
+    assert '--mm' not in call
+    assert count_alignments(['', ''], 'genome') == [0, 0]
+    assert len(bowtie2.calls()) == 1
+
+
+def test_shared_index_maps_the_index_and_failures_raise(bowtie2):
+    with SharedIndex('genome', warm=False):
+        count_alignments(['ACGT'], 'genome')
+    assert '--mm' in bowtie2.calls()[-1]
+    bowtie2.set_hits({'exit': 1})
+    with pytest.raises(subprocess.CalledProcessError):
+        count_alignments(['ACGT'], 'genome')
+
+
+def test_non_specific_primers_are_replaced_in_batched_rounds(bowtie2):
+    rng = random.Random(4)
+    seqs = [''.join(rng.choices('ACGT', k=700)) for _ in range(6)]
+    primers = [design_primer_pair(seq, *SETTINGS) for seq in seqs]
+    repeats = {primers[0].fwd: 4, primers[3].rev_oligo(): 2}
+    bowtie2.set_hits(repeats)
+
+    flagged, results = check_primer_specificity(primers, 'genome', None)
+    assert [result[-1] for result in results] == [False, True, True, False, True, True]
+    assert results[0][:2] == [2, 1] and results[3][:2] == [1, 2]
+    assert flagged == primers
+
+    checked, results = check_primer_specificity(primers, 'genome', primer_redesigner(seqs, *SETTINGS))
+    assert all(result[-1] for result in results)
+    assert checked[0].fwd != primers[0].fwd and checked[0].rev == primers[0].rev
+    assert checked[3].rev != primers[3].rev and checked[3].fwd == primers[3].fwd
+    assert checked[1:3] == primers[1:3]
+    # One call for all primers, one for the two replacements
+    assert [call[-1] for call in bowtie2.calls()[1:]] == [12, 4]
@@ -0,0 +1,36 @@
+import numpy as np
+from probe_design_adapted import IsUnique
+
+
+class FakeLookup:
+    def __init__(self, descriptions):
+        self.descriptions = descriptions
+
+    def describe(self, ids):
+        return {id_: self.descriptions[id_] for id_ in ids}
+
+
+LOOKUP = FakeLookup({'NM_1': 'Mus musculus glial fibrillary acidic protein (Gfap), mRNA',
+                     'NM_2': 'Mus musculus actin, beta (Actb), mRNA'})
+
+
+def _write_sam(path, hits):
+    # One line per read, as bowtie2 --reorder writes them
+    path.write_text(''.join(f'{name}\t0\t{hit}\t1\t42\t20M\t*\t0\t0\tACGT\tIIII\n' for name, hit in hits))
+    return str(path)
+
+
+def test_full_probe_hits_are_matched_to_their_own_candidate(tmp_path):
+    # Candidates 1-4; the second half of candidate 3 (position 2) also binds Actb
+    hits = [(f'{i}-{half}', 'NM_2' if (i, half) == (3, 2) else 'NM_1') for i in range(1, 5) for half in (1, 2)]
+    sam = _write_sam(tmp_path / 'full.sam', hits)
+    assert IsUnique(sam, 'Gfap', np.arange(4), full=True, lookup=LOOKUP).tolist() == [False, False, True, False]
+    # Candidates removed by earlier filters are skipped without shifting the others
+    assert IsUnique(sam, 'Gfap', np.array([0, 2]), full=True, lookup=LOOKUP).tolist() == [False, True]
+    assert IsUnique(sam, 'Gfap', np.array([1, 3]), full=True, lookup=LOOKUP).tolist() == [False, False]
+
+
+def test_candidate_hits_and_unaligned_reads(tmp_path):
+    sam = _write_sam(tmp_path / 'candidates.sam', [('1', 'NM_1'), ('2', '*'), ('3', 'NM_2'), ('4', 'NM_1')])
+    assert IsUnique(sam, 'Gfap', np.arange(4), lookup=LOOKUP).tolist() == [False, False, True, False]
+    assert IsUnique(sam, 'Gfap', np.array([2, 3]), lookup=LOOKUP).tolist() == [True, False]
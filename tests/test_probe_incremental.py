@@ -0,0 +1,65 @@
+import os
+import random
+from Bio import SeqIO
+import probe_design_adapted
+import probe_sweep
+from probe_design_adapted import designHCR3Probes
+from probe_incremental import designHCR3ProbesIncremental
+
+
+class FakeLookup:
+    def describe(self, ids):
+        return {id_: 'Mus musculus test gene (Tst), mRNA' if id_ == 'NM_1' else 'Mus musculus other gene, mRNA'
+                for id_ in ids}
+
+
+def _fake_bowtie2(aligned):
+    # Sequences with the motif also bind another gene; candidates are recorded as they are aligned
+    def bowtie2(fastafile, db='', result_path='', score_min=''):
+        with open(result_path, 'w') as sam:
+            for record in SeqIO.parse(fastafile, 'fasta'):
+                if '-' not in record.id:
+                    aligned.append(str(record.seq))
+                hit = 'NM_2' if 'ACGTA' in str(record.seq).upper() else 'NM_1'
+                sam.write(f'{record.id}\t0\t{hit}\t1\t42\t20M\t*\t0\t0\tACGT\tIIII\n')
+    return bowtie2
+
+
+def test_edit_reanalyzes_only_overlapping_candidates(monkeypatch, tmp_path):
+    aligned = []
+    monkeypatch.setattr(probe_design_adapted, 'ProbeBowtie2', _fake_bowtie2(aligned))
+    monkeypatch.setattr(probe_sweep, 'ProbeBowtie2', _fake_bowtie2(aligned))
+    monkeypatch.setattr(probe_design_adapted, 'get_lookup', lambda *args: FakeLookup())
+    rng = random.Random(11)
+    old_seq = ''.join(rng.choices('ACGT', k=1200))
+    new_seq = old_seq[:600] + ''.join(rng.choices('ACGT', k=15)) + old_seq[610:]
+    settings = dict(gene_name='Tst', hairpin_id=1, result_path=str(tmp_path), prb_length=20, prb_space=2)
+    state = str(tmp_path / 'state.json')
+
+    designHCR3ProbesIncremental(state, sequence=old_seq, **settings)
+    assert len(aligned) == len(old_seq) - 39
+    aligned.clear()
+    updated = designHCR3ProbesIncremental(state, sequence=new_seq, **settings)
+    # Only 40 nt windows touching the edit are new; random bases may match at its ends
+    prefix = len(os.path.commonprefix([old_seq, new_seq]))
+    suffix = len(os.path.commonprefix([old_seq[::-1], new_seq[::-1]]))
+    assert len(aligned) == len(new_seq) - prefix - suffix + 39 < 100
+
+    fresh = designHCR3Probes(sequence=new_seq, **settings)
+    assert len(fresh) > 10
+    assert updated['position'].tolist() == fresh['position'].astype(int).tolist()
+    assert updated['probe A'].tolist() == fresh['probe A'].tolist()
+    assert updated['probe B'].tolist() == fresh['probe B'].tolist()
+
+
+def test_changed_settings_start_over(monkeypatch, tmp_path):
+    aligned = []
+    monkeypatch.setattr(probe_sweep, 'ProbeBowtie2', _fake_bowtie2(aligned))
+    monkeypatch.setattr(probe_design_adapted, 'get_lookup', lambda *args: FakeLookup())
+    seq = ''.join(random.Random(12).choices('ACGT', k=500))
+    state = str(tmp_path / 'state.json')
+
+    designHCR3ProbesIncremental(state, gene_name='Tst', sequence=seq, result_path=str(tmp_path), prb_length=20)
+    aligned.clear()
+    designHCR3ProbesIncremental(state, gene_name='Tst', sequence=seq, result_path=str(tmp_path), prb_length=18)
+    assert len(aligned) == len(seq) - 35
@@ -0,0 +1,47 @@
+import random
+import itertools
+from Bio import SeqIO
+import probe_design_adapted
+import probe_sweep
+from probe_design_adapted import designHCR3Probes
+from probe_sweep import hcr3_feature_table, select_probes, evaluate_settings
+
+
+class FakeLookup:
+    def describe(self, ids):
+        return {id_: 'Mus musculus test gene (Tst), mRNA' if id_ == 'NM_1' else 'Mus musculus other gene, mRNA'
+                for id_ in ids}
+
+
+def _fake_bowtie2(fastafile, db='', result_path='', score_min=''):
+    # Some candidates and some second probe halves also bind another gene
+    with open(result_path, 'w') as sam:
+        for record in SeqIO.parse(fastafile, 'fasta'):
+            candidate, _, half = record.id.partition('-')
+            off_target = int(candidate) % 7 == 0 or (int(candidate) % 5 == 0 and half == '2')
+            sam.write(f'{record.id}\t0\t{"NM_2" if off_target else "NM_1"}\t1\t42\t20M\t*\t0\t0\tACGT\tIIII\n')
+
+
+def test_sweep_matches_design_runs(monkeypatch, tmp_path):
+    monkeypatch.setattr(probe_design_adapted, 'ProbeBowtie2', _fake_bowtie2)
+    monkeypatch.setattr(probe_sweep, 'ProbeBowtie2', _fake_bowtie2)
+    monkeypatch.setattr(probe_design_adapted, 'get_lookup', lambda *args: FakeLookup())
+    seq = ''.join(random.Random(5).choices('ACGT', k=1500))
+    gc_ranges = [[40, 60], [30, 70]]
+    dg_thresholds = [-9, -3]
+    prb_spacings = [1, 5]
+    features = hcr3_feature_table('Tst', sequence=seq, hairpin_id=1, result_path=str(tmp_path),
+                                  prb_lengths=[18, 20])
+    settings = evaluate_settings(features, gc_ranges, dg_thresholds, prb_spacings)
+
+    for prb_length, gc_range, dg_thresh, prb_space in itertools.product([18, 20], gc_ranges, dg_thresholds,
+                                                                       prb_spacings):
+        design = designHCR3Probes(gene_name='Tst', sequence=seq, hairpin_id=1, result_path=str(tmp_path),
+                                  prb_length=prb_length, gc_range=gc_range, dg_thresh=dg_thresh,
+                                  prb_space=prb_space)
+        selected = select_probes(features, prb_length, gc_range, dg_thresh, prb_space)
+        assert selected.tolist() == design['position'].astype(int).tolist()
+        row = settings[(settings['prb_length'] == prb_length) & (settings['gc_low'] == gc_range[0])
+                       & (settings['dg_thresh'] == dg_thresh) & (settings['prb_spacing'] == prb_space)]
+        assert row['probes'].item() == len(design)
+    assert len(design) > 5
@@ -0,0 +1,28 @@
+import random
+import pandas as pd
+import probe_design_adapted
+from probe_design_adapted import designHCR3Probes
+from probe_tiling import tile_fasta, iter_windows
+
+
+def _no_hits(fastafile, db='', result_path='', score_min=''):
+    # Every candidate aligns only to its own gene
+    open(result_path, 'w').close()
+
+
+def test_tiled_record_matches_whole_record_design(monkeypatch, tmp_path):
+    monkeypatch.setattr(probe_design_adapted, 'ProbeBowtie2', _no_hits)
+    seq = ''.join(random.Random(3).choices('ACGT', k=3000))
+    settings = dict(hairpin_id=1, prb_length=20, prb_space=2, gc_range=[40, 60], dg_thresh=-9)
+    assert len(list(iter_windows(seq, 300, 20))) > 5
+
+    whole = designHCR3Probes(gene_name='Tst', sequence=seq, result_path=str(tmp_path), **settings)
+    fasta = tmp_path / 'records.fasta'
+    fasta.write_text(f'>NM_1 test gene (Tst), mRNA\n{seq}\n')
+    tile_fasta(str(fasta), str(tmp_path / 'tiled.csv'), 'hcr3', window=300, **settings)
+    tiled = pd.read_csv(tmp_path / 'tiled.csv')
+
+    assert len(whole) > 20
+    assert tiled['position'].tolist() == whole['position'].astype(int).tolist()
+    assert tiled['probe A'].tolist() == whole['probe A'].tolist()
+    assert tiled['probe B'].tolist() == whole['probe B'].tolist()
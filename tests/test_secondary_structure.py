@@ -0,0 +1,66 @@
+import time
+import multiprocessing
+import pytest
+import probe_design_adapted
+import secondary_structure
+from probe_design_adapted import designUSeqFISHProbes, structureFilter
+
+
+def _fake_chunk(seqs):
+    # Module level, so workers started by spawn can import it by name
+    if 'HANG' in seqs:
+        time.sleep(60)
+    if 'FAIL' in seqs:
+        raise ValueError('NUPACK failed')
+    return [seq.lower() for seq in seqs]
+
+
+@pytest.fixture(params=['fork', 'spawn'])
+def start_method(request):
+    previous = multiprocessing.get_start_method()
+    multiprocessing.set_start_method(request.param, force=True)
+    yield request.param
+    multiprocessing.set_start_method(previous, force=True)
+
+
+def test_failed_and_hanging_chunks_are_bounded(start_method):
+    seqs = [f'S{i}' for i in range(40)] + ['HANG', 'FAIL'] + [f'S{i}' for i in range(5)]
+
+    start = time.monotonic()
+    structures = secondary_structure.mfe_structures(seqs, processes=4, chunk_size=1, timeout=2, min_parallel=1,
+                                                    worker=_fake_chunk)
+
+    assert time.monotonic() - start < 20
+    assert structures[:40] == [f's{i}' for i in range(40)]
+    assert structures[40:42] == [None, None]
+    assert structures[42:] == [f's{i}' for i in range(5)]
+
+
+def test_failed_predictions_are_rejected_and_marked():
+    assert structureFilter(None) == (True, 'failed')
+    assert structureFilter('.' * 20) == (False, 0)
+
+
+def _no_hits(fastafile, db='', result_path='', score_min=''):
+    open(result_path, 'w').close()
+
+
+def test_candidates_with_failed_predictions_are_dropped(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(probe_design_adapted, 'ProbeBowtie2', _no_hits)
+    failing = set()
+
+    def fake_structures(seqs, processes=None):
+        # The primers of every fifth candidate fail; everything else has no secondary structure
+        failing.update(seqs[:len(seqs)//2][::5])
+        return [None if seq in failing else '.' * len(seq) for seq in seqs]
+
+    monkeypatch.setattr(probe_design_adapted, 'mfe_structures', fake_structures)
+    seq = 'ATGC' * 5 + 'ATTGCAGTCATGCTAGCTAGGCATCGATCGATGCATGCTAGCTAGCATTGCAGTCAGTCGATGCATGCTAG' * 2
+    result = designUSeqFISHProbes(gene_name='Tst', sequence=seq, ugi='GGCCAATT', result_path=str(tmp_path),
+                                  gc_range=[0, 100], dg_thresh=-100, processes=1)
+
+    assert len(result) > 5
+    assert not set(map(str, result['primer'])) & failing
+    assert all(isinstance(primer, int) and isinstance(padlock, int)
+               for primer, padlock in result['bonds (primer, padlock)'])
+    assert 'structure predictions failed' in capsys.readouterr().out
@@ -0,0 +1,51 @@
+import random
+import numpy as np
+from Bio.Seq import Seq
+from Bio.SeqUtils import gc_fraction
+from sequence_kernels import (is_DNA, complement, reverse_complement, base_counts, gc_content, encode_batch,
+                              is_DNA_batch, base_counts_batch, gc_content_batch, has_homopolymer_batch)
+from utils import design_primer_pair
+
+
+def _seqs(n, length, seed=0, alphabet='ACGT'):
+    rng = random.Random(seed)
+    return [''.join(rng.choices(alphabet, k=length)) for _ in range(n)]
+
+
+def test_kernels_match_biopython():
+    for seq in _seqs(50, 37) + _seqs(50, 37, alphabet='acgtACGT'):
+        assert complement(seq) == str(Seq(seq).complement())
+        assert reverse_complement(seq) == str(Seq(seq).reverse_complement())
+        assert abs(gc_content(seq) - gc_fraction(seq, 'ignore')*100) < 1e-9
+        upper = seq.upper()
+        assert base_counts(seq) == tuple(upper.count(base) for base in 'ACGT')
+    assert is_DNA('ACGT') and not is_DNA('ACGN') and not is_DNA('acgt')
+    assert gc_content('') == 0.0
+
+
+def test_lowercase_bases_count_as_gc():
+    assert round(gc_content('gcgcat'), 2) == 66.67
+    assert gc_content('gcgcat') == gc_content('GCGCAT')
+    assert base_counts('acgTT') == (1, 1, 1, 2)
+
+
+def test_soft_masked_input_picks_the_same_primers():
+    # Forbidden motifs are matched as given, so only the GC and Tm windows are compared here
+    settings = (100, 500, range(22, 26), True, [], 40, 60, 50, 60)
+    for seq in _seqs(10, 700, seed=2):
+        upper = design_primer_pair(seq, *settings)
+        lower = design_primer_pair(seq.lower(), *settings)
+        assert upper.fwd and upper.rev
+        assert (lower.fwd.upper(), lower.rev, lower.fwd_gc, lower.rev_gc) == (upper.fwd, upper.rev, upper.fwd_gc, upper.rev_gc)
+
+
+def test_batch_kernels_match_single_sequence_kernels():
+    seqs = _seqs(200, 20, seed=3) + ['AAAAGGGCCCTTTTACGTAC', 'ACGTACGTNNACGTACGTAC']
+    batch = encode_batch(seqs)
+    assert batch.shape == (len(seqs), 20)
+    assert is_DNA_batch(batch).tolist() == [is_DNA(seq) for seq in seqs]
+    assert base_counts_batch(batch).tolist() == [list(base_counts(seq)) for seq in seqs]
+    assert np.allclose(gc_content_batch(batch), [gc_content(seq) for seq in seqs])
+    homopolymers = ['AAAA', 'CCC', 'GGG', 'TTTT']
+    assert has_homopolymer_batch(batch).tolist() == [any(run in seq for run in homopolymers) for seq in seqs]
+    assert encode_batch([]).shape == (0, 0)
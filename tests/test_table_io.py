@@ -0,0 +1,62 @@
+import pytest
+import pandas as pd
+import batch_cli
+from table_io import TableWriter, read_table, read_table_chunks, export_excel, table_format
+
+
+def _chunks():
+    # The first chunk has an empty column, as primer tables do when no primer was found
+    yield pd.DataFrame({'name': ['a', 'b'], 'length': [22, 23], 'GC%': [45.5, 50.0], 'note': [None, None]})
+    yield pd.DataFrame({'name': ['c', 'd', 'e'], 'length': [24, 25, 0], 'GC%': [55.0, 40.0, 0.0],
+                        'note': ['x', None, 'y']})
+
+
+@pytest.mark.parametrize('extension', ['csv', 'tsv', 'parquet', 'arrow', 'xlsx'])
+def test_streamed_chunks_round_trip(tmp_path, extension):
+    path = str(tmp_path / f'table.{extension}')
+    with TableWriter(path) as writer:
+        for chunk in _chunks():
+            writer.write(chunk)
+    assert writer.rows == 5
+
+    chunks = list(read_table_chunks(path, chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    df = pd.concat(chunks)
+    assert df.index.tolist() == list(range(5))
+    expected = pd.concat(_chunks(), ignore_index=True)
+    assert df['name'].tolist() == expected['name'].tolist()
+    assert df['length'].tolist() == expected['length'].tolist()
+    assert df['GC%'].tolist() == expected['GC%'].tolist()
+    assert [value if isinstance(value, str) else None for value in df['note']] == [None, None, 'x', None, 'y']
+
+
+def test_excel_export_matches_streamed_table(tmp_path):
+    path = str(tmp_path / 'table.parquet')
+    with TableWriter(path) as writer:
+        for chunk in _chunks():
+            writer.write(chunk)
+    excel = export_excel(path)
+    assert excel == str(tmp_path / 'table.xlsx')
+    assert read_table(excel)['name'].tolist() == read_table(path)['name'].tolist()
+
+
+def test_unsupported_tables_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match='.json'):
+        table_format('table.json')
+    with pytest.raises(AssertionError, match='xlsx'):
+        TableWriter(str(tmp_path / 'table.xls'))
+
+
+def test_batch_output_defaults_to_csv_with_optional_excel_export(tmp_path):
+    pd.DataFrame({'name': ['p1', 'p2'], 'a': 0, 'b': 0, 'c': 0, 'd': 0, 'sequence': ['MKW', 'MLL']}).to_csv(
+        tmp_path / 'peptides.csv', index=False)
+    arguments = ['reverse-translate', '--input', str(tmp_path / 'peptides.csv'), '--backend', 'local',
+                 '--organism', 'Pichia pastoris', '--codon-gc-range', '0', '100']
+
+    batch_cli.main(arguments + ['--output-dir', str(tmp_path / 'default')])
+    [output] = (tmp_path / 'default').iterdir()
+    assert output.suffix == '.csv'
+    assert pd.read_csv(output)['sequence Reverse Translated'].str.startswith('ATG').all()
+
+    batch_cli.main(arguments + ['--output-dir', str(tmp_path / 'export'), '--format', 'parquet', '--excel-export'])
+    assert sorted(path.suffix for path in (tmp_path / 'export').iterdir()) == ['.parquet', '.xlsx']
@@ -0,0 +1,68 @@
+import json
+import pytest
+from telemetry import NetworkTelemetry, TELEMETRY, LATENCY_BUCKETS
+from benchmark import StubUCSC, synthetic_coordinates
+from utils import get_sequence_from_coordinate
+
+
+def test_calls_errors_retries_and_bytes_are_counted():
+    telemetry = NetworkTelemetry()
+    with telemetry.track('idt.optimize') as call:
+        call.bytes_sent, call.bytes_received = 100, 2000
+    with telemetry.track('idt.optimize', retry=True) as call:
+        call.failed = True
+    with pytest.raises(ValueError):
+        with telemetry.track('idt.optimize'):
+            raise ValueError('timeout')
+    telemetry.record('ucsc.sequence', 0.2, bytes_received=50)
+
+    stats = telemetry.summary()['endpoints']
+    assert list(stats) == ['idt.optimize', 'ucsc.sequence']
+    idt = stats['idt.optimize']
+    assert (idt['calls'], idt['errors'], idt['retries']) == (3, 2, 1)
+    assert (idt['bytes_sent'], idt['bytes_received']) == (100, 2000)
+    assert idt['error_rate'] == pytest.approx(2/3)
+    assert stats['ucsc.sequence']['latency_histogram']['<=0.25s'] == 1
+
+
+def test_latency_percentiles_come_from_the_histogram():
+    telemetry = NetworkTelemetry()
+    for seconds in [0.005]*90 + [0.3]*9 + [200]:
+        telemetry.record('entrez.esummary', seconds)
+    stats = telemetry.endpoints['entrez.esummary']
+    assert sum(stats.histogram) == 100 and len(stats.histogram) == len(LATENCY_BUCKETS) + 1
+    assert stats.latency_percentile(50) == 0.01
+    assert stats.latency_percentile(95) == 0.5
+    assert stats.latency_percentile(100) == 200
+    assert NetworkTelemetry().summary()['endpoints'] == {}
+
+
+def test_snapshots_merge_into_another_telemetry():
+    worker, parent = NetworkTelemetry(), NetworkTelemetry()
+    worker.record('ucsc.sequence', 1.5, bytes_received=10, retry=True)
+    parent.record('ucsc.sequence', 0.02, bytes_received=5, error=True)
+    snapshot = worker.snapshot()
+    worker.reset()
+    parent.merge(snapshot)
+    parent.merge(snapshot)
+
+    stats = parent.summary()['endpoints']['ucsc.sequence']
+    assert (stats['calls'], stats['errors'], stats['retries'], stats['bytes_received']) == (3, 1, 2, 25)
+    assert stats['max_seconds'] == 1.5
+    assert stats['latency_histogram']['<=2.5s'] == 2
+    assert worker.endpoints == {}
+
+
+def test_ucsc_requests_are_recorded_and_exported(tmp_path):
+    TELEMETRY.reset()
+    with StubUCSC():
+        for coordinate in synthetic_coordinates(3, seed=1):
+            assert len(get_sequence_from_coordinate(coordinate, False, 100)) == 700
+    path = TELEMETRY.export_json(str(tmp_path / 'network.json'))
+    with open(path) as f:
+        summary = json.load(f)
+    ucsc = summary['endpoints']['ucsc.sequence']
+    assert (ucsc['calls'], ucsc['errors']) == (3, 0)
+    assert ucsc['bytes_received'] > 3 * 700
+    assert summary['network_seconds'] <= summary['wall_seconds']
+    TELEMETRY.reset()
@@ -0,0 +1,69 @@
+import utils
+from translation_cache import ReverseTranslationCache
+from utils import build_peptide_items, reverse_translate_cached
+
+
+def _fake_idt(monkeypatch, fail=()):
+    sent = []
+
+    def reverse_translate(data, organism, product_type, *idt_info, **options):
+        sent.append([item['Sequence'] for item in data])
+        return [None if item['Sequence'] in fail else f'{organism[:4]}-{product_type}-{item["Sequence"]}'
+                for item in data]
+    monkeypatch.setattr(utils, 'reverse_translate', reverse_translate)
+    return sent
+
+
+def _translate(cache_file, seqs, organism='Mus musculus (mouse)', product_type='gene'):
+    data = build_peptide_items([f'p{i}' for i in range(len(seqs))], seqs)
+    return reverse_translate_cached(data, organism, product_type, 'user', 'password', 'id', 'secret',
+                                    cache_file=str(cache_file))
+
+
+def test_only_misses_are_sent_once_and_reused_across_runs(monkeypatch, tmp_path, capsys):
+    sent = _fake_idt(monkeypatch)
+    cache_file = tmp_path / 'cache' / 'translations.sqlite'
+
+    first = _translate(cache_file, ['MK', 'MKK', 'MK', 'MW'])
+    assert first == ['Mus -gene-MK', 'Mus -gene-MKK', 'Mus -gene-MK', 'Mus -gene-MW']
+    assert sent == [['MK', 'MKK', 'MW']]
+    assert 'cache hits: 0/4' in capsys.readouterr().out
+
+    second = _translate(cache_file, ['mw', 'MKKK', 'MK'])
+    assert second == ['Mus -gene-MW', 'Mus -gene-MKKK', 'Mus -gene-MK']
+    assert sent[1:] == [['MKKK']]
+    assert 'cache hits: 2/3 (66.7%), misses: 1, sent 1 unique' in capsys.readouterr().out
+
+    assert _translate(cache_file, ['MK', 'MKKK']) == ['Mus -gene-MK', 'Mus -gene-MKKK']
+    assert len(sent) == 2
+
+
+def test_results_are_kept_apart_by_organism_and_product_type(monkeypatch, tmp_path):
+    sent = _fake_idt(monkeypatch)
+    cache_file = tmp_path / 'translations.sqlite'
+    _translate(cache_file, ['MK'])
+    assert _translate(cache_file, ['MK'], product_type='gblock') == ['Mus -gblock-MK']
+    assert _translate(cache_file, ['MK'], organism='Homo sapiens (human)') == ['Homo-gene-MK']
+    assert sent == [['MK'], ['MK'], ['MK']]
+
+
+def test_failed_results_are_not_cached(monkeypatch, tmp_path):
+    sent = _fake_idt(monkeypatch, fail={'MW'})
+    cache_file = tmp_path / 'translations.sqlite'
+    assert _translate(cache_file, ['MK', 'MW']) == ['Mus -gene-MK', None]
+    _fake_idt(monkeypatch)
+    assert _translate(cache_file, ['MK', 'MW']) == ['Mus -gene-MK', 'Mus -gene-MW']
+
+    cache = ReverseTranslationCache(str(cache_file))
+    assert cache.get_many('Mus musculus (mouse)', 'gene', ['MW', 'MY']) == ['Mus -gene-MW', None]
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.close()
+
+
+def test_large_lookups_stay_below_the_query_parameter_limit(tmp_path):
+    cache = ReverseTranslationCache(str(tmp_path / 'translations.sqlite'))
+    seqs = [f'M{"K"*i}' for i in range(1200)]
+    cache.put_many('Mus musculus (mouse)', 'gene', seqs[::2], [seq.lower() for seq in seqs[::2]])
+    dnas = cache.get_many('Mus musculus (mouse)', 'gene', seqs)
+    assert dnas == [seq.lower() if i % 2 == 0 else None for i, seq in enumerate(seqs)]
+    cache.close()
@@ -0,0 +1,84 @@
+import os
+import sqlite3
+
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.compbio_utils', 'reverse_translation_cache.sqlite')
+
+
+"""
+A persistent cache of reverse translation results keyed by organism, product
+type, and amino acid sequence. Results are stored in a SQLite file so repeated
+runs over a slowly changing peptide library only send new sequences to IDT.
+
+Input:
+    path: cache file path. Parent directories are created if necessary.
+"""
+class ReverseTranslationCache:
+    def __init__(self, path: str = DEFAULT_CACHE_FILE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.hits = 0           # Number of lookups answered by the cache
+        self.misses = 0         # Number of lookups that need the API
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS reverse_translations (
+                                       organism TEXT NOT NULL,
+                                       product_type TEXT NOT NULL,
+                                       sequence TEXT NOT NULL,
+                                       dna TEXT NOT NULL,
+                                       PRIMARY KEY (organism, product_type, sequence))""")
+        self.connection.commit()
+
+    """
+    Look up cached DNA sequences and update hit/miss statistics.
+
+    Inputs:
+        organism: the target organism for codon optimization.
+        product_type: the target type of DNA for codon optimization.
+        seqs: amino acid sequences.
+    Returns: cached DNA sequences ordered the same as seqs, None for misses.
+    """
+    def get_many(self, organism: str, product_type: str, seqs: list[str]) -> list[str]:
+        found = {}
+        unique = list(set(seqs))
+        # Stay below SQLite's limit on the number of query parameters
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start+500]
+            rows = self.connection.execute(
+                f"""SELECT sequence, dna FROM reverse_translations
+                    WHERE organism = ? AND product_type = ? AND sequence IN ({','.join('?' * len(batch))})""",
+                [organism, product_type] + batch)
+            found.update(rows)
+        dnas = [found.get(seq) for seq in seqs]
+        hits = sum(dna is not None for dna in dnas)
+        self.hits += hits
+        self.misses += len(dnas) - hits
+        return dnas
+
+    """
+    Store DNA sequences in the cache. Failed results (None) are not stored.
+
+    Inputs:
+        organism: the target organism for codon optimization.
+        product_type: the target type of DNA for codon optimization.
+        seqs: amino acid sequences.
+        dnas: reverse translated DNA sequences, ordered the same as seqs.
+    """
+    def put_many(self, organism: str, product_type: str, seqs: list[str], dnas: list[str]):
+        self.connection.executemany(
+            """INSERT OR REPLACE INTO reverse_translations (organism, product_type, sequence, dna)
+               VALUES (?, ?, ?, ?)""",
+            [(organism, product_type, seq, dna) for seq, dna in zip(seqs, dnas) if dna is not None])
+        self.connection.commit()
+
+    """
+    Returns a one-line summary of cache hits and misses.
+    """
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0
+        return f'cache hits: {self.hits}/{total} ({rate:.1f}%), misses: {self.misses}'
+
+    def close(self):
+        self.connection.close()
@@ -1,14 +1,13 @@
 import re
 import os
-import requests, json
-import pandas as pd
-import tkinter as tk
+import time
 from datetime import date
-from tkinter import filedialog
-from base64 import b64encode
-from urllib import request, parse
-from Bio.SeqUtils import GC
-from Bio.SeqUtils.MeltingTemp import Tm_GC, Tm_NN, Tm_Wallace
+from sequence_kernels import is_DNA, complement, base_counts, gc_content
+from telemetry import TELEMETRY
+
+
+# Set the UCSC_BASE_URL environment variable to use a local stand-in server
+UCSC_BASE_URL = os.environ.get('UCSC_BASE_URL', 'https://api.genome.ucsc.edu')
 
 
 """
@@ -68,6 +67,13 @@ class Primer:
     def rev_info(self):
         return [self.rev, self.rev_len, self.rev_gc, self.rev_Tm]
 
+    """
+    Returns the reverse primer written 5' to 3'. The reverse primer is stored as
+    the complement of the template strand, read in the template's direction.
+    """
+    def rev_oligo(self) -> str:
+        return self.rev[::-1]
+
     """
     Print progress for primer selection.
 
@@ -97,19 +103,154 @@ Inputs:
     high_gc: upper bound of GC% range.
     low_tm: lower bound of melting temperature.
     high_tm: upper bound of melting temperature.
+    exclude: primer sequences (as stored in Primer) that should not be picked again,
+             e.g. primers rejected by a specificity check.
 """
 def pick_primer(primer: Primer, primer_type: str, selection: str, forbidden: list[str],
-                low_gc: int, high_gc: int, low_tm: int, high_tm: int):
+                low_gc: int, high_gc: int, low_tm: int, high_tm: int, exclude: set = frozenset()):
     assert primer_type in ['fwd', 'rev'], "primer_type should be fwd or rev"
 
+    if (primer_type == 'fwd' and primer.fwd) or (primer_type == 'rev' and primer.rev):
+        return
     if not any([x in selection for x in forbidden]):
-        gc = round(GC(selection), 2)
+        candidate = selection if primer_type == 'fwd' else _get_complement(selection)
+        if candidate in exclude:
+            return
+        gc = round(gc_content(selection), 2)
         tm = round(_Tm(selection), 2)
         if low_gc <= gc and gc <= high_gc and low_tm <= tm and tm <= high_tm:
-            if primer_type == 'fwd' and not primer.fwd:
-                primer.update_fwd(selection, gc, tm)
-            elif primer_type == 'rev' and not primer.rev:
-                primer.update_rev(_get_complement(selection), gc, tm)
+            if primer_type == 'fwd':
+                primer.update_fwd(candidate, gc, tm)
+            else:
+                primer.update_rev(candidate, gc, tm)
+
+
+"""
+Search the flanking arms of a sequence for a valid primer pair.
+
+Inputs:
+    seq: sequence containing the target and both flanking arms.
+    flank_size: the length of flanking arms on each end of the target.
+    target_length: the length of the target between the flanking arms.
+    len_range: a range of acceptable primer length.
+    tight_flank: if primers should be picked as close to the target as possible.
+    forbidden: a list of forbidden motifs that should not exist in primers.
+    low_gc: lower bound of GC% range.
+    high_gc: upper bound of GC% range.
+    low_tm: lower bound of melting temperature.
+    high_tm: upper bound of melting temperature.
+    exclude: primer sequences that should be skipped, see pick_primer.
+Returns: the picked primer pair. Unsuccessful picks are left empty.
+"""
+def design_primer_pair(seq: str, flank_size: int, target_length: int, len_range: range,
+                       tight_flank: bool, forbidden: list[str], low_gc: int, high_gc: int,
+                       low_tm: int, high_tm: int, exclude: set = frozenset()) -> Primer:
+    primer = Primer()
+    for length in len_range:
+        if primer.fwd and primer.rev:
+            break
+        fwd_flank = seq[:flank_size]
+        rev_flank = seq[target_length+flank_size:]
+        while len(fwd_flank) >= length and len(rev_flank) >= length:
+            if primer.fwd and primer.rev:
+                break
+            if tight_flank:
+                pick_primer(primer, 'fwd', fwd_flank[-length:],
+                            forbidden, low_gc, high_gc, low_tm, high_tm, exclude)
+                pick_primer(primer, 'rev', rev_flank[:length],
+                            forbidden, low_gc, high_gc, low_tm, high_tm, exclude)
+                fwd_flank = fwd_flank[:-1]
+                rev_flank = rev_flank[1:]
+            else:
+                pick_primer(primer, 'fwd', fwd_flank[:length],
+                            forbidden, low_gc, high_gc, low_tm, high_tm, exclude)
+                pick_primer(primer, 'rev', rev_flank[-length:],
+                            forbidden, low_gc, high_gc, low_tm, high_tm, exclude)
+                fwd_flank = fwd_flank[1:]
+                rev_flank = rev_flank[:-1]
+    return primer
+
+
+"""
+Returns a redesign function for primer_qc.check_primer_dimers and
+primer_specificity.check_primer_specificity. Every primer rejected for a row is
+remembered across all checks, so a replacement picked by one check never brings
+back a primer another check already rejected.
+
+Inputs:
+    seqs: sequences containing the targets and both flanking arms, one per row.
+    Other inputs: see design_primer_pair.
+Returns: a function taking the row number and a set of newly rejected primer
+         sequences and returning a new primer pair.
+"""
+def primer_redesigner(seqs: list[str], flank_size: int, target_length: int, len_range: range,
+                      tight_flank: bool, forbidden: list[str], low_gc: int, high_gc: int,
+                      low_tm: int, high_tm: int):
+    excluded = {}
+
+    def redesign(i: int, rejected: set) -> Primer:
+        excluded.setdefault(i, set()).update(rejected)
+        return design_primer_pair(seqs[i], flank_size, target_length, len_range, tight_flank, forbidden,
+                                  low_gc, high_gc, low_tm, high_tm, excluded[i])
+    return redesign
+
+
+"""
+Returns the output columns describing a primer pair, in the order of forward
+primer information, reverse primer information, and full primers with homology
+arms attached. Column names are listed in PRIMER_COLUMNS.
+
+Inputs:
+    primer: primer pair generated with design_primer_pair.
+    left_arm: forward homology arm sequence.
+    right_arm: reverse homology arm sequence.
+"""
+def primer_row(primer: Primer, left_arm: str, right_arm: str) -> list:
+    return primer.fwd_info() + primer.rev_info() + [left_arm + primer.fwd, right_arm + primer.rev]
+
+
+PRIMER_COLUMNS = ['fwd primer', 'fwd length', 'fwd GC%', 'fwd Tm',
+                  'rev primer', 'rev length', 'rev GC%', 'rev Tm',
+                  'full fwd', 'full rev']
+
+
+"""
+Returns a table of primer pair information with columns PRIMER_COLUMNS and
+consistent column types, so chunks of a streamed run can be appended together.
+
+Inputs:
+    primers: primer pairs generated with design_primer_pair.
+    left_arm: forward homology arm sequence.
+    right_arm: reverse homology arm sequence.
+    index: row index of the table, e.g. the index of the input chunk.
+"""
+def primer_table(primers: list[Primer], left_arm: str, right_arm: str, index=None):
+    import pandas as pd
+
+    df = pd.DataFrame([primer_row(primer, left_arm, right_arm) for primer in primers],
+                      columns=PRIMER_COLUMNS, index=index)
+    return df.astype({'fwd length': int, 'fwd GC%': float, 'fwd Tm': float,
+                      'rev length': int, 'rev GC%': float, 'rev Tm': float})
+
+
+"""
+Build the IDT codon optimization items from peptide names and sequences.
+Throws error if a sequence contains an invalid amino acid.
+
+Inputs:
+    names: peptide names.
+    seqs: peptide sequences, ordered the same as names.
+Returns: a list of items accepted by reverse_translate.
+"""
+def build_peptide_items(names: list, seqs: list) -> list[dict]:
+    data = []
+    for name, seq in zip(names, seqs):
+        seq = seq.upper()
+        assert all([aa in 'QWERTYIPASDFGHKLCVNM' for aa in seq]), \
+            f'Sequence for {name} has invalid amino acid'
+        data.append({'Name': str(name),
+                     'Sequence': seq})
+    return data
 
 
 """
@@ -122,6 +263,9 @@ Returns:
     import_file_name: file path where the program will load data from.
 """
 def select_input_file(valid_filetypes: dict) -> str:
+    import tkinter as tk
+    from tkinter import filedialog
+
     input("""\nYou will be asked to select a file for data input. Press enter to continue.\n""")
     root = tk.Tk()
     root.withdraw()
@@ -141,6 +285,9 @@ Returns:
     result_path: result path where the program will generate files into.
 """
 def select_output_directory() -> str:
+    import tkinter as tk
+    from tkinter import filedialog
+
     input("""\nYou will be asked to select a directory for data output. Press enter to continue.\n""")
     root = tk.Tk()
     root.withdraw()
@@ -183,19 +330,27 @@ def get_six_digit_date_today(date_format: str ='mmddyy') -> str:
 
 """
 Print progress of the current program every milestone. Can turn off update by
-setting milestone to 0.
+setting milestone to 0. When start_time is given, throughput and estimated time
+remaining are printed as well.
 
 Inputs:
     count: current iteration count number.
     total: total number of iterations.
     milestone: percentage frequency of reporting.
+    start_time: time.monotonic() value when the iterations started.
 """
-def report_progress(count: int, total: int, milestone: int=10):
+def report_progress(count: int, total: int, milestone: int=10, start_time: float=None):
     assert 0 <= milestone and milestone <= 100, "milestone must be a valid percentage between 0 and 100"
     if not milestone or not (total // milestone):
         return
     if (count+1) % (total // milestone) == 0:
-        print(f"finished {count+1}/{total}")
+        if start_time is None:
+            print(f"finished {count+1}/{total}")
+            return
+        elapsed = time.monotonic() - start_time
+        rate = (count+1) / elapsed if elapsed > 0 else 0
+        eta = (total-count-1) / rate if rate else 0
+        print(f"finished {count+1}/{total} ({rate:.2f}/s, ETA {eta:.0f}s)")
 
 
 """
@@ -210,13 +365,17 @@ Inputs:
 """
 def get_sequence_from_coordinate(coordinate: tuple, flank_included: bool,
                                  flank_size: int, genome: str ='mm10') -> str:
+    import requests
     assert _genome_in_ucsc(genome), f"Genome {genome} is not supported by data source"
 
     chromosome, start, end = _process_coordinates(coordinate)
     if not flank_included:
         start -= flank_size
         end += flank_size
-    data = requests.get(f"https://api.genome.ucsc.edu/getData/sequence?genome={genome};chrom={chromosome};start={start-1};end={end}", timeout=30)
+    with TELEMETRY.track('ucsc.sequence') as call:
+        data = requests.get(f"{UCSC_BASE_URL}/getData/sequence?genome={genome};chrom={chromosome};start={start-1};end={end}", timeout=30)
+        call.bytes_received = len(data.content)
+        call.failed = not data.ok
     return data.json()['dna'].upper()
 
 
@@ -229,72 +388,106 @@ Returns: a list of IDT information in the following order:
     [IDT_username, IDT_password, client_ID, client_secret]
 """
 def import_IDT_information(filepath: str) -> list[str]:
+    import pandas as pd
     return pd.read_csv(filepath).iloc[0, 0].split('\t')
 
 
 """
-Reverse translate input peptide sequences to DNA with sequence optimization
-using IDT's API.
+Reverse translate input peptide sequences to DNA with sequence optimization.
+The default backend uses IDT's API through a shared IDTClient per account, so
+the access token and connections are reused across calls and large inputs are
+submitted in concurrent chunks. The local backend uses codon usage tables from
+codon_optimizer and does not need IDT information or Internet connection.
 
 Inputs:
-    data: 
+    data: a list of items generated with build_peptide_items.
     organism: the target organism for codon optimization.
     product_type: the target type of DNA for codon optimization.
                   Acceptable inputs: gblock, gene, megamer
-    client_id: IDT client ID.
+    IDT_username: IDT username.
+    IDT_password: IDT password.
+    client_ID: IDT client ID.
     client_secret: IDT client secret.
-    idt_username: IDT username.
-    idt_password: IDT password.
-Returns: reverse translated DNA sequences.
+    backend: "idt" (IDT's API) or "local" (codon_optimizer.optimize_codons).
+    options: extra settings passed to IDTClient when it is first created, e.g.
+             chunk_size, max_workers, retries, timeout, base_url; or to
+             optimize_codons for the local backend, e.g. method, gc_range, forbidden.
+Returns: reverse translated DNA sequences, with None for failed items.
 """
 def reverse_translate(data, organism: str, product_type: str,
-                      IDT_username: str, IDT_password: str,
-                      client_ID: str, client_secret: str) -> list[str]:
+                      IDT_username: str = '', IDT_password: str = '',
+                      client_ID: str = '', client_secret: str = '',
+                      backend: str = 'idt', **options) -> list[str]:
     assert _organism_in_idt(organism), "Chosen organism is not in list"
     assert _product_type_in_idt(product_type), "Chosen product type is not valid"
+    assert backend in ['idt', 'local'], "backend should be idt or local"
 
-    access_token = _get_idt_access_token(IDT_username, IDT_password, client_ID, client_secret)
-    results = requests.post('https://www.idtdna.com/restapi/v1/CodonOpt/Optimize',
-                        json={
-                            'organism': organism,
-                            'optimizationItems': data,
-                            'sequenceType': 'aminoAcid',
-                            'productType': product_type
-                        },
-                        headers={
-                            'Authorization': f'Bearer {access_token}',
-                            'Content-Type': 'application/json'
-                        }).json()
-    
-    # Clean up result and return a list of DNA sequences
-    dnas = []
-    for result in results:
-        if 'Message' in result:
-            dnas.append(None)
-        else:
-            dnas.append(result['OptResult']['FullSequence'])
-    return dnas
+    if backend == 'local':
+        from codon_optimizer import optimize_codons
+        return optimize_codons([item['Sequence'] for item in data], organism, **options)
+
+    client = _get_idt_client(IDT_username, IDT_password, client_ID, client_secret, **options)
+    return client.optimize(data, organism, product_type)
 
 
+"""
+Reverse translate input peptide sequences like reverse_translate, but answer
+previously translated sequences from a persistent cache. Only cache misses are
+sent to IDT, each unique sequence once, and cached and fresh results are merged
+in the original order. Hit/miss statistics are printed.
+
+Inputs:
+    data: a list of items generated with build_peptide_items.
+    organism: the target organism for codon optimization.
+    product_type: the target type of DNA for codon optimization.
+    IDT_username: IDT username.
+    IDT_password: IDT password.
+    client_ID: IDT client ID.
+    client_secret: IDT client secret.
+    cache_file: cache file path, defaulted to translation_cache.DEFAULT_CACHE_FILE.
+    client_options: extra settings passed to IDTClient.
+Returns: reverse translated DNA sequences, with None for failed items.
+"""
+def reverse_translate_cached(data, organism: str, product_type: str,
+                             IDT_username: str, IDT_password: str,
+                             client_ID: str, client_secret: str,
+                             cache_file: str = None, **client_options) -> list[str]:
+    from translation_cache import ReverseTranslationCache, DEFAULT_CACHE_FILE
+    assert _organism_in_idt(organism), "Chosen organism is not in list"
+    assert _product_type_in_idt(product_type), "Chosen product type is not valid"
+
+    cache = ReverseTranslationCache(cache_file or DEFAULT_CACHE_FILE)
+    try:
+        seqs = [item['Sequence'] for item in data]
+        dnas = cache.get_many(organism, product_type, seqs)
+
+        # Send each missing sequence once, keeping the first item that requested it
+        missing = {}
+        for item, dna in zip(data, dnas):
+            if dna is None and item['Sequence'] not in missing:
+                missing[item['Sequence']] = item
+        if missing:
+            fresh = reverse_translate(list(missing.values()), organism, product_type,
+                                      IDT_username, IDT_password, client_ID, client_secret, **client_options)
+            cache.put_many(organism, product_type, list(missing), fresh)
+            fresh = dict(zip(missing, fresh))
+            dnas = [dna if dna is not None else fresh[seq] for seq, dna in zip(seqs, dnas)]
+        print(f'Reverse translation {cache.summary()}, sent {len(missing)} unique sequences to IDT')
+    finally:
+        cache.close()
+    return dnas
+
 
 
 
 # Helper functions
 def _Tm(sequence: str) -> float:
     # Calculate Tm from 4 methods and return average
+    from Bio.SeqUtils.MeltingTemp import Tm_GC, Tm_NN, Tm_Wallace
     sequence = sequence.upper()
     assert _is_DNA(sequence), "Input DNA is not valid: contains non AGCT character"
 
-    a, t, g, c = 0, 0, 0, 0
-    for base in sequence:
-        if base == 'A':
-            a += 1
-        if base == 'T':
-            t += 1
-        if base == 'G':
-            g += 1
-        if base == 'C':
-            c += 1
+    a, c, g, t = base_counts(sequence)
     formula = 64.9 + 41*(g+c-16.4)/(a+t+g+c)
     wallace = Tm_Wallace(sequence)
     gc = Tm_GC(sequence)
@@ -307,13 +500,12 @@ def _get_complement(sequence: str) -> str:
     sequence = sequence.upper()
     assert _is_DNA(sequence), "Input DNA is not valid: contains non AGCT character"
 
-    DNA_DICT = {'A': 'T', 'T': 'A', 'C': 'G', 'G': 'C'}
-    return ''.join([DNA_DICT[base] for base in sequence])
+    return complement(sequence)
 
 
 def _is_DNA(sequence: str) -> bool:
     # Return if the input sequence is valid DNA
-    return all([base in 'AGCT' for base in sequence])
+    return is_DNA(sequence)
 
 
 def _process_coordinates(coordinate: str) -> tuple:
@@ -346,28 +538,18 @@ def _genome_in_ucsc(genome: str) -> bool:
                       'xenTro10', 'xenTro9']
 
 
-def _get_idt_access_token(IDT_username: str, IDT_password: str,
-                          client_ID: str, client_secret: str) -> str:
-    authorization_string = b64encode(bytes(client_ID + ":" + client_secret, "utf-8")).decode()
-    request_headers = {"Content-Type": "application/x-www-form-urlencoded",
-                       "Authorization": "Basic " + authorization_string}
-    data_dict = {"grant_type": "password",
-                 "scope": "test",
-                 "username": IDT_username,
-                 "password": IDT_password}
-    request_data = parse.urlencode(data_dict).encode()
-    post_request = request.Request("https://www.idtdna.com/Identityserver/connect/token", 
-                                    data = request_data, 
-                                    headers = request_headers,
-                                    method = "POST")
-
-    response = request.urlopen(post_request)
-    body = response.read().decode()
-    
-    if (response.status != 200):
-        raise RuntimeError("Request failed with error code:" + response.status + "\nBody:\n" + body)
-    
-    return json.loads(body)["access_token"]
+_IDT_CLIENTS = {}
+
+
+def _get_idt_client(IDT_username: str, IDT_password: str,
+                    client_ID: str, client_secret: str, **client_options):
+    # Reuse one client (token and connection pool) per IDT account and client settings
+    from idt_client import IDTClient
+
+    key = (IDT_username, IDT_password, client_ID, client_secret, tuple(sorted(client_options.items())))
+    if key not in _IDT_CLIENTS:
+        _IDT_CLIENTS[key] = IDTClient(IDT_username, IDT_password, client_ID, client_secret, **client_options)
+    return _IDT_CLIENTS[key]
 
 
 def _organism_in_idt(organism: str) -> bool: